@@ -2,13 +2,41 @@ import dataiku
 from dataiku.customrecipe import get_input_names_for_role, get_output_names_for_role, get_recipe_config, get_recipe_resource
 
 import asyncio
+import glob
 import os
 import shutil
+import sys
+import time
 from pathlib import Path
+from dku_graphrag.index.build_state import CHECKPOINT_CACHE_FILE_NAME, BuildState, fingerprint_config, fingerprint_documents, load_build_state
 from dku_graphrag.index.dataiku_graph_index_builder import DataikuGraphragIndexBuilder  
+from dku_graphrag.index.dataset_export import export_dataset
+from dku_graphrag.index.incremental import STATE_DIR_NAME, DocumentDiffer, compute_manifest, load_manifest, save_manifest
+from dku_graphrag.utils.concurrency import configure_llm_mesh_limiter
+from dku_graphrag.utils.dataiku_client import configure_dataiku_client
+from dku_graphrag.utils.embedding_coalescer import configure_embedding_coalescing, get_embedding_coalescing_stats
+from dku_graphrag.utils.embedding_cache import get_embedding_cache
+from dku_graphrag.index.context_index import build_context_index
+from dku_graphrag.utils.index_manifest import (
+    GENERATIONS_DIR_NAME,
+    INDEX_MANIFEST_FILE_NAME,
+    LEGACY_OUTPUT_DIR_NAME,
+    VECTOR_STORE_DIR_NAME,
+    get_generation_dir,
+    read_index_manifest,
+    remove_stale_generations,
+    stage_generation,
+    write_index_manifest,
+)
+from dku_graphrag.utils.llm_cache import CACHE_DIR_NAME, SQLiteLLMCache, get_cache_dir
+from dku_graphrag.utils.retry import RetryPolicy
+from dku_graphrag.utils.telemetry import BUILD_STATS_FILE_NAME, configure_usage_tracker
 
 import logging
+import pandas as pd
 from graphrag.config.load_config import load_config
+from graphrag.config.enums import StorageType
+from graphrag.config.models.storage_config import StorageConfig
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("graphrag recipe")
@@ -22,10 +50,6 @@ output_folder_name = get_output_names_for_role('output_folder')[0]
 output_folder = dataiku.Folder(output_folder_name)
 output_folder_path = output_folder.get_path()
 
-# Remove old output folder if it exists
-if os.path.exists(output_folder_path):
-    shutil.rmtree(output_folder_path)
-
 # Retrieve recipe parameters
 config = get_recipe_config()
 text_column = config.get('text_column')
@@ -33,12 +57,87 @@ attribute_columns = config.get('attribute_columns', [])
 verbose_mode = config.get('verbose_mode', False)
 chat_completion_llm_id = config.get("chat_completion_llm_id")
 embedding_llm_id = config.get("embedding_llm_id")
-
+index_mode = config.get("index_mode", "full")
+id_column = config.get("id_column") or None
+resume_interrupted_builds = config.get("resume_interrupted_builds", True)
+max_in_flight_requests = config.get("max_in_flight_requests", 50)
+requests_per_second = config.get("requests_per_second", 0)
+adaptive_concurrency = config.get("adaptive_concurrency", True)
+llm_max_attempts = config.get("llm_max_attempts", 6)
+embedding_batch_size = config.get("embedding_batch_size", 256)
+embedding_batch_max_tokens = config.get("embedding_batch_max_tokens", 100000)
+use_llm_cache = config.get("use_llm_cache", True)
+llm_cache_max_size_mb = config.get("llm_cache_max_size_mb", 2048)
+use_embedding_cache = config.get("use_embedding_cache", True)
+export_chunk_size = config.get("export_chunk_size", 10000)
+rows_per_input_file = config.get("rows_per_input_file", 100000)
+
+run_id = time.strftime("%Y%m%d-%H%M%S")
+
+# An incremental run needs the index and the document manifest of a previous run
+previous_manifest = None
+previous_build_state = load_build_state(output_folder_path)
+# The generation agents currently serve, an incremental run updates a copy of it
+published_manifest = read_index_manifest(output_folder_path)
+published_output_dir = os.path.join(output_folder_path, published_manifest["output_dir"] if published_manifest else LEGACY_OUTPUT_DIR_NAME)
+if index_mode == "incremental":
+    previous_manifest = load_manifest(output_folder_path)
+    if previous_manifest is None:
+        logger.warning("No previous index found in the output folder, running a full build")
+        index_mode = "full"
+    elif previous_build_state is not None and previous_build_state.index_mode == "full" and previous_build_state.is_incomplete():
+        logger.warning("The previous full build did not finish, there is no complete index to update: running a full build")
+        previous_manifest = None
+        index_mode = "full"
+
+# A build that did not finish (failed workflow, killed job...) is picked up where it stopped by the
+# next run with the same settings: it keeps its run id, graphrag skips the workflows whose tables
+# exist and the LLM responses of the chunks already processed are replayed from the cache.
+resource_folder_path = get_recipe_resource()
+config_fingerprint = fingerprint_config(
+    resource_folder_path,
+    text_column=text_column,
+    attribute_columns=attribute_columns,
+    id_column=id_column,
+    chat_completion_llm_id=chat_completion_llm_id,
+    embedding_llm_id=embedding_llm_id
+)
+resuming = bool(
+    resume_interrupted_builds
+    and previous_build_state is not None
+    and previous_build_state.can_resume(index_mode, config_fingerprint)
+)
+if resuming:
+    run_id = previous_build_state.run_id
+    logger.info(f"Resuming the interrupted {index_mode} build {run_id}, attempt {previous_build_state.attempts + 1}")
+
+# Remove old output folder content if it exists, except the LLM cache that must survive rebuilds.
+# The published index manifest and the index generations stay until the new index replaces them,
+# agents keep serving the previous generation meanwhile. The state directory holds the document
+# manifest and the progress of interrupted builds. Incremental runs keep the previous index.
+kept_entries = {CACHE_DIR_NAME, INDEX_MANIFEST_FILE_NAME, LEGACY_OUTPUT_DIR_NAME, GENERATIONS_DIR_NAME, STATE_DIR_NAME}
+if index_mode == "incremental":
+    kept_entries.add("update_output")
+if os.path.exists(output_folder_path):
+    for entry in os.listdir(output_folder_path):
+        if entry in kept_entries:
+            continue
+        entry_path = os.path.join(output_folder_path, entry)
+        if os.path.isdir(entry_path):
+            shutil.rmtree(entry_path)
+        else:
+            os.remove(entry_path)
+
+# Optional dedicated folder for the LLM cache
+cache_folder_names = get_output_names_for_role('cache_folder')
+if cache_folder_names:
+    cache_dir = get_cache_dir(dataiku.Folder(cache_folder_names[0]).get_path())
+else:
+    cache_dir = get_cache_dir(output_folder_path)
 
 if verbose_mode:
     logging.basicConfig(level=logging.DEBUG)  # Set minimum level to DEBUG
 
-resource_folder_path = get_recipe_resource()
 settings_source = os.path.join(resource_folder_path, "settings.yaml")
 settings_target = os.path.join(output_folder_path, "settings.yaml")
 
@@ -74,36 +173,187 @@ logger.debug("Created input directory")
 
 
 
-# Write the entire dataset to a CSV file named after the dataset in the input directory
+# Stream the dataset in chunks to partitioned CSV files in the input directory, so the recipe memory
+# does not depend on the dataset size. Incremental runs only write the new and changed documents,
+# to files named after the run: graphrag treats documents with an unknown title (the file name) as new.
 selected_columns = [text_column] + attribute_columns
-df = input_dataset.get_dataframe(columns=selected_columns)
-input_file_path = os.path.join(input_dir, f"{input_dataset_name}.csv")
-df.to_csv(input_file_path, index=False, encoding='utf-8')
-
-logger.debug(f"Input dataset copied to indexinf folder: {input_file_path}")
-
-
+read_columns = selected_columns + ([id_column] if id_column and id_column not in selected_columns else [])
+document_differ = DocumentDiffer(previous_manifest)
+
+def select_rows(chunk):
+    rows_to_index = document_differ.diff_chunk(compute_manifest(chunk, selected_columns, id_column))
+    if index_mode == "incremental":
+        chunk = chunk[rows_to_index.to_numpy()]
+    return chunk[selected_columns]
+
+input_file_prefix = f"delta-{run_id}" if index_mode == "incremental" else input_dataset_name
+export_stats = export_dataset(
+    input_dataset,
+    read_columns,
+    input_dir,
+    input_file_prefix,
+    transform=select_rows,
+    chunk_size=export_chunk_size,
+    rows_per_file=rows_per_input_file
+)
+document_diff = document_differ.finish()
+logger.info(f"Documents: {document_diff.added} added, {document_diff.changed} changed, {document_diff.removed} removed")
 logger.debug(f"Selected columns for indexing: {selected_columns}")
-logger.debug(f"DataFrame shape: {df.shape}")
+
+if index_mode == "incremental":
+    if document_diff.removed or (document_diff.changed and not id_column):
+        logger.warning("Removed and previous versions of changed documents stay in the index until the next full build")
+    if export_stats["rows_written"] == 0:
+        save_manifest(output_folder_path, document_diff.manifest)
+        logger.info("No new or changed documents, the index is up to date")
+        sys.exit(0)
+
+documents_fingerprint = fingerprint_documents(document_diff.manifest)
+if resuming and previous_build_state.documents_fingerprint != documents_fingerprint:
+    logger.warning(f"The input dataset changed since the interrupted build {run_id}, starting over")
+    resuming = False
+
+# The build writes a new generation directory, published through the index manifest once complete:
+# the generation agents serve is never modified in place. A resumed full build keeps the directory
+# and the tables of the workflows it completed. An incremental run cannot be resumed by graphrag, it
+# starts again from links to the tables of the published generation, which it reads and replaces.
+generation_dir = get_generation_dir(output_folder_path, run_id)
+if (index_mode == "incremental" or not resuming) and os.path.isdir(generation_dir):
+    shutil.rmtree(generation_dir)
+if index_mode == "incremental":
+    stage_generation(published_output_dir, generation_dir)
+os.makedirs(generation_dir, exist_ok=True)
 
 root_dir = Path(output_folder_path)
 graph_rag_config = load_config(root_dir, None)
 
-
-# Override relative paths with absolute paths for vector db
-if "db_uri" in graph_rag_config.embeddings.vector_store:
-    graph_rag_config.embeddings.vector_store["db_uri"] = root_dir / graph_rag_config.embeddings.vector_store["db_uri"]
-    logger.info(f"Setting vector db absolite path: {graph_rag_config.embeddings.vector_store['db_uri'] }")
+graph_rag_config.storage.base_dir = os.path.relpath(generation_dir, output_folder_path)
+# The vector store is written from scratch (overwrite), an update run re-embeds every merged table
+graph_rag_config.embeddings.vector_store["db_uri"] = str(Path(generation_dir) / VECTOR_STORE_DIR_NAME)
+logger.info(f"Building index generation {run_id} in {generation_dir}")
+
+if index_mode == "incremental":
+    update_output_path = root_dir / "update_output"
+    if update_output_path.exists():
+        shutil.rmtree(update_output_path)
+    graph_rag_config.update_index_storage = StorageConfig(type=StorageType.file, base_dir=str(update_output_path))
+    # The update merges the new documents into the existing tables and re-embeds every merged table,
+    # so the vectors are rewritten rather than appended, which would duplicate them
+    graph_rag_config.embeddings.vector_store["overwrite"] = True
+
+if resuming:
+    build_state = previous_build_state
+    tables_dir = str(root_dir / graph_rag_config.storage.base_dir) if index_mode == "full" else None
+    skipped_workflows = build_state.resume(tables_dir)
+    logger.info(f"Workflows completed by the interrupted build, skipped: {skipped_workflows}")
 else:
-    logger.error("Error: 'db_uri' key not found in vector_store")
-
-
+    build_state = BuildState(output_folder_path, run_id, index_mode, config_fingerprint, documents_fingerprint)
+    build_state.save()
+
+
+# All chat and embedding calls of the build share one executor and one concurrency limit
+llm_mesh_limiter = configure_llm_mesh_limiter(
+    max_in_flight=max_in_flight_requests,
+    requests_per_second=requests_per_second,
+    adaptive=adaptive_concurrency
+)
+# One pooled API client and one handle per LLM for every adapter of the build
+configure_dataiku_client(pool_size=max_in_flight_requests)
+# Texts are counted once, with the tokenizer of the index, to size the batches and for the usage statistics
+configure_embedding_coalescing(
+    max_batch_items=embedding_batch_size,
+    max_batch_tokens=embedding_batch_max_tokens,
+    encoding_name=graph_rag_config.encoding_model
+)
+
+# Without the persistent LLM cache, the responses of the run are still checkpointed until it succeeds
+# so that resuming it does not pay again for the chunks already extracted
+checkpoint_cache_path = os.path.join(output_folder_path, STATE_DIR_NAME, CHECKPOINT_CACHE_FILE_NAME)
+if not resuming:
+    for entry_path in glob.glob(checkpoint_cache_path + "*"):
+        os.remove(entry_path)
+response_cache = None
+checkpoint_cache = None
+if use_llm_cache:
+    response_cache = SQLiteLLMCache(os.path.join(cache_dir, "llm_responses.sqlite"), max_size_bytes=llm_cache_max_size_mb * 1024 * 1024)
+elif resume_interrupted_builds:
+    checkpoint_cache = response_cache = SQLiteLLMCache(checkpoint_cache_path, max_size_bytes=llm_cache_max_size_mb * 1024 * 1024)
+
+embedding_cache = None
+if use_embedding_cache:
+    embedding_cache = get_embedding_cache(os.path.join(cache_dir, "embeddings"), embedding_llm_id)
+
+# Per-workflow durations, LLM calls and token counts of this build
+usage_tracker = configure_usage_tracker(encoding_name=graph_rag_config.encoding_model)
 
 # --- Run the builder ---
-builder = DataikuGraphragIndexBuilder(chat_completion_llm_id, embedding_llm_id)
-asyncio.run(builder.run_build_index_pipeline(
-        config=graph_rag_config,
-        verbose=True,
-        resume=None,
-        memprofile=False
-))
\ No newline at end of file
+# The build state and statistics are recorded however the build ends, an exception included
+build_succeeded = False
+build_error = None
+try:
+    builder = DataikuGraphragIndexBuilder(
+        chat_completion_llm_id,
+        embedding_llm_id,
+        response_cache=response_cache,
+        embedding_cache=embedding_cache,
+        usage_tracker=usage_tracker,
+        retry_policy=RetryPolicy(max_attempts=llm_max_attempts),
+        build_state=build_state
+    )
+    if index_mode == "incremental":
+        build_succeeded = asyncio.run(builder.run_update_index_pipeline(
+                config=graph_rag_config,
+                verbose=True,
+                resume=run_id,
+                memprofile=False
+        ))
+    else:
+        build_succeeded = asyncio.run(builder.run_build_index_pipeline(
+                config=graph_rag_config,
+                verbose=True,
+                resume=run_id if resuming else None,
+                memprofile=False
+        ))
+
+    # The manifest is the baseline of the next incremental run, only move it forward on success.
+    # Publishing the new index generation lets running agents swap it in.
+    if build_succeeded:
+        # Precomputed adjacency and token counts used by the agents to build local search contexts
+        build_context_index(str(root_dir / graph_rag_config.storage.base_dir), graph_rag_config.encoding_model)
+        save_manifest(output_folder_path, document_diff.manifest)
+        write_index_manifest(
+            output_folder_path,
+            generation=run_id,
+            output_dir=generation_dir,
+            vector_store_dir=os.path.relpath(graph_rag_config.embeddings.vector_store["db_uri"], output_folder_path),
+            index_mode=index_mode,
+            chat_completion_llm_id=chat_completion_llm_id,
+            embedding_llm_id=embedding_llm_id
+        )
+        # Agents that did not reload yet keep serving the previous generation
+        remove_stale_generations(output_folder_path, keep_dirs=[generation_dir, published_output_dir])
+        if checkpoint_cache is not None:
+            checkpoint_cache.close()
+            for entry_path in glob.glob(checkpoint_cache_path + "*"):
+                os.remove(entry_path)
+except BaseException as e:
+    build_succeeded = False
+    build_error = f"{type(e).__name__}: {e}"
+    raise
+finally:
+    build_state.finish(build_succeeded, error=build_error)
+    logger.info(f"Index {index_mode} build finished: success={build_succeeded}, {document_diff.added} documents added, {document_diff.changed} changed, {document_diff.removed} removed")
+
+    logger.info(f"LLM Mesh limiter stats: {llm_mesh_limiter.stats()}")
+
+    # Build statistics are written even for failed builds, they are what explains them
+    usage_tracker.write(os.path.join(output_folder_path, BUILD_STATS_FILE_NAME))
+    stats_dataset_names = get_output_names_for_role('stats_dataset')
+    if stats_dataset_names:
+        stats_df = pd.DataFrame(usage_tracker.to_records())
+        stats_df.insert(0, "run_id", run_id)
+        stats_df.insert(1, "index_mode", index_mode)
+        stats_df.insert(2, "build_succeeded", build_succeeded)
+        stats_df.insert(3, "build_error", build_error)
+        dataiku.Dataset(stats_dataset_names[0]).write_with_schema(stats_df)
+    logger.info(f"Embedding coalescing stats: {get_embedding_coalescing_stats()}")
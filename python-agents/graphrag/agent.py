@@ -1,27 +1,71 @@
 
 import dku_graphrag.query.query_monkey_patch_dataiku 
+import dku_graphrag.query.query_monkey_patch_tokens
 
 
 
-import asyncio
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 import pandas as pd
 import logging
 import dataiku
 from dataiku.llm.python import BaseLLM
 from dataiku.langchain.dku_tracer import LangchainToDKUTracer
-from graphrag.config.load_config import load_config
-from graphrag.api.query import global_search, local_search
-
-def ensure_event_loop():
-    try:
-        return asyncio.get_event_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        return loop
-
+from graphrag.query.llm.get_client import get_text_embedder
+from dku_graphrag.query.global_search import (
+    ReportRanker,
+    build_ranked_global_search_engine,
+    count_global_context_rows,
+    ranked_global_search,
+    ranked_global_search_streaming,
+)
+from dku_graphrag.query.hybrid_search import (
+    DEFAULT_MIN_ANSWER_LENGTH,
+    HYBRID_SEARCH,
+    MERGE,
+    RACE,
+    HybridMergedSearch,
+    build_local_search_context,
+    race_searches,
+)
+from dku_graphrag.query.index_loader import INDEX_TABLE_FILES
+from dku_graphrag.query.index_reloader import IndexReloader, load_index_generation
+from dku_graphrag.query.local_search import (
+    build_local_context_builder,
+    count_local_context_rows,
+    get_local_search_engine,
+    local_search,
+    local_search_streaming,
+)
+from dku_graphrag.query.sharded_search import (
+    ShardedGlobalSearch,
+    ShardedIndex,
+    ShardedLocalSearch,
+    shard_target_key_points,
+    sharded_search,
+    sharded_search_streaming,
+)
+from dku_graphrag.query.query_cache import QueryResultCache
+from dku_graphrag.query.token_counts import get_token_count_cache, load_token_counts
+from dku_graphrag.utils.concurrency import CrossLoopSemaphore, configure_llm_mesh_limiter, get_llm_mesh_limiter
+from dku_graphrag.utils.dataiku_client import configure_dataiku_client
+from dku_graphrag.utils.deadline import (
+    ANSWER_TRUNCATED,
+    CACHED_ANSWER,
+    NO_ANSWER,
+    Deadline,
+    DeadlineExceededError,
+    deadline_context,
+    get_deadline,
+    with_deadline,
+)
+from dku_graphrag.utils.embedding_cache import set_default_embedding_cache_dir
+from dku_graphrag.utils.event_loop import get_background_event_loop
+from dku_graphrag.utils.llm_cache import get_cache_dir
 
 def get_span_builder_for_callback_manager_2(callbacks):
     if hasattr(callbacks, "handlers"):
@@ -43,67 +87,478 @@ class MyLLM(BaseLLM):
 
     def set_config(self, config, plugin_config):
         self.config = config
-        self.folder_path  = Path(dataiku.Folder(config.get("index_folder_id") ).get_path())
+        # The index can be split in shards, each built by its own index-builder run over a partition of the corpus
+        self.index_folder_ids = [config.get("index_folder_id"), *[folder_id for folder_id in config.get("shard_index_folder_ids") or [] if folder_id]]
+        self.folder_paths = [Path(dataiku.Folder(folder_id).get_path()) for folder_id in self.index_folder_ids]
+        self.folder_path = self.folder_paths[0]
         self.search_type = config.get("search_type", "local")       
+        # Empty LLM ids default to the ones that built each index, recorded in its manifest
+        self.chat_llm_id = config.get("chat_completion_llm_id") or None
+        self.embedding_llm_id = config.get("embedding_llm_id") or None
+        self.map_llm_id = config.get("map_llm_id") or None
         self.default_community_level = config.get("default_community_level", 0) 
         self.response_type = config.get("response_type", "multiple paragraphs")    
-        self.graphrag_config = load_config(self.folder_path)  
-        if "db_uri" in self.graphrag_config.embeddings.vector_store:
-        # Update the 'db_uri' value
-            self.graphrag_config.embeddings.vector_store["db_uri"] = str(self.folder_path  / self.graphrag_config.embeddings.vector_store["db_uri"])
-        else:
-            print("Error: 'db_uri' key not found in vector_store")  
-        index_output_folder = self.folder_path  / Path(self.graphrag_config.storage.base_dir) 
-        self.nodes = pd.read_parquet(index_output_folder / 'create_final_nodes.parquet')
-        self.entities = pd.read_parquet(index_output_folder / 'create_final_entities.parquet')
-        self.communities = pd.read_parquet(index_output_folder / 'create_final_communities.parquet')
-        self.community_reports = pd.read_parquet(index_output_folder / 'create_final_community_reports.parquet')
-        self.text_units = None
-        self.relationships = None
-        self.covariates_df = None
-        if self.search_type == "local":
-            self.text_units = pd.read_parquet(index_output_folder / 'create_final_text_units.parquet')
-            self.relationships = pd.read_parquet(index_output_folder / 'create_final_relationships.parquet')
-            covariates_path = index_output_folder / 'create_final_covariates.parquet'
-            # covariates are optional
-            if covariates_path.exists():
-                self.covariates_df = pd.read_parquet(covariates_path)
-        self.logger.info(f"Agent config initialized with: search_type={self.search_type}, folder_path ={self.folder_path}, default_community_level={self.default_community_level},  response_type ={self.response_type }")
-
-    async def search(self, query: str):
-        self.logger.info(f"Agent search: search_type={self.search_type}, query ={query}")
-        if self.search_type == "global":
-            response, context = await global_search(
-                config=self.graphrag_config,
-                nodes=self.nodes,
-                entities=self.entities,
-                communities=self.communities,
-                community_reports=self.community_reports,
-                community_level=None,
-                dynamic_community_selection=False,
-                response_type=self.response_type,
-                query=query
+        configure_llm_mesh_limiter(
+            max_in_flight=config.get("max_in_flight_requests", 50),
+            requests_per_second=config.get("requests_per_second", 0)
+        )
+        configure_dataiku_client(pool_size=config.get("max_in_flight_requests", 50))
+        if config.get("use_embedding_cache", True):
+            set_default_embedding_cache_dir(str(Path(get_cache_dir(str(self.folder_path))) / "embeddings"))
+        self.index_folder_id = self.index_folder_ids[0]
+        # Tables are shared by every agent of the process pointing at the same, unchanged index
+        # Optional in-memory ANN index replacing LanceDB for the query to entity lookup of local search
+        self.vector_index_dtype = config.get("ann_vector_dtype", "float32") if config.get("use_ann_index", False) else None
+        # Search settings are read before the shards are loaded, which prepares their search structures
+        self.dynamic_community_selection = config.get("dynamic_community_selection", False)
+        self.rank_community_reports = config.get("rank_community_reports", True)
+        self.global_map_concurrency = config.get("global_map_concurrency", 0) or None
+        self.global_target_key_points = config.get("global_target_key_points", 0)
+        self.global_min_key_point_score = config.get("global_min_key_point_score", 80)
+        # Hybrid search runs local and global search side by side
+        self.hybrid_strategy = config.get("hybrid_strategy", RACE)
+        self.hybrid_latency_budget = config.get("hybrid_latency_budget", 0) or None
+        self.hybrid_min_answer_length = config.get("hybrid_min_answer_length", DEFAULT_MIN_ANSWER_LENGTH)
+        # Requests degrade their search to answer within this time
+        self.request_deadline = config.get("request_deadline", 0) or None
+        # Report rankers of the shards, by folder id, with the index generation they were built for
+        self.report_rankers = {}
+        with ThreadPoolExecutor(max_workers=len(self.index_folder_ids)) as pool:
+            shards = list(pool.map(partial(self._load_shard, require_complete=False), range(len(self.index_folder_ids))))
+        self.index = ShardedIndex(shards)
+        self._swap_lock = threading.Lock()
+        # Each shard is reloaded on its own when its index-builder publishes a new generation
+        self.index_reloaders = []
+        index_reload_interval = config.get("index_reload_interval", 30)
+        if index_reload_interval:
+            self.index_reloaders = [
+                IndexReloader(
+                    folder_path,
+                    load_generation=partial(self._load_shard, position),
+                    on_reload=partial(self._swap_shard, position),
+                    current_version=shard.version,
+                    poll_interval_seconds=index_reload_interval
+                ).start()
+                for position, (folder_path, shard) in enumerate(zip(self.folder_paths, shards))
+            ]
+        self.query_cache = None
+        if config.get("use_query_cache", True):
+            self.query_cache = QueryResultCache(
+                max_entries=config.get("query_cache_max_entries", 1000),
+                ttl_seconds=config.get("query_cache_ttl", 3600),
+                similarity_threshold=config.get("semantic_cache_threshold", 0) or None
+            )
+        # Requests of every agent run on one long-lived loop, the searches of this agent are capped
+        self.background_loop = get_background_event_loop()
+        self.search_slots = CrossLoopSemaphore(config.get("max_concurrent_searches", 16))
+        self.logger.info(f"Agent config initialized with: search_type={self.search_type}, index_folders={self.index_folder_ids}, index_version={self.index.version}, default_community_level={self.default_community_level},  response_type ={self.response_type }")
+
+    def _load_shard(self, position: int, require_complete: bool = True):
+        return self._prepare_index(load_index_generation(
+            self.index_folder_ids[position], self.folder_paths[position], self.search_type,
+            require_complete=require_complete, vector_index_dtype=self.vector_index_dtype,
+            chat_llm_id=self.chat_llm_id, embedding_llm_id=self.embedding_llm_id
+        ))
+
+    def _swap_shard(self, position: int, shard):
+        # A single reference assignment: in-flight searches keep the index they started with
+        with self._swap_lock:
+            self.index = self.index.replace(position, shard)
+
+    async def _acquire_search_slot(self, cache_report: dict) -> None:
+        enqueued_at = time.perf_counter()
+        await self.search_slots.acquire()
+        cache_report["queued_seconds"] = time.perf_counter() - enqueued_at
+
+    async def _warm_query_embedding(self, index, query: str) -> None:
+        # Local search embeds the query synchronously, which would block the shared loop:
+        # embed it asynchronously first so that the synchronous call is served by the embedding cache,
+        # or by the in-memory query embeddings when the cache is disabled
+        if self.search_type != "global":
+            await get_text_embedder(index.graphrag_config).aembed(query)
+
+    def _get_report_ranker(self, index):
+        if not self.rank_community_reports:
+            return None
+        # Report vectors are only valid for the index generation they were computed on
+        version, report_ranker = self.report_rankers.get(index.folder_id, (None, None))
+        if report_ranker is None or version != index.version:
+            report_ranker = ReportRanker(get_text_embedder(index.graphrag_config))
+            self.report_rankers[index.folder_id] = (index.version, report_ranker)
+        return report_ranker
+
+    def _global_search_kwargs(self, index, n_shards: int = 1) -> dict:
+        return {
+            "nodes": index.nodes,
+            "entities": index.entities,
+            "communities": index.communities,
+            "community_reports": index.community_reports,
+            "community_level": None,
+            "dynamic_community_selection": self.dynamic_community_selection,
+            "response_type": self.response_type,
+            "report_ranker": self._get_report_ranker(index),
+            "map_concurrency": self.global_map_concurrency,
+            "target_key_points": shard_target_key_points(self.global_target_key_points, n_shards),
+            "min_key_point_score": self.global_min_key_point_score,
+            "map_llm_id": self.map_llm_id,
+        }
+
+    def _prepare_index(self, index):
+        """
+        Build the search structures of a newly loaded index generation, before it serves requests.
+        """
+        if self.search_type != "global":
+            # The tables are converted once per generation instead of once per query
+            index.local_context_builder = build_local_context_builder(
+                config=index.graphrag_config,
+                nodes=index.nodes,
+                entities=index.entities,
+                community_reports=index.community_reports,
+                text_units=index.text_units,
+                relationships=index.relationships,
+                covariates=index.covariates,
+                community_level=self.default_community_level,
+                description_embedding_store=index.entity_vector_store,
+                context_index=index.context_index
+            )
+        self._load_token_counts(index)
+        return index
+
+    def _load_token_counts(self, index) -> None:
+        """
+        Precompute the token counts of the context rows of the index, so that the queries look them up
+        instead of tokenizing them. Queries count the rows themselves if this fails.
+        """
+        def count_context_rows():
+            if self.search_type != "local":
+                count_global_context_rows(
+                    index.graphrag_config, index.nodes, index.entities, index.community_reports,
+                    community_level=None, dynamic_community_selection=self.dynamic_community_selection
+                )
+            if self.search_type != "global":
+                count_local_context_rows(index.graphrag_config, index.local_context_builder)
+
+        try:
+            entities_path = index.output_folder / INDEX_TABLE_FILES["entities"]
+            signature = (
+                f"{index.version}:{entities_path.stat().st_mtime_ns}:{self.search_type}:"
+                f"{self.default_community_level}:{self.dynamic_community_selection}"
+            )
+            load_token_counts(str(index.output_folder), index.folder_id, signature, index.graphrag_config.encoding_model, count_context_rows)
+        except Exception as e:
+            self.logger.warning(f"Could not precompute the token counts of {index.folder_id}, queries will count them: {e!r}")
+
+    def _local_search_kwargs(self, index) -> dict:
+        return {
+            "response_type": self.response_type,
+            "context_builder": index.local_context_builder,
+        }
+
+    def _sharded_search_engine(self, index, search_type: str):
+        """
+        Fan-out search engine over the shards of the index.
+        """
+        shard_names = [shard.folder_id for shard in index.shards]
+        if search_type == "global":
+            return ShardedGlobalSearch([
+                build_ranked_global_search_engine(shard.graphrag_config, **self._global_search_kwargs(shard, len(index.shards)))
+                for shard in index.shards
+            ], shard_names)
+        return ShardedLocalSearch([
+            get_local_search_engine(shard.graphrag_config, **self._local_search_kwargs(shard))
+            for shard in index.shards
+        ], shard_names)
+
+    async def search(self, query: str, index=None, latency_budget: float | None = None, report: dict | None = None):
+        """
+        Run the configured search. `report` receives which path answered a hybrid search.
+        """
+        index = index or self.index
+        await self._warm_query_embedding(index, query)
+        self.logger.info(f"Agent search: search_type={self.search_type}, index_version={index.version}, query ={query}")
+        if self.search_type == HYBRID_SEARCH:
+            return await self._hybrid_search(index, query, latency_budget, report if report is not None else {})
+        return await self._run_search(index, query, self.search_type)
+
+    async def _run_search(self, index, query: str, search_type: str):
+        if len(index.shards) > 1:
+            return await sharded_search(self._sharded_search_engine(index, search_type), query)
+        index = index.shards[0]
+        if search_type == "global":
+            response, context = await ranked_global_search(
+                config=index.graphrag_config,
+                query=query,
+                **self._global_search_kwargs(index)
             )
         else:
             response, context = await local_search(
-                config=self.graphrag_config,
-                nodes=self.nodes,
-                entities=self.entities,
-                community_reports=self.community_reports,
-                text_units=self.text_units,
-                relationships=self.relationships,
-                covariates=self.covariates_df,
-                community_level=self.default_community_level,
-                response_type=self.response_type,
-                query=query
+                config=index.graphrag_config,
+                query=query,
+                **self._local_search_kwargs(index)
             )
         return response, context 
 
+    def _hybrid_merged_engine(self, index, latency_budget: float | None) -> HybridMergedSearch:
+        """
+        Hybrid search answering once from the local context and the global key points.
+        """
+        if len(index.shards) > 1:
+            local_engine = self._sharded_search_engine(index, "local")
+            global_engine = self._sharded_search_engine(index, "global")
+            return HybridMergedSearch(local_engine.engines[0], local_engine.build_context, global_engine.map_phase, latency_budget)
+        shard = index.shards[0]
+        local_engine = get_local_search_engine(shard.graphrag_config, **self._local_search_kwargs(shard))
+        global_engine = build_ranked_global_search_engine(shard.graphrag_config, **self._global_search_kwargs(shard))
+        return HybridMergedSearch(local_engine, partial(build_local_search_context, local_engine), global_engine.map_phase, latency_budget)
+
+    async def _hybrid_search(self, index, query: str, latency_budget: float | None, report: dict):
+        if self.hybrid_strategy == MERGE:
+            engine = self._hybrid_merged_engine(index, latency_budget)
+            try:
+                return await sharded_search(engine, query)
+            finally:
+                report.update(engine.report)
+        response, context, race_report = await race_searches(
+            {search_type: partial(self._run_search, index, query, search_type) for search_type in ("local", "global")},
+            latency_budget=latency_budget,
+            min_answer_length=self.hybrid_min_answer_length
+        )
+        report.update(race_report)
+        return response, context
+
+    async def _stream_hybrid_search(self, index, query: str, latency_budget: float | None, report: dict):
+        if self.hybrid_strategy == MERGE:
+            engine = self._hybrid_merged_engine(index, latency_budget)
+            try:
+                async for chunk in sharded_search_streaming(engine, query):
+                    yield chunk
+            finally:
+                report.update(engine.report)
+            return
+        # The winner is only known once an answer is complete, it is sent in one chunk
+        response, context = await self._hybrid_search(index, query, latency_budget, report)
+        yield context
+        yield response
+
+    def _cache_scope(self, index) -> tuple:
+        community_level = None if self.search_type == "global" else self.default_community_level
+        llm_ids = (index.graphrag_config.llm.model, self.map_llm_id if self.search_type != "local" else None)
+        return (index.version, self.search_type, community_level, self.response_type, llm_ids)
+
+    async def _lookup_cache(self, index, query: str):
+        """
+        Look the query up in the exact then the semantic tier of the query cache.
+        Returns the cache entry or None, the cache report and the query embedding if one was computed.
+        """
+        scope = self._cache_scope(index)
+        entry = self.query_cache.get(scope, query)
+        if entry is not None:
+            return entry, {"query_cache": "hit", "seconds_saved": entry.compute_seconds}, None
+
+        query_embedding = None
+        if self.query_cache.semantic_enabled:
+            # The query embedding is cached, local search reuses it for free
+            query_embedding = await get_text_embedder(index.graphrag_config).aembed(query)
+            entry, similarity = self.query_cache.get_similar(scope, query_embedding)
+            if entry is not None:
+                return entry, {
+                    "query_cache": "semantic_hit",
+                    "similarity": similarity,
+                    "cached_query": entry.query,
+                    "seconds_saved": entry.compute_seconds
+                }, query_embedding
+
+        self.query_cache.record_miss()
+        return None, {"query_cache": "miss"}, query_embedding
+
+    def _store_in_cache(self, index, query: str, response, context, compute_seconds: float, query_embedding) -> None:
+        # Only cache complete answers of the generation they were computed on
+        deadline = get_deadline()
+        if self.index is index and not (deadline is not None and deadline.degraded):
+            self.query_cache.set(self._cache_scope(index), query, response, context, compute_seconds, embedding=query_embedding)
+
+    async def cached_search(self, query: str, latency_budget: float | None = None):
+        """
+        Answer from the query cache when possible, otherwise run the search and cache its result.
+        Returns the response, the context and a report of the cache lookup.
+        """
+        index = self.index
+        entry, query_embedding = None, None
+        cache_report = {"query_cache": "disabled"}
+        if self.query_cache is not None:
+            entry, cache_report, query_embedding = await self._lookup_cache(index, query)
+        if entry is not None:
+            return entry.response, entry.context, cache_report
+
+        try:
+            await with_deadline(self._acquire_search_slot(cache_report))
+        except DeadlineExceededError:
+            return self._degraded_answer(index, query, cache_report)
+        try:
+            start_time = time.perf_counter()
+            hybrid_report = {}
+            try:
+                response, context = await with_deadline(self.search(query, index, latency_budget=latency_budget, report=hybrid_report))
+            except DeadlineExceededError:
+                response, context = None, None
+            compute_seconds = time.perf_counter() - start_time
+            if hybrid_report:
+                cache_report["hybrid_search"] = hybrid_report
+        finally:
+            self.search_slots.release()
+        deadline = get_deadline()
+        # graphrag answers with an empty response when its LLM call times out
+        if not response and deadline is not None and deadline.expired():
+            return self._degraded_answer(index, query, cache_report)
+        if self.query_cache is not None:
+            self._store_in_cache(index, query, response, context, compute_seconds, query_embedding)
+        cache_report["search_seconds"] = compute_seconds
+        return response, context, cache_report
+
+    def _stream_search_results(self, index, query: str, latency_budget: float | None, report: dict):
+        """
+        Async generator of the streaming search: the context data first, then the response tokens.
+        """
+        if self.search_type == HYBRID_SEARCH:
+            return self._stream_hybrid_search(index, query, latency_budget, report)
+        if len(index.shards) > 1:
+            return sharded_search_streaming(self._sharded_search_engine(index, self.search_type), query)
+        index = index.shards[0]
+        if self.search_type == "global":
+            return ranked_global_search_streaming(
+                config=index.graphrag_config,
+                query=query,
+                **self._global_search_kwargs(index)
+            )
+        return local_search_streaming(
+            config=index.graphrag_config,
+            query=query,
+            **self._local_search_kwargs(index)
+        )
+
+    async def stream_search(self, query: str, cache_report: dict, latency_budget: float | None = None):
+        """
+        Yield the response tokens as the LLM Mesh produces them, then the context.
+        A cached answer is yielded at once. `cache_report` is filled with the cache lookup result.
+        """
+        index = self.index
+        entry, query_embedding = None, None
+        cache_report["query_cache"] = "disabled"
+        if self.query_cache is not None:
+            entry, report, query_embedding = await self._lookup_cache(index, query)
+            cache_report.update(report)
+        if entry is not None:
+            yield entry.response
+            yield self._format_context(entry.context)
+            return
+
+        try:
+            await with_deadline(self._acquire_search_slot(cache_report))
+        except DeadlineExceededError:
+            response, context, _ = self._degraded_answer(index, query, cache_report)
+            yield response
+            yield self._format_context(context)
+            return
+        try:
+            start_time = time.perf_counter()
+            # Stays empty if the search ends without yielding its context
+            context = {}
+            tokens = []
+            first_chunk = True
+            hybrid_report = {}
+            try:
+                await with_deadline(self._warm_query_embedding(index, query))
+                async for chunk in self._stream_search_results(index, query, latency_budget, hybrid_report):
+                    if first_chunk:
+                        context = chunk
+                        first_chunk = False
+                        continue
+                    tokens.append(chunk)
+                    if len(tokens) == 1:
+                        cache_report["first_token_seconds"] = time.perf_counter() - start_time
+                    yield chunk
+            except DeadlineExceededError:
+                if tokens:
+                    get_deadline().degrade(ANSWER_TRUNCATED)
+                else:
+                    response, context, _ = self._degraded_answer(index, query, cache_report)
+                    tokens.append(response)
+                    yield response
+            compute_seconds = time.perf_counter() - start_time
+        finally:
+            self.search_slots.release()
+        cache_report["search_seconds"] = compute_seconds
+        if hybrid_report:
+            cache_report["hybrid_search"] = hybrid_report
+        if self.query_cache is not None:
+            self._store_in_cache(index, query, "".join(tokens), context, compute_seconds, query_embedding)
+        yield self._format_context(context)
+
+    def _degraded_answer(self, index, query: str, cache_report: dict):
+        """
+        Answer of a search that ran out of time: the last cached answer to the query, even stale,
+        or a message saying that no answer could be found in time.
+        """
+        deadline = get_deadline()
+        entry = self.query_cache.get_fallback(self._cache_scope(index), query) if self.query_cache is not None else None
+        if entry is not None:
+            deadline.degrade(CACHED_ANSWER)
+            cache_report["query_cache"] = "fallback"
+            return entry.response, entry.context, cache_report
+        deadline.degrade(NO_ANSWER)
+        return f"The search could not complete within the {deadline.seconds:g}s deadline of the request.", {}, cache_report
+
+    @staticmethod
+    def _format_context(context) -> str:
+        context_str = json.dumps(context, indent=2)
+        return f"\n\n\n###### context: ######\n{context_str}"
+
+    @staticmethod
+    def _format_degradations(deadline: Deadline | None) -> str:
+        if deadline is None or not deadline.degraded:
+            return ""
+        return f"\n\n###### degraded: {', '.join(deadline.degradations)} ######"
+
+    def _request_deadline(self, query) -> Deadline | None:
+        # A request can set its own deadline in its context
+        seconds = (query.get("context") or {}).get("deadline") or self.request_deadline
+        return Deadline(float(seconds)) if seconds else None
+
+    def _report_query(self, cache_report: dict, trace, deadline: Deadline | None = None) -> None:
+        if deadline is not None:
+            cache_report["deadline"] = {"seconds": deadline.seconds, "degraded": deadline.degradations}
+        if self.query_cache is not None:
+            cache_report["cache_stats"] = self.query_cache.stats()
+        cache_report["token_counts"] = get_token_count_cache(self.index.graphrag_config.encoding_model).stats()
+        self.logger.info(f"Query cache: {cache_report}")
+        trace.attributes["graphrag_query_cache"] = cache_report
+        self.logger.debug(f"LLM Mesh limiter stats: {get_llm_mesh_limiter().stats()}")
+
+    def _latency_budget(self, query) -> float | None:
+        # A request can set the latency budget of a hybrid search in its context
+        latency_budget = (query.get("context") or {}).get("latency_budget")
+        return float(latency_budget) if latency_budget else self.hybrid_latency_budget
+
     def process(self, query, settings, trace):
+        latency_budget = self._latency_budget(query)
+        deadline = self._request_deadline(query)
         query = query["messages"][0]["content"]
-        loop = ensure_event_loop()
-        response, context = loop.run_until_complete(self.search(query))
-        context_str = json.dumps(context, indent=2)
-        resp_text = f"{response}\n\n\n###### context: ######\n{context_str}"
-        return {"text": resp_text}
-           
+        # Every task and thread of the search sees the deadline of the request
+        response, context, cache_report = self.background_loop.run(
+            self.cached_search(query, latency_budget), context=deadline_context(deadline)
+        )
+        self._report_query(cache_report, trace, deadline)
+        return {"text": f"{response}{self._format_context(context)}{self._format_degradations(deadline)}"}
+
+    def process_stream(self, query, settings, trace):
+        latency_budget = self._latency_budget(query)
+        deadline = self._request_deadline(query)
+        query = query["messages"][0]["content"]
+        cache_report = {}
+        search = self.stream_search(query, cache_report, latency_budget)
+        for text in self.background_loop.iterate(search, context=deadline_context(deadline)):
+            yield {"chunk": {"text": text}}
+        degradations = self._format_degradations(deadline)
+        if degradations:
+            yield {"chunk": {"text": degradations}}
+        self._report_query(cache_report, trace, deadline)
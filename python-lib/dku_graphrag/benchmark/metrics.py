@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable
+
+import numpy as np
+
+from dku_graphrag.utils.memory import get_peak_rss_bytes, get_rss_bytes
+
+RSS_SAMPLE_INTERVAL_SECONDS = 0.05
+
+
+def summarize_latencies(latencies: list[float], errors: int, wall_seconds: float) -> dict:
+    """
+    Latency percentiles in milliseconds and throughput of a series of requests.
+    """
+    values = np.asarray(latencies, dtype=np.float64) * 1000
+    summary = {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "wall_seconds": round(wall_seconds, 3),
+        "requests_per_second": round(len(latencies) / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+    }
+    if len(values):
+        summary.update({
+            "p50_ms": round(float(np.percentile(values, 50)), 2),
+            "p95_ms": round(float(np.percentile(values, 95)), 2),
+            "p99_ms": round(float(np.percentile(values, 99)), 2),
+            "mean_ms": round(float(values.mean()), 2),
+            "max_ms": round(float(values.max()), 2),
+        })
+    return summary
+
+
+class RSSSampler:
+    """
+    Background thread sampling the resident set size, to report the peak RSS of one scenario:
+    the process-wide peak of getrusage cannot be reset between scenarios.
+    """
+
+    def __init__(self, interval_seconds: float = RSS_SAMPLE_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self.start_rss = 0
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="benchmark-rss-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            self.peak_rss = max(self.peak_rss, get_rss_bytes())
+
+    def __enter__(self) -> "RSSSampler":
+        self.start_rss = self.peak_rss = get_rss_bytes()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, get_rss_bytes())
+
+    def report(self) -> dict:
+        return {
+            "start_rss_mb": round(self.start_rss / 1024 / 1024, 1),
+            "peak_rss_mb": round(self.peak_rss / 1024 / 1024, 1),
+            "process_peak_rss_mb": round(get_peak_rss_bytes() / 1024 / 1024, 1),
+        }
+
+
+async def run_concurrently(
+    request: Callable[[int], Awaitable],
+    n_requests: int,
+    concurrency: int,
+) -> dict:
+    """
+    Run `request(i)` for i in [0, n_requests) with at most `concurrency` requests in flight,
+    and summarize their latencies. Failed requests are counted, not timed.
+    """
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = []
+
+    async def timed(i: int) -> None:
+        async with slots:
+            start_time = time.perf_counter()
+            try:
+                await request(i)
+            except Exception as e:
+                errors.append(repr(e))
+                return
+            latencies.append(time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*[timed(i) for i in range(n_requests)])
+    summary = summarize_latencies(latencies, len(errors), time.perf_counter() - start_time)
+    if errors:
+        summary["first_error"] = errors[0]
+    return summary
+
+
+def run_in_threads(request: Callable[[int], object], n_requests: int, concurrency: int) -> dict:
+    """
+    Blocking counterpart of run_concurrently, each request runs on one of `concurrency` threads
+    like concurrent requests of the DSS agent server.
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def timed(i: int) -> None:
+        start_time = time.perf_counter()
+        try:
+            request(i)
+        except Exception as e:
+            with lock:
+                errors.append(repr(e))
+            return
+        with lock:
+            latencies.append(time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="benchmark-client") as executor:
+        list(executor.map(timed, range(n_requests)))
+    summary = summarize_latencies(latencies, len(errors), time.perf_counter() - start_time)
+    if errors:
+        summary["first_error"] = errors[0]
+    return summary
@@ -0,0 +1,324 @@
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+import types
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+from dataikuapi.dss.llm import DSSLLMStreamedCompletionChunk, DSSLLMStreamedCompletionFooter
+from dataikuapi.utils import DataikuException
+
+# Capitalized words of the extraction input are the entities the mock "extracts"
+ENTITY_PATTERN = re.compile(r"\b[A-Z][a-z]{2,}(?: [A-Z][a-z]{2,})?\b")
+MAX_ENTITIES_PER_CHUNK = 8
+ANSWER_WORDS = (
+    "the index links these entities through shared events and the reports describe how their "
+    "relationships evolved over time with several sources confirming the main facts"
+).split()
+
+
+@dataclass
+class MockLLMMeshConfig:
+    """
+    Behavior of the simulated LLM Mesh.
+
+    :param latency_ms: Base latency of every request.
+    :param jitter_ms: Random latency added to every request, uniform in [0, jitter_ms].
+    :param error_rate: Probability that a request fails with a DataikuException.
+    :param embedding_latency_per_text_ms: Latency added per text of an embedding request.
+    :param max_embedding_batch_size: Embedding requests with more texts fail, like a provider batch limit.
+    :param embedding_dimension: Dimension of the returned vectors.
+    :param completion_tokens: Number of words of a free text answer.
+    :param token_latency_ms: Delay between two streamed chunks.
+    :param responder: Function of (messages, json_mode) returning the completion text, defaults to
+        answers graphrag can parse for each of its prompts.
+    """
+
+    latency_ms: float = 200.0
+    jitter_ms: float = 100.0
+    error_rate: float = 0.0
+    embedding_latency_per_text_ms: float = 0.5
+    max_embedding_batch_size: int = 2048
+    embedding_dimension: int = 1536
+    completion_tokens: int = 120
+    token_latency_ms: float = 10.0
+    responder: Callable[[list[dict], bool], str] | None = None
+    seed: int = 0
+
+
+def _text_after(prompt: str, marker: str) -> str:
+    position = prompt.rfind(marker)
+    return prompt[position + len(marker):] if position >= 0 else prompt
+
+
+def _extraction_response(prompt: str) -> str:
+    text = _text_after(prompt, "-Real Data-")
+    text = _text_after(text, "Text:").split("######################")[0]
+    names = list(dict.fromkeys(match.upper() for match in ENTITY_PATTERN.findall(text)))[:MAX_ENTITIES_PER_CHUNK]
+    records = [f'("entity"<|>{name}<|>ORGANIZATION<|>{name} is mentioned in the source text)' for name in names]
+    records += [
+        f'("relationship"<|>{source}<|>{target}<|>{source} is related to {target}<|>{1 + i % 9})'
+        for i, (source, target) in enumerate(zip(names, names[1:]))
+    ]
+    return "\n##\n".join(records) + "\n<|COMPLETE|>"
+
+
+def _community_report_response(prompt: str) -> str:
+    title = " ".join(ENTITY_PATTERN.findall(_text_after(prompt, "-Real Data-"))[:2]) or "Community"
+    return json.dumps({
+        "title": f"{title} community",
+        "summary": f"The {title} community groups entities that appear together in the documents.",
+        "findings": [
+            {"summary": f"{title} finding {i}", "explanation": " ".join(ANSWER_WORDS) + " [Data: Entities (1, 2)]."}
+            for i in range(3)
+        ],
+        "rating": 5.0,
+        "rating_explanation": "Average impact.",
+    })
+
+
+def _map_response() -> str:
+    return json.dumps({
+        "points": [
+            {"description": " ".join(ANSWER_WORDS[:12]) + " [Data: Reports (1)]", "score": 90},
+            {"description": " ".join(ANSWER_WORDS[12:]) + " [Data: Reports (2)]", "score": 60},
+        ]
+    })
+
+
+def default_responder(messages: list[dict], json_mode: bool, completion_tokens: int = 120) -> str:
+    """
+    Answer each graphrag prompt with a response its parser accepts.
+    """
+    prompt = "\n".join(str(message.get("content", "")) for message in messages)
+    last_message = str(messages[-1].get("content", "")) if messages else ""
+    if "Answer YES | NO" in last_message:
+        return "NO"
+    if last_message.startswith("MANY entities"):
+        return "<|COMPLETE|>"
+    if "-Real Data-" in prompt and "Entity_types:" in prompt:
+        return _extraction_response(last_message)
+    if '"findings"' in prompt:
+        return _community_report_response(prompt)
+    if '"points"' in prompt:
+        return _map_response()
+    return " ".join(ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(completion_tokens))
+
+
+class MockLLMMesh:
+    """
+    Local stand-in for the LLM Mesh returned by `dataiku.api_client().get_default_project().get_llm()`.
+    Requests block the calling thread for the simulated latency, like the real HTTP client does.
+    """
+
+    def __init__(self, config: MockLLMMeshConfig | None = None):
+        self.config = config or MockLLMMeshConfig()
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self.completions = 0
+        self.embedding_requests = 0
+        self.embedded_texts = 0
+        self.errors = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+
+    def _request(self, extra_latency_ms: float = 0.0) -> None:
+        """
+        Simulate the latency of one request and fail it at the configured error rate.
+        """
+        with self._lock:
+            jitter = self._random.uniform(0, self.config.jitter_ms)
+            failed = self._random.random() < self.config.error_rate
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        try:
+            time.sleep((self.config.latency_ms + jitter + extra_latency_ms) / 1000)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        if failed:
+            with self._lock:
+                self.errors += 1
+            raise DataikuException("Mock LLM Mesh: simulated provider error (HTTP 503)")
+
+    def respond(self, messages: list[dict], json_mode: bool) -> str:
+        if self.config.responder is not None:
+            return self.config.responder(messages, json_mode)
+        return default_responder(messages, json_mode, self.config.completion_tokens)
+
+    def embed(self, text: str) -> list[float]:
+        # Deterministic vectors: equal texts get equal embeddings across runs
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).standard_normal(self.config.embedding_dimension).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "completions": self.completions,
+                "embedding_requests": self.embedding_requests,
+                "embedded_texts": self.embedded_texts,
+                "errors": self.errors,
+                "max_in_flight": self.max_in_flight,
+            }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.completions = self.embedding_requests = self.embedded_texts = self.errors = self.max_in_flight = 0
+
+    def get_llm(self, llm_id: str) -> "MockLLM":
+        return MockLLM(self, llm_id)
+
+
+class MockCompletionResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.success = True
+
+
+class MockCompletion:
+    def __init__(self, mesh: MockLLMMesh):
+        self.mesh = mesh
+        self.messages = []
+        self.json_mode = False
+        self.settings = {}
+
+    def with_message(self, message: str, role: str = "user") -> "MockCompletion":
+        self.messages.append({"role": role, "content": message})
+        return self
+
+    def with_json_output(self, schema=None, strict=None, compatible=None) -> "MockCompletion":
+        self.json_mode = True
+        return self
+
+    def execute(self) -> MockCompletionResponse:
+        self.mesh._request()
+        with self.mesh._lock:
+            self.mesh.completions += 1
+        return MockCompletionResponse(self.mesh.respond(self.messages, self.json_mode))
+
+    def execute_streamed(self):
+        self.mesh._request()
+        with self.mesh._lock:
+            self.mesh.completions += 1
+        words = self.mesh.respond(self.messages, self.json_mode).split(" ")
+        for i, word in enumerate(words):
+            time.sleep(self.mesh.config.token_latency_ms / 1000)
+            yield DSSLLMStreamedCompletionChunk({"text": word if i == 0 else f" {word}"})
+        yield DSSLLMStreamedCompletionFooter({"finishReason": "stop"})
+
+
+class MockEmbeddingsResponse:
+    def __init__(self, embeddings: list[list[float]]):
+        self.embeddings = embeddings
+
+    def get_embeddings(self) -> list[list[float]]:
+        return self.embeddings
+
+
+class MockEmbeddings:
+    def __init__(self, mesh: MockLLMMesh):
+        self.mesh = mesh
+        self.texts = []
+
+    def add_text(self, text: str) -> "MockEmbeddings":
+        self.texts.append(text)
+        return self
+
+    def execute(self) -> MockEmbeddingsResponse:
+        if len(self.texts) > self.mesh.config.max_embedding_batch_size:
+            raise DataikuException(
+                f"Mock LLM Mesh: {len(self.texts)} texts exceed the batch limit of {self.mesh.config.max_embedding_batch_size}"
+            )
+        self.mesh._request(self.mesh.config.embedding_latency_per_text_ms * len(self.texts))
+        with self.mesh._lock:
+            self.mesh.embedding_requests += 1
+            self.mesh.embedded_texts += len(self.texts)
+        return MockEmbeddingsResponse([self.mesh.embed(text) for text in self.texts])
+
+
+class MockLLM:
+    def __init__(self, mesh: MockLLMMesh, llm_id: str):
+        self.mesh = mesh
+        self.llm_id = llm_id
+
+    def new_completion(self) -> MockCompletion:
+        return MockCompletion(self.mesh)
+
+    def new_embeddings(self) -> MockEmbeddings:
+        return MockEmbeddings(self.mesh)
+
+
+class _MockProject:
+    def __init__(self, mesh: MockLLMMesh):
+        self.mesh = mesh
+
+    def get_llm(self, llm_id: str) -> MockLLM:
+        return self.mesh.get_llm(llm_id)
+
+
+class _MockClient:
+    def __init__(self, mesh: MockLLMMesh):
+        self.mesh = mesh
+
+    def get_default_project(self) -> _MockProject:
+        return _MockProject(self.mesh)
+
+
+class _MockFolder:
+    paths: dict[str, str] = {}
+
+    def __init__(self, folder_id: str):
+        self.folder_id = folder_id
+
+    def get_path(self) -> str:
+        return self.paths[self.folder_id]
+
+
+def install_mock_llm_mesh(mesh: MockLLMMesh, folders: dict[str, str] | None = None) -> None:
+    """
+    Route `dataiku.api_client()` to the mock LLM Mesh and `dataiku.Folder(id).get_path()` to local
+    directories. Outside of DSS, where the `dataiku` package does not exist, a minimal one providing
+    what the plugin code imports is registered instead.
+
+    :param folders: Local directory of each managed folder id.
+    """
+    try:
+        import dataiku
+    except ImportError:
+        dataiku = _register_standalone_dataiku_module()
+    _MockFolder.paths = dict(folders or {})
+    dataiku.api_client = lambda: _MockClient(mesh)
+    dataiku.Folder = _MockFolder
+    # Handles cached from a previous client must not outlive it
+    from dku_graphrag.utils.dataiku_client import reset_dataiku_client
+    reset_dataiku_client()
+
+
+def _register_standalone_dataiku_module() -> types.ModuleType:
+    class BaseLLM:
+        pass
+
+    class LangchainToDKUTracer:
+        pass
+
+    modules = {
+        "dataiku": types.ModuleType("dataiku"),
+        "dataiku.llm": types.ModuleType("dataiku.llm"),
+        "dataiku.llm.python": types.ModuleType("dataiku.llm.python"),
+        "dataiku.langchain": types.ModuleType("dataiku.langchain"),
+        "dataiku.langchain.dku_tracer": types.ModuleType("dataiku.langchain.dku_tracer"),
+    }
+    modules["dataiku.llm.python"].BaseLLM = BaseLLM
+    modules["dataiku.langchain.dku_tracer"].LangchainToDKUTracer = LangchainToDKUTracer
+    modules["dataiku"].llm = modules["dataiku.llm"]
+    modules["dataiku"].langchain = modules["dataiku.langchain"]
+    modules["dataiku.llm"].python = modules["dataiku.llm.python"]
+    modules["dataiku.langchain"].dku_tracer = modules["dataiku.langchain.dku_tracer"]
+    sys.modules.update(modules)
+    return modules["dataiku"]
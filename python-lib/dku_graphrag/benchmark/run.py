@@ -0,0 +1,123 @@
+"""
+Benchmark the Dataiku LLM adapters and the search paths against a local mock LLM Mesh.
+
+    python -m dku_graphrag.benchmark.run --scenarios chat,embedding,local_query --output results.json
+
+Run from python-lib with the plugin code env. Results are printed as JSON, latencies in milliseconds.
+"""
+import argparse
+import dataclasses
+import json
+import logging
+import platform
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from dku_graphrag.benchmark.metrics import RSSSampler
+from dku_graphrag.benchmark.mock_llm_mesh import MockLLMMesh, MockLLMMeshConfig, install_mock_llm_mesh
+from dku_graphrag.benchmark.scenarios import INDEX_FOLDER_ID, SCENARIOS, BenchmarkContext
+from dku_graphrag.utils.concurrency import configure_llm_mesh_limiter
+from dku_graphrag.utils.embedding_coalescer import configure_embedding_coalescing
+
+PLUGIN_ROOT = Path(__file__).resolve().parents[3]
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated scenarios among {', '.join(SCENARIOS)}")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    parser.add_argument("--work-dir", help="Directory of the synthetic index, a temporary directory by default")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent requests")
+    parser.add_argument("--documents", type=int, default=50, help="Documents of the synthetic corpus")
+    parser.add_argument("--max-in-flight", type=int, default=50, help="LLM Mesh limiter: maximum in-flight requests")
+    parser.add_argument("--requests-per-second", type=float, default=0, help="LLM Mesh limiter: maximum request rate, 0 for unlimited")
+    parser.add_argument("--embedding-batch-size", type=int, default=256, help="Embedding coalescer: maximum texts per request")
+    parser.add_argument("--latency-ms", type=float, default=MockLLMMeshConfig.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=MockLLMMeshConfig.jitter_ms)
+    parser.add_argument("--error-rate", type=float, default=MockLLMMeshConfig.error_rate)
+    parser.add_argument("--embedding-latency-per-text-ms", type=float, default=MockLLMMeshConfig.embedding_latency_per_text_ms)
+    parser.add_argument("--max-embedding-batch-size", type=int, default=MockLLMMeshConfig.max_embedding_batch_size)
+    parser.add_argument("--embedding-dimension", type=int, default=MockLLMMeshConfig.embedding_dimension)
+    parser.add_argument("--token-latency-ms", type=float, default=MockLLMMeshConfig.token_latency_ms)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def _plugin_version() -> str | None:
+    # plugin.json allows comments, it is not strict JSON
+    match = re.search(r'"version"\s*:\s*"([^"]+)"', (PLUGIN_ROOT / "plugin.json").read_text())
+    return match.group(1) if match else None
+
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    mesh_config = MockLLMMeshConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        embedding_latency_per_text_ms=args.embedding_latency_per_text_ms,
+        max_embedding_batch_size=args.max_embedding_batch_size,
+        embedding_dimension=args.embedding_dimension,
+        token_latency_ms=args.token_latency_ms,
+        seed=args.seed,
+    )
+    scenario_names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenario_names if name not in SCENARIOS]
+    if unknown:
+        raise ValueError(f"Unknown scenarios {unknown}, expected some of {list(SCENARIOS)}")
+
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="graphrag-benchmark-"))
+    mesh = MockLLMMesh(mesh_config)
+    context = BenchmarkContext(mesh, PLUGIN_ROOT, work_dir, args.requests, args.concurrency, args.documents, seed=args.seed)
+    install_mock_llm_mesh(mesh, folders={INDEX_FOLDER_ID: str(context.index_dir)})
+    configure_llm_mesh_limiter(max_in_flight=args.max_in_flight, requests_per_second=args.requests_per_second)
+    configure_embedding_coalescing(max_batch_items=args.embedding_batch_size)
+
+    results = {}
+    for name in scenario_names:
+        logger.info(f"Running benchmark scenario {name}")
+        mesh.reset_stats()
+        with RSSSampler() as rss:
+            try:
+                result = SCENARIOS[name](context)
+            except Exception as e:
+                logger.exception(f"Benchmark scenario {name} failed")
+                result = {"failed": repr(e)}
+        results[name] = {**result, **rss.report(), "llm_mesh": mesh.stats()}
+
+    return {
+        "plugin_version": _plugin_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "documents": args.documents,
+            "max_in_flight": args.max_in_flight,
+            "requests_per_second": args.requests_per_second,
+            "embedding_batch_size": args.embedding_batch_size,
+            "mock_llm_mesh": {k: v for k, v in dataclasses.asdict(mesh_config).items() if k != "responder"},
+        },
+        "scenarios": results,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    args = _parse_args(argv)
+    results = run_benchmark(args)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    print(output)
+    return 1 if any("failed" in result for result in results["scenarios"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
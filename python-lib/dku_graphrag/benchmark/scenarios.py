@@ -0,0 +1,233 @@
+import asyncio
+import importlib.util
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from dku_graphrag.benchmark.metrics import run_concurrently, run_in_threads
+from dku_graphrag.benchmark.mock_llm_mesh import MockLLMMesh
+
+CHAT_LLM_ID = "benchmark:mock:chat"
+EMBEDDING_LLM_ID = "benchmark:mock:embedding"
+INDEX_FOLDER_ID = "benchmark_index"
+SYLLABLES = ["ka", "lo", "mi", "ren", "dor", "vel", "sa", "tor", "bri", "an", "qu", "es", "nal", "ith", "or", "fen"]
+REGIONS = ["North", "South", "East", "West"]
+
+logger = logging.getLogger(__name__)
+
+
+class BenchmarkContext:
+    """
+    Settings shared by the scenarios of a benchmark run.
+
+    :param plugin_root: Root of the plugin, holding the resource folder and the agent code.
+    :param work_dir: Scratch directory, the synthetic index is built in `work_dir/index`.
+    :param n_requests: Number of requests of the throughput and latency scenarios.
+    :param concurrency: Number of concurrent requests.
+    :param n_documents: Size of the synthetic corpus.
+    """
+
+    def __init__(self, mesh: MockLLMMesh, plugin_root: Path, work_dir: Path, n_requests: int, concurrency: int, n_documents: int, seed: int = 0):
+        self.mesh = mesh
+        self.plugin_root = plugin_root
+        self.work_dir = work_dir
+        self.index_dir = work_dir / "index"
+        self.n_requests = n_requests
+        self.concurrency = concurrency
+        self.n_documents = n_documents
+        self.seed = seed
+        self.index_built = False
+
+
+SCENARIOS: dict[str, Callable[[BenchmarkContext], dict]] = {}
+
+
+def scenario(name: str):
+    def register(fn):
+        SCENARIOS[name] = fn
+        return fn
+    return register
+
+
+def make_synthetic_corpus(n_documents: int, words_per_document: int = 300, n_entities: int = 200, seed: int = 0) -> pd.DataFrame:
+    """
+    Documents made of sentences linking named entities, with the columns of the plugin settings.yaml.
+    """
+    rng = np.random.default_rng(seed)
+    names = sorted({
+        "".join(rng.choice(SYLLABLES, size=rng.integers(2, 4))).capitalize() + " " + "".join(rng.choice(SYLLABLES, size=2)).capitalize()
+        for _ in range(n_entities)
+    })
+    verbs = ["met", "signed an agreement with", "funded", "competed against", "was founded by", "moved to"]
+    rows = []
+    for doc_id in range(n_documents):
+        sentences = []
+        while sum(len(sentence.split()) for sentence in sentences) < words_per_document:
+            source, target = rng.choice(names, size=2, replace=False)
+            sentences.append(f"{source} {rng.choice(verbs)} {target} in the {rng.choice(REGIONS).lower()} region.")
+        rows.append({
+            "text": " ".join(sentences),
+            "file": f"doc-{doc_id}",
+            "Name": f"Document {doc_id}",
+            "Type": "report",
+            "Description": "Synthetic benchmark document",
+            "Region": rng.choice(REGIONS),
+            "URL": f"https://example.com/doc-{doc_id}",
+        })
+    return pd.DataFrame(rows)
+
+
+async def build_synthetic_index(context: BenchmarkContext) -> dict:
+    """
+    Build an index of a synthetic corpus in `context.index_dir`, the way the index-builder recipe does.
+    """
+    from graphrag.config.load_config import load_config
+
+    from dku_graphrag.index.context_index import build_context_index
+    from dku_graphrag.index.dataiku_graph_index_builder import DataikuGraphragIndexBuilder
+    from dku_graphrag.utils.index_manifest import write_index_manifest
+    from dku_graphrag.utils.telemetry import configure_usage_tracker
+
+    root_dir = context.index_dir
+    if root_dir.exists():
+        shutil.rmtree(root_dir)
+    (root_dir / "input").mkdir(parents=True)
+    resource_dir = context.plugin_root / "resource"
+    shutil.copy(resource_dir / "settings.yaml", root_dir / "settings.yaml")
+    shutil.copytree(resource_dir / "prompts", root_dir / "prompts")
+    corpus = make_synthetic_corpus(context.n_documents, seed=context.seed)
+    corpus.to_csv(root_dir / "input" / "corpus-00000.csv", index=False)
+
+    # The settings reference an API key the Dataiku LLMs never use
+    os.environ.setdefault("GRAPHRAG_API_KEY", "benchmark")
+    config = load_config(root_dir, None)
+    config.embeddings.vector_store["db_uri"] = str(root_dir / config.embeddings.vector_store["db_uri"])
+
+    usage_tracker = configure_usage_tracker(config.encoding_model)
+    builder = DataikuGraphragIndexBuilder(CHAT_LLM_ID, EMBEDDING_LLM_ID, usage_tracker=usage_tracker)
+    start_time = time.perf_counter()
+    success = await builder.run_build_index_pipeline(config=config, verbose=False, resume=None, memprofile=False)
+    build_seconds = time.perf_counter() - start_time
+    if not success:
+        raise RuntimeError(f"The benchmark index build failed, see the logs of {root_dir}")
+    output_dir = str(root_dir / config.storage.base_dir)
+    build_context_index(output_dir, config.encoding_model)
+    write_index_manifest(
+        str(root_dir),
+        generation=time.strftime("%Y%m%d-%H%M%S"),
+        output_dir=output_dir,
+        chat_completion_llm_id=CHAT_LLM_ID,
+        embedding_llm_id=EMBEDDING_LLM_ID
+    )
+    context.index_built = True
+    return {
+        "documents": context.n_documents,
+        "words": int(corpus["text"].str.split().str.len().sum()),
+        "build_seconds": round(build_seconds, 2),
+        "documents_per_second": round(context.n_documents / build_seconds, 2),
+        "llm_usage": usage_tracker.summary()["totals"],
+    }
+
+
+def load_agent(context: BenchmarkContext, search_type: str, **config):
+    """
+    Instantiate the agent of the plugin on the synthetic index, with the query cache and
+    the index reloader disabled so every request runs a search.
+    """
+    if not context.index_built:
+        asyncio.run(build_synthetic_index(context))
+    spec = importlib.util.spec_from_file_location("graphrag_agent", context.plugin_root / "python-agents" / "graphrag" / "agent.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    agent = module.MyLLM()
+    agent.set_config({
+        "index_folder_id": INDEX_FOLDER_ID,
+        "search_type": search_type,
+        "use_query_cache": False,
+        "use_embedding_cache": False,
+        "index_reload_interval": 0,
+        "max_concurrent_searches": context.concurrency,
+        **config,
+    }, {})
+    return agent
+
+
+def _agent_request(agent, i: int) -> None:
+    query = {"messages": [{"content": f"What links the entities of region {REGIONS[i % len(REGIONS)]}? (request {i})"}]}
+    agent.process(query, {}, SimpleNamespace(attributes={}))
+
+
+@scenario("chat")
+def chat_scenario(context: BenchmarkContext) -> dict:
+    """Indexing chat LLM (DataikuChatLLM), concurrent single-turn completions."""
+    from dku_graphrag.index.dataiku_chat_llm import DataikuChatLLM
+
+    llm = DataikuChatLLM(CHAT_LLM_ID)
+    return asyncio.run(run_concurrently(lambda i: llm(f"Benchmark prompt {i}"), context.n_requests, context.concurrency))
+
+
+@scenario("embedding")
+def embedding_scenario(context: BenchmarkContext) -> dict:
+    """Indexing embedding LLM (DataikuEmbeddingsLLM), concurrent single texts coalesced into batches."""
+    from dku_graphrag.index.dataiku_embeddings_llm import DataikuEmbeddingsLLM
+
+    llm = DataikuEmbeddingsLLM(EMBEDDING_LLM_ID)
+    summary = asyncio.run(run_concurrently(lambda i: llm(f"Benchmark text {i}"), context.n_requests, context.concurrency))
+    summary["texts_per_request"] = round(context.mesh.embedded_texts / max(1, context.mesh.embedding_requests), 1)
+    return summary
+
+
+@scenario("query_chat")
+def query_chat_scenario(context: BenchmarkContext) -> dict:
+    """Query chat LLM (QueryDataikuChatLLM), concurrent non-streamed generations."""
+    from dku_graphrag.query.query_dataiku_chat_llm import QueryDataikuChatLLM
+
+    llm = QueryDataikuChatLLM(CHAT_LLM_ID)
+    return asyncio.run(run_concurrently(
+        lambda i: llm.agenerate([{"role": "user", "content": f"Benchmark question {i}"}], streaming=False),
+        context.n_requests,
+        context.concurrency,
+    ))
+
+
+@scenario("query_embedding")
+def query_embedding_scenario(context: BenchmarkContext) -> dict:
+    """Query embedding LLM (QueryDataikuEmbeddingLLM), concurrent query embeddings."""
+    from dku_graphrag.query.query_dataiku_embedding_llm import QueryDataikuEmbeddingLLM
+
+    llm = QueryDataikuEmbeddingLLM(EMBEDDING_LLM_ID)
+    return asyncio.run(run_concurrently(lambda i: llm.aembed(f"Benchmark query {i}"), context.n_requests, context.concurrency))
+
+
+@scenario("index_build")
+def index_build_scenario(context: BenchmarkContext) -> dict:
+    """Full index build of the synthetic corpus."""
+    return asyncio.run(build_synthetic_index(context))
+
+
+@scenario("local_query")
+def local_query_scenario(context: BenchmarkContext) -> dict:
+    """Agent local search latency, one request at a time."""
+    agent = load_agent(context, "local")
+    return run_in_threads(lambda i: _agent_request(agent, i), context.n_requests, 1)
+
+
+@scenario("global_query")
+def global_query_scenario(context: BenchmarkContext) -> dict:
+    """Agent global search latency, one request at a time."""
+    agent = load_agent(context, "global")
+    return run_in_threads(lambda i: _agent_request(agent, i), context.n_requests, 1)
+
+
+@scenario("agent_concurrency")
+def agent_concurrency_scenario(context: BenchmarkContext) -> dict:
+    """Agent local search under concurrent requests, each from its own server thread."""
+    agent = load_agent(context, "local")
+    return run_in_threads(lambda i: _agent_request(agent, i), context.n_requests, context.concurrency)
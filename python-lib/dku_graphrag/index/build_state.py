@@ -0,0 +1,189 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+import pandas as pd
+
+from dku_graphrag.index.incremental import STATE_DIR_NAME
+
+BUILD_STATE_FILE_NAME = "build_state.json"
+# Chat responses of the current run, kept until it succeeds when the persistent LLM cache is disabled
+CHECKPOINT_CACHE_FILE_NAME = "checkpoint_responses.sqlite"
+RUNNING = "running"
+FAILED = "failed"
+SUCCEEDED = "succeeded"
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint_config(resource_dir: str, **parameters) -> str:
+    """
+    Hash the settings, the prompts and the recipe parameters that shape the index. A run can only
+    be resumed by a run with the same fingerprint.
+    """
+    digest = hashlib.sha256(json.dumps(parameters, sort_keys=True, default=str).encode("utf-8"))
+    for dir_path, dir_names, file_names in os.walk(resource_dir):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            file_path = os.path.join(dir_path, file_name)
+            digest.update(os.path.relpath(file_path, resource_dir).encode("utf-8"))
+            with open(file_path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def fingerprint_documents(manifest: pd.DataFrame) -> str:
+    """
+    Hash a document manifest (key, row_hash), the input of a run can only be resumed if it did not change.
+    """
+    row_hashes = pd.util.hash_pandas_object(manifest[["key", "row_hash"]], index=False).to_numpy()
+    return hashlib.sha256(row_hashes.tobytes()).hexdigest()
+
+
+def get_build_state_path(folder_path: str) -> str:
+    return os.path.join(folder_path, STATE_DIR_NAME, BUILD_STATE_FILE_NAME)
+
+
+class BuildState:
+    """
+    Progress of an index build, persisted in the state directory of the output folder after every
+    workflow so that a build that dies can be resumed by the next run of the recipe.
+
+    :param run_id: Stable id of the build, kept by the runs resuming it.
+    :param config_fingerprint: See `fingerprint_config`.
+    :param documents_fingerprint: See `fingerprint_documents`, None until the input is exported.
+    """
+
+    def __init__(
+        self,
+        folder_path: str,
+        run_id: str,
+        index_mode: str,
+        config_fingerprint: str,
+        documents_fingerprint: str | None = None,
+        status: str = RUNNING,
+        completed_workflows: list[str] | None = None,
+        failed_workflows: list[str] | None = None,
+        attempts: int = 1,
+        started_at: str | None = None,
+        error: str | None = None,
+    ):
+        self.folder_path = folder_path
+        self.run_id = run_id
+        self.index_mode = index_mode
+        self.config_fingerprint = config_fingerprint
+        self.documents_fingerprint = documents_fingerprint
+        self.status = status
+        self.completed_workflows = completed_workflows or []
+        self.failed_workflows = failed_workflows or []
+        self.attempts = attempts
+        self.started_at = started_at or time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        self.error = error
+
+    @classmethod
+    def load(cls, folder_path: str) -> "BuildState | None":
+        """
+        Load the state of the last build of the folder, None if there is none or it is unreadable.
+        """
+        try:
+            with open(get_build_state_path(folder_path)) as f:
+                data = json.load(f)
+            data.pop("updated_at", None)
+            return cls(folder_path, **data)
+        except FileNotFoundError:
+            return None
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable build state of {folder_path}: {e}")
+            return None
+
+    def to_dict(self) -> dict:
+        return {
+            "run_id": self.run_id,
+            "index_mode": self.index_mode,
+            "config_fingerprint": self.config_fingerprint,
+            "documents_fingerprint": self.documents_fingerprint,
+            "status": self.status,
+            "completed_workflows": self.completed_workflows,
+            "failed_workflows": self.failed_workflows,
+            "attempts": self.attempts,
+            "started_at": self.started_at,
+            "error": self.error,
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        }
+
+    def save(self) -> None:
+        """
+        Atomically replace the persisted state.
+        """
+        state_path = get_build_state_path(self.folder_path)
+        os.makedirs(os.path.dirname(state_path), exist_ok=True)
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, state_path)
+
+    def is_incomplete(self) -> bool:
+        return self.status != SUCCEEDED
+
+    def can_resume(self, index_mode: str, config_fingerprint: str) -> bool:
+        """
+        Whether this state is an interrupted build that a run with these parameters can pick up.
+        """
+        return self.is_incomplete() and self.index_mode == index_mode and self.config_fingerprint == config_fingerprint
+
+    def workflow_completed(self, name: str) -> None:
+        if name not in self.completed_workflows:
+            self.completed_workflows.append(name)
+        self.save()
+
+    def workflow_failed(self, name: str) -> None:
+        if name not in self.failed_workflows:
+            self.failed_workflows.append(name)
+            self.save()
+
+    def resume(self, output_dir: str | None) -> list[str]:
+        """
+        Start a new attempt of the build. graphrag skips the workflows whose table exists, so the
+        tables of the first workflow that reported errors, and of every workflow built on top of it,
+        are removed to run them again. Returns the workflows that will be skipped.
+
+        :param output_dir: Directory of the tables of the build, None for update runs: graphrag cannot
+            resume them, every workflow runs again and only the cached LLM responses are reused.
+        """
+        invalid = []
+        if output_dir is None:
+            self.completed_workflows = []
+        elif self.failed_workflows:
+            first_failed = min(
+                (self.completed_workflows.index(name) for name in self.failed_workflows if name in self.completed_workflows),
+                default=len(self.completed_workflows),
+            )
+            invalid = self.completed_workflows[first_failed:]
+            self.completed_workflows = self.completed_workflows[:first_failed]
+        for name in invalid:
+            table_path = os.path.join(output_dir, f"{name}.parquet")
+            if os.path.exists(table_path):
+                os.remove(table_path)
+                logger.info(f"Removed table {table_path} of a workflow to run again")
+        self.failed_workflows = []
+        self.status = RUNNING
+        self.error = None
+        self.attempts += 1
+        self.save()
+        return list(self.completed_workflows)
+
+    def finish(self, success: bool, error: str | None = None) -> None:
+        """
+        Record the end of the build.
+
+        :param error: The exception that aborted the build, if any.
+        """
+        self.status = SUCCEEDED if success else FAILED
+        self.error = error
+        self.save()
+
+
+def load_build_state(folder_path: str) -> BuildState | None:
+    return BuildState.load(folder_path)
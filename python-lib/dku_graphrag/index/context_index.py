@@ -0,0 +1,199 @@
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from dku_graphrag.utils.tokens import DEFAULT_ENCODING_MODEL, get_token_encoder
+
+CONTEXT_INDEX_FILE_NAME = "context_index.npz"
+
+logger = logging.getLogger(__name__)
+
+
+def _csr(rows: np.ndarray, columns: np.ndarray, n_rows: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Build the (indptr, indices) arrays of a sparse row -> columns mapping. Duplicate pairs are removed
+    and the columns of each row are sorted, i.e. kept in the row order of the target table.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    columns = np.asarray(columns, dtype=np.int64)
+    valid = (rows >= 0) & (columns >= 0)
+    pairs = np.unique(np.stack([rows[valid], columns[valid]], axis=1), axis=0) if valid.any() else np.empty((0, 2), dtype=np.int64)
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(pairs[:, 0], minlength=n_rows))]).astype(np.int64)
+    return indptr, pairs[:, 1].astype(np.int32)
+
+
+def _positions(values: pd.Series, keys: pd.Series) -> np.ndarray:
+    """
+    Position of each value in `keys`, -1 when missing.
+    """
+    lookup = pd.Series(np.arange(len(keys)), index=pd.Index(keys.astype(str)))
+    lookup = lookup[~lookup.index.duplicated(keep="first")]
+    return values.astype(str).map(lookup).fillna(-1).to_numpy(dtype=np.int64)
+
+
+def _ids(values: pd.Series) -> np.ndarray:
+    # Fixed-width unicode arrays, object arrays would need pickle to be loaded
+    return np.asarray(values.astype(str).tolist(), dtype=str)
+
+
+def _count_tokens(texts: pd.Series, encoding_name: str) -> np.ndarray:
+    texts = texts.fillna("").astype(str).tolist()
+    encoder = get_token_encoder(encoding_name)
+    if encoder is None:
+        return np.asarray([len(text) // 4 + 1 if text else 0 for text in texts], dtype=np.int32)
+    return np.asarray([len(tokens) for tokens in encoder.encode_ordinary_batch(texts)], dtype=np.int32)
+
+
+def build_context_index(output_dir: str, encoding_name: str = DEFAULT_ENCODING_MODEL) -> str:
+    """
+    Precompute, from the output tables of an index, the adjacency structures local search needs to
+    assemble its context, as CSR arrays indexed by entity row:
+
+    - entity -> relationships whose source or target is the entity,
+    - entity -> text units, entity -> community reports, entity -> covariates whose subject is the entity,
+
+    together with the token count of every text unit and community report. Targets are row positions
+    in their parquet table; the ids of every table are stored to check the alignment at load time.
+
+    :return: Path of the written file.
+    """
+    start_time = time.perf_counter()
+
+    def read(file_name, columns):
+        return pd.read_parquet(os.path.join(output_dir, file_name), columns=columns)
+
+    entities = read("create_final_entities.parquet", ["id", "title", "text_unit_ids"])
+    relationships = read("create_final_relationships.parquet", ["id", "source", "target"])
+    text_units = read("create_final_text_units.parquet", ["id", "text"])
+    reports = read("create_final_community_reports.parquet", ["id", "community", "full_content"])
+    nodes = read("create_final_nodes.parquet", ["id", "community"])
+    covariates_path = os.path.join(output_dir, "create_final_covariates.parquet")
+    covariates = pd.read_parquet(covariates_path, columns=["id", "subject_id"]) if os.path.exists(covariates_path) else None
+
+    n_entities = len(entities)
+    relationship_rows = np.arange(len(relationships))
+    entity_relationships = _csr(
+        np.concatenate([_positions(relationships["source"], entities["title"]), _positions(relationships["target"], entities["title"])]),
+        np.concatenate([relationship_rows, relationship_rows]),
+        n_entities,
+    )
+
+    entity_units = entities[["id", "text_unit_ids"]].explode("text_unit_ids").dropna()
+    entity_text_units = _csr(
+        _positions(entity_units["id"], entities["id"]),
+        _positions(entity_units["text_unit_ids"], text_units["id"]),
+        n_entities,
+    )
+
+    entity_nodes = nodes.dropna(subset=["community"])
+    entity_communities = _csr(
+        _positions(entity_nodes["id"], entities["id"]),
+        _positions(entity_nodes["community"].astype(int), reports["community"].astype(int)),
+        n_entities,
+    )
+
+    arrays = {
+        "entity_ids": _ids(entities["id"]),
+        "relationship_ids": _ids(relationships["id"]),
+        "text_unit_ids": _ids(text_units["id"]),
+        "report_community_ids": _ids(reports["community"]),
+        "entity_relationships_indptr": entity_relationships[0],
+        "entity_relationships": entity_relationships[1],
+        "entity_text_units_indptr": entity_text_units[0],
+        "entity_text_units": entity_text_units[1],
+        "entity_communities_indptr": entity_communities[0],
+        "entity_communities": entity_communities[1],
+        "text_unit_tokens": _count_tokens(text_units["text"], encoding_name),
+        "report_tokens": _count_tokens(reports["full_content"], encoding_name),
+    }
+    if covariates is not None:
+        entity_covariates = _csr(_positions(covariates["subject_id"], entities["title"]), np.arange(len(covariates)), n_entities)
+        arrays["covariate_ids"] = _ids(covariates["id"])
+        arrays["entity_covariates_indptr"] = entity_covariates[0]
+        arrays["entity_covariates"] = entity_covariates[1]
+
+    path = os.path.join(output_dir, CONTEXT_INDEX_FILE_NAME)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+    logger.info(
+        f"Built the context index of {n_entities} entities in {time.perf_counter() - start_time:.1f}s: "
+        f"{len(entity_relationships[1])} entity-relationship, {len(entity_text_units[1])} entity-text unit and "
+        f"{len(entity_communities[1])} entity-community links"
+    )
+    return path
+
+
+class ContextIndex:
+    """
+    Read side of the context index: neighbor lookups by array indexing.
+    """
+
+    def __init__(self, arrays: dict[str, np.ndarray]):
+        self.arrays = arrays
+        self.entity_positions = {entity_id: position for position, entity_id in enumerate(arrays["entity_ids"].tolist())}
+        self.relationship_ids = arrays["relationship_ids"]
+        self.text_unit_ids = arrays["text_unit_ids"]
+        self.report_community_ids = arrays["report_community_ids"]
+        self.covariate_ids = arrays.get("covariate_ids")
+        self.text_unit_tokens = arrays["text_unit_tokens"]
+        self.report_tokens_by_community = dict(zip(self.report_community_ids.tolist(), arrays["report_tokens"].tolist()))
+
+    @classmethod
+    def load(cls, output_dir: str) -> "ContextIndex | None":
+        """
+        Load the context index of an output folder, None if the index was built without one.
+        """
+        path = os.path.join(output_dir, CONTEXT_INDEX_FILE_NAME)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def matches(self, entities: pd.DataFrame, relationships: pd.DataFrame) -> bool:
+        """
+        Check that the context index was built from these tables.
+        """
+        return (
+            len(self.relationship_ids) == len(relationships)
+            and np.array_equal(self.arrays["entity_ids"], _ids(entities["id"]))
+        )
+
+    def _neighbors(self, name: str, entity_ids: list[str]) -> np.ndarray:
+        """
+        Sorted, unique row positions linked to any of the entities in the `name` mapping.
+        """
+        indptr = self.arrays[f"{name}_indptr"]
+        indices = self.arrays[name]
+        rows = [self.entity_positions[entity_id] for entity_id in entity_ids if entity_id in self.entity_positions]
+        if not rows:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate([indices[indptr[row]:indptr[row + 1]] for row in rows]))
+
+    def relationship_positions(self, entity_ids: list[str]) -> np.ndarray:
+        return self._neighbors("entity_relationships", entity_ids)
+
+    def text_unit_positions(self, entity_id: str) -> np.ndarray:
+        indptr = self.arrays["entity_text_units_indptr"]
+        row = self.entity_positions.get(entity_id)
+        if row is None:
+            return np.empty(0, dtype=np.int32)
+        return self.arrays["entity_text_units"][indptr[row]:indptr[row + 1]]
+
+    def community_ids(self, entity_id: str) -> list[str]:
+        """
+        Communities of every level the entity belongs to that have a community report.
+        """
+        indptr = self.arrays["entity_communities_indptr"]
+        row = self.entity_positions.get(entity_id)
+        if row is None:
+            return []
+        return self.report_community_ids[self.arrays["entity_communities"][indptr[row]:indptr[row + 1]]].tolist()
+
+    def covariate_positions(self, entity_ids: list[str]) -> np.ndarray:
+        if self.covariate_ids is None:
+            return np.empty(0, dtype=np.int32)
+        return self._neighbors("entity_covariates", entity_ids)
@@ -1,9 +1,6 @@
-import json
 import logging
-import re
 from typing import Any, Literal
 
-import dataiku
 from fnllm import ChatLLM
 from fnllm.openai.types.aliases import OpenAIChatCompletionUserMessageParam
 
@@ -15,10 +12,17 @@ from fnllm.openai.types.chat.io import (
 )
 from fnllm.types.generics import TJsonModel, THistoryEntry, TModelParameters
 from fnllm.types.io import LLMInput, LLMOutput
+from fnllm.types.metrics import LLMUsageMetrics
 from typing_extensions import Unpack
 import time
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
+
+from dku_graphrag.utils.concurrency import get_llm_mesh_limiter
+from dku_graphrag.utils.dataiku_client import get_dataiku_llm
+from dku_graphrag.utils.json_parsing import build_repair_prompt, extract_json_object, parse_json_model, repair_json_text, strip_code_fences
+from dku_graphrag.utils.llm_cache import SQLiteLLMCache
+from dku_graphrag.utils.retry import RetryPolicy, response_error
+from dku_graphrag.utils.telemetry import get_usage_tracker
+from dku_graphrag.utils.tokens import count_tokens
 
 
 class DataikuChatLLM(ChatLLM[OpenAIChatCompletionInput, OpenAIChatOutput, THistoryEntry, TModelParameters]):
@@ -26,20 +30,35 @@ class DataikuChatLLM(ChatLLM[OpenAIChatCompletionInput, OpenAIChatOutput, THisto
     DataikuChatLLM integrates a Dataiku project-provided LLM endpoint with the fnllm ChatLLM protocol.
 
     This class simulates OpenAI-like chat completions on top of a Dataiku LLM Mesh.
-    Note: Currently, caching and streaming are not implemented in this class.
+    Responses are served from an optional persistent cache, honoring graphrag's `bypass_cache`.
+    Throttled and transient LLM Mesh failures are retried with backoff; a request that still fails
+    raises an exception, which graphrag records as an error of the document being processed.
+    JSON responses that do not validate are repaired locally, then by asking the LLM to fix them.
+    Note: Currently, streaming is not implemented in this class.
     """
 
-    def __init__(self, chat_completion_llm_id: str):
+    def __init__(
+        self,
+        chat_completion_llm_id: str,
+        response_cache: SQLiteLLMCache | None = None,
+        retry_policy: RetryPolicy | None = None,
+        json_repair_attempts: int = 1
+    ):
         """
         Initialize the DataikuChatLLM.
         :param chat_completion_llm_id: The LLM identifier within the project.
+        :param response_cache: Optional persistent cache of LLM responses.
+        :param retry_policy: Retries of failed LLM Mesh requests, defaults to RetryPolicy().
+        :param json_repair_attempts: Number of times the LLM is asked to fix a JSON response that cannot be repaired locally.
         """
         self.logger = logging.getLogger(__name__)
         self.chat_completion_llm_id = chat_completion_llm_id
+        self.response_cache = response_cache
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.json_repair_attempts = json_repair_attempts
         self.logger.debug("Initializing DataikuEmbeddingsLLM with chat_completion_llm_id=%s", chat_completion_llm_id)
-        self.client = dataiku.api_client()
-        self.project = self.client.get_default_project()
-        self.chat_completion_llm = self.project.get_llm(self.chat_completion_llm_id)
+        # Client and LLM handle are shared by every instance of the process, children included
+        self.chat_completion_llm = get_dataiku_llm(self.chat_completion_llm_id)
 
 
     def _build_prompt_message(self, prompt: OpenAIChatCompletionInput) -> tuple[list[OpenAIChatMessageInput], OpenAIChatMessageInput]:
@@ -79,7 +98,8 @@ class DataikuChatLLM(ChatLLM[OpenAIChatCompletionInput, OpenAIChatOutput, THisto
         history = kwargs.get("history", [])
         json_mode = kwargs.get("json", False)
         json_model = kwargs.get("json_model", None)
-        bypass_cache = kwargs.get("bypass_cache", False)  # Currently unused, but potentially useful later.
+        bypass_cache = kwargs.get("bypass_cache", False)
+        model_parameters = kwargs.get("model_parameters", None)
 
         self.logger.debug("Called with prompt=%r, json_mode=%s, bypass_cache=%s", prompt, json_mode, bypass_cache)
         self.logger.debug("Additional kwargs=%s", kwargs)
@@ -88,9 +108,46 @@ class DataikuChatLLM(ChatLLM[OpenAIChatCompletionInput, OpenAIChatOutput, THisto
         messages, prompt_message = self._build_prompt_message(prompt)
         all_messages = [*history, *messages]
 
-        # Prepare Dataiku LLM completion request
+        parse_json = json_mode and json_model is not None
+        usage_tracker = get_usage_tracker()
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = self.response_cache.make_key(self.chat_completion_llm_id, all_messages, json_mode, model_parameters)
+            cached_response = None if bypass_cache else self.response_cache.get(cache_key)
+            if cached_response is not None:
+                self.logger.debug("LLM response served from cache")
+                usage_tracker.add(cache_hits=1)
+                parsed_json = None
+                if parse_json:
+                    cached_response, parsed_json = await self._parse_json_response(cached_response, json_model)
+                return self._build_output(prompt_message, all_messages, cached_response, parsed_json)
+
+        response_text, usage = await self._run_completion(all_messages, json_mode)
+
+        parsed_json = None
+        if parse_json:
+            response_text, parsed_json = await self._parse_json_response(response_text, json_model)
+        elif json_mode:
+            response_text = extract_json_object(response_text)
+        else:
+            response_text = strip_code_fences(response_text)
+
+        llm_output = self._build_output(prompt_message, all_messages, response_text, parsed_json, usage)
+
+        # Only cache responses that graphrag can use, a broken JSON answer must be asked again next time
+        if cache_key is not None and not (parse_json and parsed_json is None):
+            self.response_cache.set(cache_key, response_text)
+
+        return llm_output
+
+    async def _run_completion(self, messages: list, json_mode: bool) -> tuple[str, LLMUsageMetrics]:
+        """
+        Send messages to the LLM Mesh, with retries, and record the call in the usage telemetry.
+        Returns the response text and its token usage.
+        """
         completion = self.chat_completion_llm.new_completion()
-        for msg in all_messages:
+        message_contents = []
+        for msg in messages:
             if isinstance(msg, OpenAIChatCompletionMessageModel):
                 msg_role = "assistant"
                 msg_content = msg.content
@@ -98,32 +155,114 @@ class DataikuChatLLM(ChatLLM[OpenAIChatCompletionInput, OpenAIChatOutput, THisto
                 msg_role = msg.get("role", "user")
                 msg_content = msg.get("content", "")
             completion.with_message(msg_content, role=msg_role)
+            message_contents.append(msg_content or "")
 
         # If JSON output is requested
         if json_mode:
             completion.with_json_output()
 
-        # Execute the request
-        start_time = time.perf_counter()  # Start timing
-        loop = asyncio.get_running_loop()
-        with ThreadPoolExecutor() as executor:
-                resp = await loop.run_in_executor(executor, completion.execute)
+        usage_tracker = get_usage_tracker()
+        start_time = time.perf_counter()
+        try:
+            resp = await self.retry_policy.run(
+                lambda: get_llm_mesh_limiter().run(self._execute, completion),
+                description=f"Completion with {self.chat_completion_llm_id}"
+            )
+        except Exception:
+            usage_tracker.record_llm_call(0, 0, time.perf_counter() - start_time, success=False)
+            self.logger.exception("LLM call failed")
+            raise
+
+        execution_time = time.perf_counter() - start_time
+        self.logger.debug(f"Execution time: {execution_time:.4f} seconds")
+        response_text = resp.text or ""
+        usage, estimated = self._get_usage(resp, message_contents, response_text, usage_tracker.encoding_name)
+        usage_tracker.record_llm_call(usage.input_tokens, usage.output_tokens, execution_time, estimated=estimated)
+        return response_text, usage
+
+    async def _parse_json_response(self, response_text: str, json_model: Any) -> tuple[str, Any | None]:
+        """
+        Validate a JSON response against `json_model`. A response that does not validate is repaired
+        locally, then, if that is not enough, the LLM is asked to fix it: only the broken response is
+        sent back, not the prompt. Returns the JSON text and the parsed instance, None on failure.
+        """
+        json_text = extract_json_object(response_text)
+        try:
+            return json_text, parse_json_model(json_text, json_model)
+        except (ValueError, TypeError) as e:
+            error = e
+
+        usage_tracker = get_usage_tracker()
+        usage_tracker.add(json_parse_failures=1)
+        self.logger.debug(f"Invalid JSON response, repairing it: {error}")
 
-        #resp = completion.execute()
-        end_time = time.perf_counter()  
-        execution_time = end_time - start_time
-        self.logger.info(f"Execution time: {execution_time:.4f} seconds")
-        clean_response = re.sub(r'```json\s*|\s*```', '', resp.text or "")
+        # Repair the whole response: a truncated object has no closing brace to extract it by
+        repaired_text = repair_json_text(response_text)
+        if repaired_text is not None:
+            try:
+                parsed_json = parse_json_model(repaired_text, json_model)
+                usage_tracker.add(json_repairs=1)
+                return repaired_text, parsed_json
+            except (ValueError, TypeError) as e:
+                error = e
+
+        for _ in range(self.json_repair_attempts):
+            usage_tracker.add(json_repair_calls=1)
+            repair_prompt = build_repair_prompt(response_text, error, json_model)
+            try:
+                fixed_text, _ = await self._run_completion([{"role": "user", "content": repair_prompt}], json_mode=True)
+            except Exception:
+                break
+            fixed_text = extract_json_object(fixed_text)
+            try:
+                parsed_json = parse_json_model(fixed_text, json_model)
+                usage_tracker.add(json_repairs=1)
+                return fixed_text, parsed_json
+            except (ValueError, TypeError) as e:
+                error = e
 
+        self.logger.warning(f"Failed to parse JSON from the LLM response: {error}")
+        return json_text, None
+
+    @staticmethod
+    def _execute(completion):
+        """
+        Run a completion request (blocking), raising an LLMMeshError if the LLM Mesh reports a failure.
+        """
+        resp = completion.execute()
         if not resp.success:
-            self.logger.error("LLM call failed. Response: %s", resp.text)
-            # Consider raising an exception or handling error scenarios more robustly
-            # raise RuntimeError("Dataiku LLM returned an unsuccessful response.")
+            raise response_error(resp)
+        return resp
+
+    @staticmethod
+    def _get_usage(resp, message_contents: list[str], response_text: str, encoding_name: str) -> tuple[LLMUsageMetrics, bool]:
+        """
+        Token usage reported by the LLM Mesh, or estimated with the configured tokenizer when the
+        response does not carry it. Returns the usage and whether it was estimated.
+        """
+        raw = getattr(resp, "_raw", None)
+        if isinstance(raw, dict) and raw.get("promptTokens") is not None and raw.get("completionTokens") is not None:
+            return LLMUsageMetrics(input_tokens=raw["promptTokens"], output_tokens=raw["completionTokens"]), False
+        return LLMUsageMetrics(
+            input_tokens=sum(count_tokens(content, encoding_name) for content in message_contents),
+            output_tokens=count_tokens(response_text, encoding_name),
+        ), True
 
+    def _build_output(
+        self,
+        prompt_message: OpenAIChatMessageInput,
+        all_messages: list,
+        response_text: str,
+        parsed_json: Any,
+        usage: LLMUsageMetrics | None = None,
+    ) -> LLMOutput[OpenAIChatOutput, TJsonModel, THistoryEntry]:
+        """
+        Wrap a cleaned LLM response and its parsed JSON into the fnllm LLMOutput.
+        """
         # Construct raw assistant message
         raw_output = OpenAIChatCompletionMessageModel(
             role="assistant",
-            content=clean_response if resp.success else "An error occurred.",
+            content=response_text,
             function_call=None,
             name=None,
             tool_calls=[],
@@ -133,37 +272,30 @@ class DataikuChatLLM(ChatLLM[OpenAIChatCompletionInput, OpenAIChatOutput, THisto
             raw_input=prompt_message,
             raw_output=raw_output,
             content=raw_output.content,
-            usage=None,  # No usage metrics available from the Dataiku LLM currently
+            usage=usage,  # None for cached responses
         )
 
         llm_output = LLMOutput(
             output=output,
-            raw_json=None,
-            parsed_json=None,
+            raw_json=parsed_json.model_dump() if hasattr(parsed_json, "model_dump") else None,
+            parsed_json=parsed_json,
             history=all_messages + [raw_output],
             tool_calls=[],
         )
 
-        # If json mode is requested and a json_model is provided, attempt to parse JSON
-        if json_mode and json_model is not None:
-            try:
-                json_data = json.loads(clean_response)
-                parsed_instance = json_model(**json_data)
-                llm_output.raw_json = clean_response
-                llm_output.parsed_json = parsed_instance
-                self.logger.debug("Successfully parsed JSON output.")
-            except Exception:
-                self.logger.exception("Failed to parse JSON from the LLM response.")
-                llm_output.raw_json = clean_response
-                llm_output.parsed_json = None
-
-        self.logger.debug("Completed call with cleaned response=%r", clean_response)
+        self.logger.debug("Completed call with cleaned response=%r", response_text)
         return llm_output
 
     def child(self, name: str) -> "DataikuChatLLM":
         """
         Create a child LLM instance with the same configuration. Typically used to
-        manage multiple related LLM instances under different identifiers.
+        manage multiple related LLM instances under different identifiers. Children share
+        the client and LLM handle of the process, creating one does not call DSS.
         """
         self.logger.debug("Creating child LLM with name=%s", name)
-        return DataikuChatLLM(self.chat_completion_llm_id)
\ No newline at end of file
+        return DataikuChatLLM(
+            self.chat_completion_llm_id,
+            response_cache=self.response_cache,
+            retry_policy=self.retry_policy,
+            json_repair_attempts=self.json_repair_attempts
+        )
\ No newline at end of file
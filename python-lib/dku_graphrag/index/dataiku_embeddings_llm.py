@@ -2,14 +2,16 @@ import asyncio
 import logging
 from typing import Any, cast
 
-import dataiku
 from fnllm import EmbeddingsLLM, LLMOutput
 from fnllm.types.generics import TJsonModel, THistoryEntry
 import time
-import asyncio
 import numpy as np
 
-from concurrent.futures import ThreadPoolExecutor
+from dku_graphrag.utils.dataiku_client import get_dataiku_llm
+from dku_graphrag.utils.embedding_cache import EmbeddingCache
+from dku_graphrag.utils.embedding_coalescer import get_embedding_coalescer
+from dku_graphrag.utils.telemetry import get_usage_tracker
+from dku_graphrag.utils.tokens import count_tokens
 
 class EmbeddingsContainer:
     def __init__(self, embeddings):
@@ -22,23 +24,60 @@ class DataikuEmbeddingsLLM(EmbeddingsLLM):
     This class:
     - Connects to a Dataiku project and retrieves a configured embedding model.
     - Use LLMMesh to fetch and returnthe embeddings wrapped in an LLMOutput object.
+    - Coalesces concurrent calls into larger LLM Mesh requests (see EmbeddingCoalescer).
+    - Serves already computed texts from an optional persistent EmbeddingCache.
 
     Note: Since this is an embeddings model, it doesn't handle history or conversational aspects.
     """
 
-    def __init__(self, embedding_llm_id: str):
+    def __init__(self, embedding_llm_id: str, embedding_cache: EmbeddingCache | None = None):
         """
         Initialize the DataikuEmbeddingsLLM.
         :param embedding_model_id: The embedding model identifier within the project.
+        :param embedding_cache: Optional persistent cache of embedding vectors.
         """
         self.logger = logging.getLogger(__name__)
 
         self.logger.debug("Initializing DataikuEmbeddingsLLM with embedding_llm_id=%s", embedding_llm_id)
-        self.client = dataiku.api_client()
-        self.project = self.client.get_default_project()
         self.embedding_llm_id = embedding_llm_id
-        self.embedding_llm = self.project.get_llm(self.embedding_llm_id)
+        self.embedding_llm = get_dataiku_llm(self.embedding_llm_id)
+        self.coalescer = get_embedding_coalescer(self.embedding_llm_id, self._embed_batch)
+        self.embedding_cache = embedding_cache
 
+    def _embed_batch(self, texts: list[str], token_counts: list[int] | None = None) -> list[list[float]]:
+        """
+        Send one LLM Mesh embedding request for a batch of texts (blocking).
+
+        :param token_counts: Token counts of the texts, as counted by the coalescer, counted here if None.
+        """
+        emb_query = self.embedding_llm.new_embeddings()
+        for text in texts:
+            emb_query.add_text(text)
+        embeddings = emb_query.execute().get_embeddings()
+        # The LLM Mesh does not report embedding usage
+        usage_tracker = get_usage_tracker()
+        if token_counts is None:
+            token_counts = [count_tokens(text, usage_tracker.encoding_name) for text in texts]
+        usage_tracker.record_embedding_request(len(texts), sum(token_counts))
+        return embeddings
+
+    async def _embed(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed texts, only sending the ones missing from the embedding cache to the LLM Mesh.
+        """
+        if self.embedding_cache is None:
+            return await self.coalescer.embed(texts)
+        cached = self.embedding_cache.get_many(texts)
+        embeddings = [None if vector is None else vector.tolist() for vector in cached]
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        get_usage_tracker().add(embedding_cache_hits=len(texts) - len(missing))
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            computed = await self.coalescer.embed(missing_texts)
+            self.embedding_cache.put_many(missing_texts, computed)
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = embedding
+        return embeddings
 
     async def __call__(
         self,
@@ -54,29 +93,15 @@ class DataikuEmbeddingsLLM(EmbeddingsLLM):
         """
         self.logger.debug("Received prompt for embedding generation: %r", prompt)
 
-        emb_query = self.embedding_llm.new_embeddings()
-
         if isinstance(prompt, str):
             prompt = [prompt]
 
-        for text in prompt:
-            emb_query.add_text(text)
-
-
         start_time = time.perf_counter()  # Start timing
-        loop = asyncio.get_running_loop()
-        with ThreadPoolExecutor() as executor:
-                emb_resp = await loop.run_in_executor(executor, emb_query.execute)
+        embeddings = await self._embed(list(prompt))
         end_time = time.perf_counter()  # End timing
         execution_time = end_time - start_time
         self.logger.debug(f"Embedding execution time: {execution_time:.4f} seconds")
 
-        #emb_resp = emb_query.execute()
-        
-        # Retrieve embeddings from response
-        #embeddings = emb_resp.get_embeddings()[0] if emb_resp.get_embeddings() else []
-        embeddings = emb_resp.get_embeddings()
-        
         self.logger.debug("Retrieved embeddings from response: length=%d", len(embeddings))
 
         # Construct the LLMOutput
@@ -84,7 +109,7 @@ class DataikuEmbeddingsLLM(EmbeddingsLLM):
             output=EmbeddingsContainer(embeddings),
             parsed_json=cast("TJsonModel", None),
         )
-        self.logger.info("Successfully generated embeddings for prompt.")
+        self.logger.debug("Successfully generated embeddings for prompt.")
         return llm_output
 
     def child(self, name: str):
@@ -1,24 +1,109 @@
 #import dku_graphrag.index.monkey_patch_dataiku  # This sets up the custom LLMs
 
 import logging
+import os
 
 import time
+from pathlib import Path
 
+from datashaper import NoopWorkflowCallbacks
 from graphrag.api import build_index
 
 from graphrag.logger.factory import LoggerFactory, LoggerType
 
+from dku_graphrag.index.build_state import BuildState
+from dku_graphrag.utils.telemetry import UsageTracker, get_usage_tracker
+
+# Merged tables an update run must write to the update storage, covariates are optional
+UPDATE_OUTPUT_TABLES = [
+    "create_final_documents.parquet",
+    "create_final_entities.parquet",
+    "create_final_relationships.parquet",
+    "create_final_nodes.parquet",
+    "create_final_communities.parquet",
+    "create_final_community_reports.parquet",
+    "create_final_text_units.parquet",
+]
+
+
+class UsageTrackingCallbacks(NoopWorkflowCallbacks):
+    """
+    Workflow callbacks attributing the LLM usage of the build to the graphrag workflow being run.
+    """
+
+    def __init__(self, usage_tracker: UsageTracker):
+        self.usage_tracker = usage_tracker
+
+    def on_workflow_start(self, name: str, instance: object) -> None:
+        self.usage_tracker.start_stage(name)
+
+    def on_workflow_end(self, name: str, instance: object) -> None:
+        self.usage_tracker.end_stage(name)
+
+
+class BuildCheckpointCallbacks(NoopWorkflowCallbacks):
+    """
+    Workflow callbacks persisting the progress of the build, so that an interrupted build can be resumed.
+    Workflows that reported errors (failed extractions...) are recorded to be run again on resume.
+    """
+
+    def __init__(self, build_state: BuildState):
+        self.build_state = build_state
+        self._current_workflow = None
+
+    def on_workflow_start(self, name: str, instance: object) -> None:
+        self._current_workflow = name
+
+    def on_workflow_end(self, name: str, instance: object) -> None:
+        self.build_state.workflow_completed(name)
+        self._current_workflow = None
+
+    def on_error(self, message: str, cause: BaseException | None = None, stack: str | None = None, details: dict | None = None) -> None:
+        if self._current_workflow is not None:
+            self.build_state.workflow_failed(self._current_workflow)
+
+
+class ErrorCollectingCallbacks(NoopWorkflowCallbacks):
+    """
+    Workflow callbacks recording the errors reported by the workflows: the update run of graphrag does
+    not return the results of its workflows, their errors are only reported to the callbacks.
+    """
+
+    def __init__(self):
+        self.errors: list[str] = []
+        self._current_workflow = None
+
+    def on_workflow_start(self, name: str, instance: object) -> None:
+        self._current_workflow = name
+
+    def on_workflow_end(self, name: str, instance: object) -> None:
+        self._current_workflow = None
+
+    def on_error(self, message: str, cause: BaseException | None = None, stack: str | None = None, details: dict | None = None) -> None:
+        self.errors.append(f"{self._current_workflow or 'pipeline'}: {message}" + (f" ({cause!r})" if cause is not None else ""))
+
+
 class DataikuGraphragIndexBuilder:
     """
     A class to handle building and updating a GraphRAG index, similar to the CLI commands,
     but without sys.exit() and signal handling. Ideal for use inside a Dataiku Python recipe.
     """
     
-    def __init__(self, chat_completion_llm_id, embedding_llm_id):
+    def __init__(self, chat_completion_llm_id, embedding_llm_id, response_cache=None, embedding_cache=None, usage_tracker=None, retry_policy=None, build_state=None):
         self.logger = logging.getLogger(__name__)
         self.logger_type = LoggerType.RICH
         self.chat_completion_llm_id = chat_completion_llm_id
         self.embedding_llm_id = embedding_llm_id
+        # Optional persistent SQLiteLLMCache shared by every chat LLM graphrag creates
+        self.response_cache = response_cache
+        # Optional persistent EmbeddingCache, vectors of already seen texts are not recomputed
+        self.embedding_cache = embedding_cache
+        # Per-workflow LLM usage, durations and queue wait times of the build
+        self.usage_tracker = usage_tracker or get_usage_tracker()
+        # Optional RetryPolicy of the chat LLM calls
+        self.retry_policy = retry_policy
+        # Optional BuildState checkpointed after every workflow
+        self.build_state = build_state
         # monkey_patch chat completion and embeddings models
         self.logger.info(f"Start oading Dataiku in graphrag. chat_completion_llm_id={chat_completion_llm_id}, embedding_llm_id={embedding_llm_id}")
 
@@ -28,10 +113,10 @@ class DataikuGraphragIndexBuilder:
         from graphrag.index.llm.load_llm import loaders
 
         def _load_dataiku_chat_llm(on_error, cache, config):
-            return DataikuChatLLM(self.chat_completion_llm_id)
+            return DataikuChatLLM(self.chat_completion_llm_id, response_cache=self.response_cache, retry_policy=self.retry_policy)
 
         def _load_dataiku_embeddings_llm(on_error, cache, config):
-            return DataikuEmbeddingsLLM(self.embedding_llm_id)
+            return DataikuEmbeddingsLLM(self.embedding_llm_id, embedding_cache=self.embedding_cache)
 
         # Override OpenAIChat loader
         loaders[LLMType.OpenAIChat] = {
@@ -55,9 +140,10 @@ class DataikuGraphragIndexBuilder:
         verbose: bool,
         resume: str | None,
         memprofile: bool
-    ) -> None:
-       
-     
+    ) -> bool:
+        """
+        Run the full indexing. Returns True if every workflow succeeded.
+        """
         progress_logger = LoggerFactory().create_logger(self.logger_type)
         if verbose:
             self.logger.setLevel(level=logging.DEBUG)
@@ -75,18 +161,15 @@ class DataikuGraphragIndexBuilder:
             is_resume_run=bool(resume),
             memory_profile=memprofile,
             progress_logger=progress_logger,
-            callbacks=None,
+            callbacks=self._callbacks(),
         )
         
         self.logger.info("Index building completed.")
 
-        # Process results
-        for output in outputs:
-            if output.errors:
-                for err in output.errors:
-                    self.logger.error(f"Error in workflow {output.workflow}: {err}")
-            else:
-                self.logger.info(f"Workflow completed successfully: {output.workflow}")
+        success = self._log_outputs(outputs)
+        self._log_cache_stats()
+        self.usage_tracker.log_summary()
+        return success
 
     async def run_update_index_pipeline(
        self,
@@ -94,9 +177,10 @@ class DataikuGraphragIndexBuilder:
         verbose: bool,
         resume: str | None,
         memprofile: bool
-    ) -> None:
+    ) -> bool:
         """
-        Run the update indexing.
+        Run the update indexing: graphrag only processes the input documents whose title is not
+        in the existing index, and merges the results with it. Returns True if every workflow succeeded.
         """
         progress_logger = LoggerFactory().create_logger(self.logger_type)
         if verbose:
@@ -108,10 +192,9 @@ class DataikuGraphragIndexBuilder:
         if not config.update_index_storage:
             raise ValueError("please configure the update_index_storage")
             
-        run_id = "update_run"
         self.logger.info(f"Starting update indexing pipeline run with run_id={run_id}")
 
-       
+        error_collector = ErrorCollectingCallbacks()
         try:
             outputs = await build_index(
                 config=config,
@@ -119,18 +202,80 @@ class DataikuGraphragIndexBuilder:
                 is_resume_run=False,
                 memory_profile=memprofile,
                 progress_logger=progress_logger,
-                callbacks=None,
+                callbacks=[*self._callbacks(), error_collector],
             )
         except Exception:
             self.logger.exception("An unexpected error occurred during the update indexing.")
-            return
+            raise
 
         self.logger.info("Update indexing completed.")
 
-        # Process results
+        # The update branch of graphrag yields no workflow results: check the reported errors and the merged tables
+        success = self._log_outputs(outputs)
+        for error in error_collector.errors:
+            self.logger.error(f"Error in update workflow {error}")
+        success = success and not error_collector.errors and self._update_outputs_complete(config)
+        if success:
+            self._promote_update_outputs(config)
+        else:
+            self.logger.error("The update run failed, the previous index tables are kept")
+        self._log_cache_stats()
+        self.usage_tracker.log_summary()
+        return success
+
+    def _callbacks(self) -> list[NoopWorkflowCallbacks]:
+        callbacks = [UsageTrackingCallbacks(self.usage_tracker)]
+        if self.build_state is not None:
+            callbacks.append(BuildCheckpointCallbacks(self.build_state))
+        return callbacks
+
+    def _log_outputs(self, outputs) -> bool:
+        """
+        Log the result of each workflow. Returns True if none of them failed.
+        """
+        success = True
         for output in outputs:
             if output.errors:
+                success = False
                 for err in output.errors:
                     self.logger.error(f"Error in workflow {output.workflow}: {err}")
             else:
-                self.logger.info(f"Workflow completed successfully: {output.workflow}")
\ No newline at end of file
+                self.logger.info(f"Workflow completed successfully: {output.workflow}")
+        return success
+
+    def _update_outputs_complete(self, config) -> bool:
+        """
+        Check that the update run wrote every merged table to the update storage.
+        """
+        if config.storage.type != "file" or config.update_index_storage.type != "file":
+            return True
+        update_dir = Path(config.root_dir) / config.update_index_storage.base_dir
+        missing_tables = [name for name in UPDATE_OUTPUT_TABLES if not (update_dir / name).exists()]
+        if missing_tables:
+            self.logger.error(f"The update run did not write the merged tables {missing_tables} to {update_dir}")
+        return not missing_tables
+
+    def _promote_update_outputs(self, config) -> None:
+        """
+        graphrag writes the merged tables of an update run to the update storage. Move them over the
+        previous tables so the output storage always holds the latest complete index. The output storage
+        is the directory of the new generation, the tables of the published one are only replaced there.
+        """
+        if config.storage.type != "file" or config.update_index_storage.type != "file":
+            return
+        root_dir = Path(config.root_dir)
+        update_dir = root_dir / config.update_index_storage.base_dir
+        output_dir = root_dir / config.storage.base_dir
+        for table_path in update_dir.glob("*.parquet"):
+            os.replace(table_path, output_dir / table_path.name)
+            self.logger.info(f"Promoted updated table {table_path.name} to {output_dir}")
+
+    def _log_cache_stats(self) -> None:
+        """
+        Log the cache statistics of the pipeline run and persist the embedding cache.
+        """
+        if self.response_cache is not None:
+            self.logger.info(f"LLM response cache stats: {self.response_cache.stats()}")
+        if self.embedding_cache is not None:
+            self.embedding_cache.flush()
+            self.logger.info(f"Embedding cache stats: {self.embedding_cache.stats()}")
@@ -0,0 +1,124 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+STATE_DIR_NAME = "dku_state"
+MANIFEST_FILE_NAME = "documents_manifest.parquet"
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentDiff:
+    """
+    Result of the comparison of the input dataset with the documents of the previous run.
+
+    :param manifest: Manifest (key, row_hash) describing the current rows.
+    """
+
+    def __init__(self, manifest: pd.DataFrame, added: int, changed: int, removed: int):
+        self.manifest = manifest
+        self.added = added
+        self.changed = changed
+        self.removed = removed
+
+    def __repr__(self):
+        return f"DocumentDiff(added={self.added}, changed={self.changed}, removed={self.removed})"
+
+
+def _canonical_strings(column: pd.Series) -> pd.Series:
+    """
+    Render the values of a column as strings that do not depend on the dtype the column was read with:
+    missing values are empty and integral floats are rendered as integers, so "3" and 3.0 hash the same.
+    """
+    values = column.astype(object).where(column.notna(), "").astype(str)
+    if pd.api.types.is_float_dtype(column):
+        integral = np.isfinite(column) & (column % 1 == 0) & (column.abs() < 2**63)
+        values[integral] = column[integral].astype("int64").astype(str)
+    return values
+
+
+def compute_manifest(df: pd.DataFrame, columns: list[str], id_column: str | None = None) -> pd.DataFrame:
+    """
+    Hash the content of each row. Rows are identified by `id_column` when given, which allows
+    changed documents to be told apart from new ones; otherwise the content hash is the identity.
+    """
+    content = pd.DataFrame({column: _canonical_strings(df[column]) for column in columns}, index=df.index)
+    row_hash = pd.util.hash_pandas_object(content, index=False).astype("uint64")
+    if id_column:
+        key = _canonical_strings(df[id_column])
+    else:
+        key = row_hash.astype(str)
+    return pd.DataFrame({"key": key.to_numpy(), "row_hash": row_hash.to_numpy()})
+
+
+class DocumentDiffer:
+    """
+    Compare the input dataset with the manifest of the previous run, one chunk at a time,
+    so that the dataset never has to be held in memory.
+
+    :param previous: Manifest of the previous run, None if there is none.
+    """
+
+    def __init__(self, previous: pd.DataFrame | None):
+        self.previous_hashes = None
+        if previous is not None:
+            self.previous_hashes = previous.drop_duplicates("key", keep="last").set_index("key")["row_hash"]
+        self._manifests = []
+        self.added = 0
+        self.changed = 0
+
+    def diff_chunk(self, manifest: pd.DataFrame) -> pd.Series:
+        """
+        Record the manifest of a chunk of rows. Returns a boolean mask, True for added and changed rows.
+        """
+        self._manifests.append(manifest)
+        if self.previous_hashes is None:
+            self.added += len(manifest)
+            return pd.Series(True, index=manifest.index)
+        known_hash = manifest["key"].map(self.previous_hashes)
+        is_added = known_hash.isna()
+        is_changed = ~is_added & (known_hash != manifest["row_hash"])
+        self.added += int(is_added.sum())
+        self.changed += int(is_changed.sum())
+        return is_added | is_changed
+
+    def finish(self) -> DocumentDiff:
+        """
+        Build the manifest of the whole dataset and count the removed documents.
+        """
+        if self._manifests:
+            manifest = pd.concat(self._manifests, ignore_index=True)
+        else:
+            manifest = pd.DataFrame({"key": pd.Series(dtype=str), "row_hash": pd.Series(dtype="uint64")})
+        removed = 0
+        if self.previous_hashes is not None:
+            removed = int((~self.previous_hashes.index.isin(manifest["key"])).sum())
+        return DocumentDiff(manifest, added=self.added, changed=self.changed, removed=removed)
+
+
+def get_manifest_path(folder_path: str) -> str:
+    return os.path.join(folder_path, STATE_DIR_NAME, MANIFEST_FILE_NAME)
+
+
+def load_manifest(folder_path: str) -> pd.DataFrame | None:
+    """
+    Load the manifest written by the previous successful run, if any.
+    """
+    manifest_path = get_manifest_path(folder_path)
+    if not os.path.exists(manifest_path):
+        return None
+    return pd.read_parquet(manifest_path)
+
+
+def save_manifest(folder_path: str, manifest: pd.DataFrame) -> None:
+    """
+    Atomically replace the manifest, only once the index has been successfully built.
+    """
+    manifest_path = get_manifest_path(folder_path)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    tmp_path = manifest_path + ".tmp"
+    manifest.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, manifest_path)
+    logger.info(f"Saved manifest of {len(manifest)} documents to {manifest_path}")
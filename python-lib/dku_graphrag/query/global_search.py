@@ -0,0 +1,431 @@
+import asyncio
+import logging
+import time
+from typing import Any, AsyncGenerator
+
+import numpy as np
+import pandas as pd
+import tiktoken
+from graphrag.api.query import _load_search_prompt, _reformat_context_data
+from graphrag.config.models.graph_rag_config import GraphRagConfig
+from graphrag.model.community_report import CommunityReport
+from graphrag.query.context_builder.community_context import build_community_context
+from graphrag.query.indexer_adapters import read_indexer_communities, read_indexer_entities, read_indexer_reports
+from graphrag.query.llm import get_client
+from graphrag.query.llm.base import BaseLLM
+from graphrag.query.structured_search.base import SearchResult
+from graphrag.query.structured_search.global_search.community_context import GlobalCommunityContext
+from graphrag.query.structured_search.global_search.search import GlobalSearch
+
+from dku_graphrag.query.query_dataiku_chat_llm import QueryDataikuChatLLM
+from dku_graphrag.query.token_counts import num_tokens
+from dku_graphrag.utils.deadline import MAP_BATCHES_DROPPED, DeadlineExceededError, deadline_context_tokens, get_deadline, with_deadline
+
+# Key points scored by the map prompt range from 0 to 100
+DEFAULT_MIN_KEY_POINT_SCORE = 80
+
+logger = logging.getLogger(__name__)
+
+
+class ReportRanker:
+    """
+    Rank community reports by the cosine similarity of their summary with the query.
+    Report vectors are kept in memory once computed, and persisted by the embedding cache.
+
+    :param embedder: The query text embedder.
+    """
+
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self._vectors: dict[str, np.ndarray] = {}
+
+    @staticmethod
+    def _report_text(report: CommunityReport) -> str:
+        return report.summary or report.title or report.full_content[:2000]
+
+    async def _embed(self, texts: list[str]) -> list[list[float]]:
+        if hasattr(self.embedder, "aembed_many"):
+            return await self.embedder.aembed_many(texts)
+        return await asyncio.gather(*[self.embedder.aembed(text) for text in texts])
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    async def rank(self, reports: list[CommunityReport], query: str) -> list[CommunityReport]:
+        """
+        Return the reports sorted from the most to the least relevant to the query.
+        """
+        if len(reports) < 2:
+            return reports
+        texts = [self._report_text(report) for report in reports]
+        missing = list(dict.fromkeys(text for text in texts if text not in self._vectors))
+        if missing:
+            for text, vector in zip(missing, self._normalize(await self._embed(missing))):
+                self._vectors[text] = vector
+        query_vector = self._normalize(await self.embedder.aembed(query))
+        similarities = np.stack([self._vectors[text] for text in texts]) @ query_vector
+        # Stable sort keeps the rank order of the reports for equal similarities
+        order = np.argsort(-similarities, kind="stable")
+        return [reports[i] for i in order]
+
+
+class RankedGlobalSearch(GlobalSearch):
+    """
+    Global search whose map phase processes the report batches most relevant to the query first,
+    with a bounded number of concurrent map calls, and stops issuing map calls once enough
+    high-scoring key points have been collected.
+
+    :param report_ranker: Ranks the reports before they are batched, None keeps graphrag's shuffled order.
+    :param target_key_points: Number of key points scoring at least `min_key_point_score` after which
+        the remaining batches are skipped. 0 maps every batch.
+    :param map_llm: LLM of the map calls, typically a faster and cheaper model than the one writing
+        the final answer in the reduce step. None uses `llm` for both.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        report_ranker: ReportRanker | None = None,
+        target_key_points: int = 0,
+        min_key_point_score: int = DEFAULT_MIN_KEY_POINT_SCORE,
+        map_llm: BaseLLM | None = None,
+        **kwargs: Any,
+    ):
+        super().__init__(*args, **kwargs)
+        self.map_llm = map_llm or self.llm
+        self.report_ranker = report_ranker
+        self.target_key_points = target_key_points
+        self.min_key_point_score = min_key_point_score
+        # Batches acquire a slot before deciding whether to call the LLM, in ranked order
+        self.map_slots = asyncio.Semaphore(kwargs.get("concurrent_coroutines", 32))
+        self.high_score_key_points = 0
+        self.mapped_batches = 0
+        self.skipped_batches = 0
+
+    async def _prepare(self, query: str) -> None:
+        self.high_score_key_points = 0
+        self.mapped_batches = 0
+        self.skipped_batches = 0
+        if self.report_ranker is None:
+            return
+        self.context_builder_params = {**self.context_builder_params, "shuffle_data": False}
+        selection = self.context_builder.dynamic_community_selection
+        if selection is None:
+            self.context_builder.community_reports = await self.report_ranker.rank(self.context_builder.community_reports, query)
+            return
+        select = selection.select
+
+        async def ranked_select(query: str):
+            reports, info = await select(query)
+            return await self.report_ranker.rank(reports, query), info
+
+        selection.select = ranked_select
+
+    def _log_map_phase(self) -> None:
+        logger.info(
+            f"Global search map phase: {self.mapped_batches} batches mapped, {self.skipped_batches} skipped, "
+            f"{self.high_score_key_points} key points scored {self.min_key_point_score} or more"
+        )
+
+    async def asearch(self, query: str, conversation_history=None, **kwargs: Any):
+        await self._prepare(query)
+        result = await super().asearch(query, conversation_history, **kwargs)
+        self._log_map_phase()
+        return result
+
+    async def astream_search(self, query: str, conversation_history=None) -> AsyncGenerator:
+        await self._prepare(query)
+        first_chunk = True
+        async for chunk in super().astream_search(query, conversation_history):
+            if first_chunk:
+                # The map phase is over once the context records are sent
+                self._log_map_phase()
+                first_chunk = False
+            yield chunk
+
+    async def map_phase(self, query: str):
+        """
+        Build the context of a query and map its report batches, without the reduce step.
+        Returns the context records and the map responses.
+        """
+        await self._prepare(query)
+        context_result = await self.context_builder.build_context(query=query, **self.context_builder_params)
+        map_responses = await asyncio.gather(*[
+            self._map_response_single_batch(context_data=data, query=query, **self.map_llm_params)
+            for data in context_result.context_chunks
+        ])
+        self._log_map_phase()
+        return context_result.context_records, map_responses
+
+    def _has_enough_key_points(self) -> bool:
+        return self.target_key_points > 0 and self.high_score_key_points >= self.target_key_points
+
+    @staticmethod
+    def _out_of_time() -> bool:
+        # The time left to the request deadline is kept for the reduce step
+        deadline = get_deadline()
+        if deadline is None or deadline.stage_remaining() > 0:
+            return False
+        deadline.degrade(MAP_BATCHES_DROPPED)
+        return True
+
+    async def _map_response_single_batch(self, context_data: str, query: str, **llm_kwargs) -> SearchResult:
+        async with self.map_slots:
+            if self._has_enough_key_points() or self._out_of_time():
+                self.skipped_batches += 1
+                return SearchResult(
+                    response=[],
+                    context_data=context_data,
+                    context_text=context_data,
+                    completion_time=0.0,
+                    llm_calls=0,
+                    prompt_tokens=0,
+                    output_tokens=0,
+                )
+            result = await self._map_batch(context_data, query, **llm_kwargs)
+            self.mapped_batches += 1
+            self.high_score_key_points += sum(
+                1 for key_point in result.response if key_point.get("score", 0) >= self.min_key_point_score
+            )
+            return result
+
+    async def _map_batch(self, context_data: str, query: str, **llm_kwargs) -> SearchResult:
+        """
+        graphrag's map call of a single batch, sent to `map_llm` instead of `llm`.
+        """
+        start_time = time.time()
+        search_prompt = self.map_system_prompt.format(context_data=context_data)
+        try:
+            async with self.semaphore:
+                search_response = await with_deadline(
+                    self.map_llm.agenerate(
+                        messages=[
+                            {"role": "system", "content": search_prompt},
+                            {"role": "user", "content": query},
+                        ],
+                        streaming=False,
+                        **llm_kwargs,
+                    ),
+                    reserve=True,
+                )
+        except DeadlineExceededError:
+            get_deadline().degrade(MAP_BATCHES_DROPPED)
+            return SearchResult(
+                response=[],
+                context_data=context_data,
+                context_text=context_data,
+                completion_time=time.time() - start_time,
+                llm_calls=1,
+                prompt_tokens=num_tokens(search_prompt, self.token_encoder),
+                output_tokens=0,
+            )
+        except Exception:
+            logger.exception("Map call failed, skipping the batch")
+            return SearchResult(
+                response=[{"answer": "", "score": 0}],
+                context_data=context_data,
+                context_text=context_data,
+                completion_time=time.time() - start_time,
+                llm_calls=1,
+                prompt_tokens=num_tokens(search_prompt, self.token_encoder),
+                output_tokens=0,
+            )
+        try:
+            key_points = self.parse_search_response(search_response)
+        except ValueError:
+            logger.warning("Map response is not valid JSON, skipping the batch")
+            key_points = []
+        return SearchResult(
+            response=key_points,
+            context_data=context_data,
+            context_text=context_data,
+            completion_time=time.time() - start_time,
+            llm_calls=1,
+            prompt_tokens=num_tokens(search_prompt, self.token_encoder),
+            output_tokens=num_tokens(search_response, self.token_encoder),
+        )
+
+
+def get_ranked_global_search_engine(
+    config: GraphRagConfig,
+    reports: list[CommunityReport],
+    entities: list,
+    communities: list,
+    response_type: str,
+    dynamic_community_selection: bool = False,
+    report_ranker: ReportRanker | None = None,
+    map_concurrency: int | None = None,
+    target_key_points: int = 0,
+    min_key_point_score: int = DEFAULT_MIN_KEY_POINT_SCORE,
+    map_llm_id: str | None = None,
+) -> RankedGlobalSearch:
+    """
+    Create a RankedGlobalSearch engine, configured like graphrag's get_global_search_engine.
+
+    :param map_concurrency: Maximum concurrent map calls of one query, defaults to global_search.concurrency.
+    :param map_llm_id: LLM Mesh id of the LLM rating the communities and mapping the report batches,
+        None uses the chat LLM of the config, which always writes the final answer.
+    """
+    token_encoder = tiktoken.get_encoding(config.encoding_model)
+    gs_config = config.global_search
+    llm = get_client.get_llm(config)
+    # The fan-out stages can run on a faster model than the reduce step
+    map_llm = QueryDataikuChatLLM(map_llm_id) if map_llm_id else llm
+
+    dynamic_community_selection_kwargs = {}
+    if dynamic_community_selection:
+        dynamic_community_selection_kwargs.update({
+            "llm": map_llm,
+            "token_encoder": token_encoder,
+            "keep_parent": gs_config.dynamic_search_keep_parent,
+            "num_repeats": gs_config.dynamic_search_num_repeats,
+            "use_summary": gs_config.dynamic_search_use_summary,
+            "concurrent_coroutines": gs_config.dynamic_search_concurrent_coroutines,
+            "threshold": gs_config.dynamic_search_threshold,
+            "max_level": gs_config.dynamic_search_max_level,
+        })
+
+    return RankedGlobalSearch(
+        llm=llm,
+        map_llm=map_llm,
+        map_system_prompt=_load_search_prompt(config.root_dir, gs_config.map_prompt),
+        reduce_system_prompt=_load_search_prompt(config.root_dir, gs_config.reduce_prompt),
+        general_knowledge_inclusion_prompt=_load_search_prompt(config.root_dir, gs_config.knowledge_prompt),
+        context_builder=GlobalCommunityContext(
+            community_reports=reports,
+            communities=communities,
+            entities=entities,
+            token_encoder=token_encoder,
+            dynamic_community_selection=dynamic_community_selection,
+            dynamic_community_selection_kwargs=dynamic_community_selection_kwargs,
+        ),
+        token_encoder=token_encoder,
+        # Fewer key points make the reduce step faster when the request is running late
+        max_data_tokens=deadline_context_tokens(gs_config.data_max_tokens),
+        map_llm_params={
+            "max_tokens": gs_config.map_max_tokens,
+            "temperature": gs_config.temperature,
+            "top_p": gs_config.top_p,
+            "n": gs_config.n,
+        },
+        reduce_llm_params={
+            "max_tokens": gs_config.reduce_max_tokens,
+            "temperature": gs_config.temperature,
+            "top_p": gs_config.top_p,
+            "n": gs_config.n,
+        },
+        allow_general_knowledge=False,
+        json_mode=False,
+        context_builder_params=_context_builder_params(gs_config),
+        concurrent_coroutines=map_concurrency or gs_config.concurrency,
+        response_type=response_type,
+        report_ranker=report_ranker,
+        target_key_points=target_key_points,
+        min_key_point_score=min_key_point_score,
+    )
+
+
+def _context_builder_params(gs_config) -> dict:
+    return {
+        "use_community_summary": False,
+        "shuffle_data": True,
+        "include_community_rank": True,
+        "min_community_rank": 0,
+        "community_rank_name": "rank",
+        "include_community_weight": True,
+        "community_weight_name": "occurrence weight",
+        "normalize_community_weight": True,
+        "max_tokens": gs_config.max_tokens,
+        "context_name": "Reports",
+    }
+
+
+def count_global_context_rows(
+    config: GraphRagConfig,
+    nodes: pd.DataFrame,
+    entities: pd.DataFrame,
+    community_reports: pd.DataFrame,
+    community_level: int | None,
+    dynamic_community_selection: bool,
+) -> None:
+    """
+    Count the tokens of the rows of every community report global search batches, formatted by
+    graphrag's context builder as the queries format them, so that their counts can be precomputed
+    (see `dku_graphrag.query.token_counts.load_token_counts`). Takes the table arguments of
+    `build_ranked_global_search_engine`.
+    """
+    reports = read_indexer_reports(
+        community_reports,
+        nodes,
+        community_level=community_level,
+        dynamic_community_selection=dynamic_community_selection,
+    )
+    build_community_context(
+        community_reports=reports,
+        entities=read_indexer_entities(nodes, entities, community_level=community_level),
+        token_encoder=tiktoken.get_encoding(config.encoding_model),
+        single_batch=False,
+        **_context_builder_params(config.global_search),
+    )
+
+
+def build_ranked_global_search_engine(
+    config: GraphRagConfig,
+    nodes: pd.DataFrame,
+    entities: pd.DataFrame,
+    communities: pd.DataFrame,
+    community_reports: pd.DataFrame,
+    community_level: int | None,
+    dynamic_community_selection: bool,
+    response_type: str,
+    **engine_kwargs: Any,
+) -> RankedGlobalSearch:
+    """
+    Convert the index tables and create a RankedGlobalSearch engine on them.
+    """
+    communities_ = read_indexer_communities(communities, nodes, community_reports)
+    reports = read_indexer_reports(
+        community_reports,
+        nodes,
+        community_level=community_level,
+        dynamic_community_selection=dynamic_community_selection,
+    )
+    entities_ = read_indexer_entities(nodes, entities, community_level=community_level)
+    return get_ranked_global_search_engine(
+        config,
+        reports=reports,
+        entities=entities_,
+        communities=communities_,
+        response_type=response_type,
+        dynamic_community_selection=dynamic_community_selection,
+        **engine_kwargs,
+    )
+
+
+async def ranked_global_search(config: GraphRagConfig, query: str, **kwargs: Any):
+    """
+    Drop-in replacement of graphrag's api.query.global_search running a RankedGlobalSearch.
+    Takes the same table arguments plus the RankedGlobalSearch options.
+    """
+    search_engine = build_ranked_global_search_engine(config, **kwargs)
+    result = await search_engine.asearch(query=query)
+    return result.response, _reformat_context_data(result.context_data)
+
+
+async def ranked_global_search_streaming(config: GraphRagConfig, query: str, **kwargs: Any) -> AsyncGenerator:
+    """
+    Drop-in replacement of graphrag's api.query.global_search_streaming: yields the context data first,
+    then the response tokens.
+    """
+    search_engine = build_ranked_global_search_engine(config, **kwargs)
+    first_chunk = True
+    async for chunk in search_engine.astream_search(query=query):
+        if first_chunk:
+            yield _reformat_context_data(chunk)
+            first_chunk = False
+        else:
+            yield chunk
@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import time
+from typing import Any, AsyncGenerator, Awaitable, Callable
+
+import pandas as pd
+from graphrag.prompts.query.global_search_reduce_system_prompt import NO_DATA_ANSWER
+from graphrag.query.structured_search.local_search.search import LocalSearch
+
+from dku_graphrag.query.token_counts import num_tokens
+
+HYBRID_SEARCH = "hybrid"
+# Strategies of the hybrid search
+RACE = "race"
+MERGE = "merge"
+DEFAULT_MIN_ANSWER_LENGTH = 200
+# Budget of the global key points in a merged context, relative to the local context budget
+KEY_POINTS_TOKEN_SHARE = 0.5
+KEY_POINTS_SECTION = "key_points"
+
+logger = logging.getLogger(__name__)
+
+
+def is_good_answer(response: Any, min_answer_length: int = DEFAULT_MIN_ANSWER_LENGTH) -> bool:
+    """
+    Whether a search answer is worth returning without waiting for the other search: long enough,
+    and not graphrag's answer for a global search that found no relevant key point.
+    """
+    text = str(response or "").strip()
+    return len(text) >= min_answer_length and not text.startswith(NO_DATA_ANSWER)
+
+
+async def race_searches(
+    searches: dict[str, Callable[[], Awaitable[tuple[Any, Any]]]],
+    latency_budget: float | None = None,
+    min_answer_length: int = DEFAULT_MIN_ANSWER_LENGTH,
+) -> tuple[Any, Any, dict]:
+    """
+    Run searches concurrently and return the first good answer (see `is_good_answer`), cancelling
+    the others. If the first answers are not good, the others are awaited until the latency budget
+    is spent, then the first answer received is returned. If none came within the budget, the
+    first one to come is returned.
+
+    :param searches: Coroutine functions returning a (response, context) pair, by name.
+    :param latency_budget: Seconds after which a not so good answer is accepted, None to wait for every search.
+    :return: The response, the context and a report naming the search that won.
+    """
+    start_time = time.perf_counter()
+    tasks = {asyncio.ensure_future(search()): name for name, search in searches.items()}
+    pending = set(tasks)
+    report = {"strategy": RACE, "winner": None, "good_answer": False, "over_budget": False, "failed": [], "cancelled": []}
+    winner, fallback, first_error = None, None, None
+    try:
+        while pending and winner is None:
+            timeout = None
+            if latency_budget is not None and not report["over_budget"]:
+                timeout = max(0.0, latency_budget - (time.perf_counter() - start_time))
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # Budget spent, take the first answer received or the next one to come
+                report["over_budget"] = True
+                if fallback is not None:
+                    break
+                continue
+            for task in done:
+                name = tasks[task]
+                if task.exception() is not None:
+                    logger.warning(f"Hybrid search: {name} search failed: {task.exception()!r}")
+                    report["failed"].append(name)
+                    first_error = first_error or task.exception()
+                    continue
+                response, context = task.result()
+                seconds = time.perf_counter() - start_time
+                if is_good_answer(response, min_answer_length):
+                    winner = (name, response, context, seconds)
+                    break
+                if fallback is None:
+                    fallback = (name, response, context, seconds)
+            if fallback is not None and report["over_budget"]:
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+            report["cancelled"].append(tasks[task])
+        # The cancelled searches unwind, releasing their LLM Mesh slots, before the request moves on
+        await asyncio.gather(*pending, return_exceptions=True)
+    report["good_answer"] = winner is not None
+    winner = winner or fallback
+    if winner is None:
+        raise first_error
+    name, response, context, seconds = winner
+    report["winner"] = name
+    report["winner_seconds"] = seconds
+    logger.info(f"Hybrid search: {name} search answered first in {seconds:.2f}s, good answer: {report['good_answer']}")
+    return response, context, report
+
+
+def format_key_points(map_responses: list, max_tokens: int, token_encoder: Any, column_delimiter: str = "|") -> tuple[str, pd.DataFrame]:
+    """
+    Format the key points of a global search map phase as a context section, the highest scored
+    first, within `max_tokens`. Key points scored 0 are dropped, as in graphrag's reduce step.
+    """
+    key_points = [
+        (key_point.get("score", 0), key_point.get("answer", ""))
+        for result in map_responses
+        for key_point in result.response
+        if key_point.get("score", 0) > 0
+    ]
+    key_points.sort(key=lambda key_point: key_point[0], reverse=True)
+    text = "-----Key Points-----\n" + column_delimiter.join(["id", "score", "key point"]) + "\n"
+    used_tokens = num_tokens(text, token_encoder)
+    rows = []
+    for score, answer in key_points:
+        row_text = column_delimiter.join([str(len(rows)), str(score), answer.replace("\n", " ")]) + "\n"
+        row_tokens = num_tokens(row_text, token_encoder)
+        if used_tokens + row_tokens > max_tokens:
+            break
+        text += row_text
+        used_tokens += row_tokens
+        rows.append([str(len(rows)), score, answer])
+    if not rows:
+        return "", pd.DataFrame(columns=["id", "score", "key point"])
+    return text, pd.DataFrame(rows, columns=["id", "score", "key point"])
+
+
+async def build_local_search_context(engine: LocalSearch, query: str) -> tuple[str, dict[str, pd.DataFrame]]:
+    """
+    Build the context of a local search engine, in a worker thread as graphrag builds it synchronously.
+    """
+    result = await asyncio.to_thread(engine.context_builder.build_context, query=query, **engine.context_builder_params)
+    return result.context_chunks, result.context_records
+
+
+class HybridMergedSearch:
+    """
+    Hybrid search answering from both contexts: the local search context is built while the global
+    search maps the community reports, then the key points of the map phase are appended to the
+    local context and a single answer is generated with the local search prompt. The map phase is
+    cancelled if it is not over within the latency budget, the answer is then based on the local
+    context only.
+
+    :param local_engine: Local search engine whose LLM, prompt and parameters generate the answer.
+    :param build_local_context: Coroutine function of the query returning the local context text and records.
+    :param map_global: Coroutine function of the query returning the global context records and map responses.
+    :param latency_budget: Seconds the map phase may take, None to always wait for it.
+    """
+
+    def __init__(
+        self,
+        local_engine: LocalSearch,
+        build_local_context: Callable[[str], Awaitable[tuple[str, dict]]],
+        map_global: Callable[[str], Awaitable[tuple[dict, list]]],
+        latency_budget: float | None = None,
+    ):
+        self.local_engine = local_engine
+        self.build_local_context = build_local_context
+        self.map_global = map_global
+        self.latency_budget = latency_budget
+        self.report = {"strategy": MERGE}
+
+    async def build_context(self, query: str) -> tuple[str, dict[str, pd.DataFrame]]:
+        start_time = time.perf_counter()
+        global_task = asyncio.ensure_future(self.map_global(query))
+        try:
+            context_text, context_records = await self.build_local_context(query)
+        except BaseException:
+            global_task.cancel()
+            raise
+        self.report["local_context_seconds"] = time.perf_counter() - start_time
+        context_records = dict(context_records)
+        timeout = None
+        if self.latency_budget is not None:
+            timeout = max(0.0, self.latency_budget - (time.perf_counter() - start_time))
+        try:
+            global_records, map_responses = await asyncio.wait_for(global_task, timeout)
+        except asyncio.TimeoutError:
+            logger.info(f"Hybrid search: global map phase not over after {self.latency_budget}s, answering from the local context")
+            self.report["global"] = "over_budget"
+            return context_text, context_records
+        except Exception as e:
+            logger.warning(f"Hybrid search: global map phase failed, answering from the local context: {e!r}")
+            self.report["global"] = "failed"
+            return context_text, context_records
+        self.report["global"] = "merged"
+        self.report["global_map_seconds"] = time.perf_counter() - start_time
+        max_tokens = int(self.local_engine.context_builder_params.get("max_tokens", 8000) * KEY_POINTS_TOKEN_SHARE)
+        key_points_text, key_points = format_key_points(map_responses, max_tokens, self.local_engine.token_encoder)
+        self.report["key_points"] = len(key_points)
+        for name, records in global_records.items():
+            context_records[f"global_{name}"] = records
+        if key_points_text:
+            context_text = f"{context_text}\n\n{key_points_text}"
+            context_records[KEY_POINTS_SECTION] = key_points
+        return context_text, context_records
+
+    def _messages(self, query: str, context_text: str) -> list[dict]:
+        search_prompt = self.local_engine.system_prompt.format(context_data=context_text, response_type=self.local_engine.response_type)
+        return [
+            {"role": "system", "content": search_prompt},
+            {"role": "user", "content": query},
+        ]
+
+    async def asearch(self, query: str) -> tuple[str, dict[str, pd.DataFrame]]:
+        context_text, context_records = await self.build_context(query)
+        response = await self.local_engine.llm.agenerate(
+            messages=self._messages(query, context_text),
+            streaming=True,
+            callbacks=self.local_engine.callbacks,
+            **self.local_engine.llm_params,
+        )
+        return response, context_records
+
+    async def astream_search(self, query: str) -> AsyncGenerator:
+        context_text, context_records = await self.build_context(query)
+        yield context_records
+        async for response in self.local_engine.llm.astream_generate(
+            messages=self._messages(query, context_text),
+            callbacks=self.local_engine.callbacks,
+            **self.local_engine.llm_params,
+        ):
+            yield response
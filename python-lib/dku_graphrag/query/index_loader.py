@@ -0,0 +1,152 @@
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from dku_graphrag.utils.memory import get_rss_bytes
+
+INDEX_TABLE_FILES = {
+    "nodes": "create_final_nodes.parquet",
+    "entities": "create_final_entities.parquet",
+    "communities": "create_final_communities.parquet",
+    "community_reports": "create_final_community_reports.parquet",
+    "text_units": "create_final_text_units.parquet",
+    "relationships": "create_final_relationships.parquet",
+    "covariates": "create_final_covariates.parquet",
+}
+
+# Tables each search type reads, covariates are optional
+SEARCH_TABLES = {
+    "global": ["nodes", "entities", "communities", "community_reports"],
+    "local": ["nodes", "entities", "community_reports", "text_units", "relationships", "covariates"],
+    "hybrid": ["nodes", "entities", "communities", "community_reports", "text_units", "relationships", "covariates"],
+}
+OPTIONAL_TABLES = {"covariates"}
+
+# Columns of the index tables that neither local nor global search read: embeddings, layout and
+# structured copies of the report content
+UNUSED_COLUMNS = {
+    "nodes": {"x", "y", "graph_embedding", "description_embedding"},
+    "entities": {"description_embedding", "name_embedding", "graph_embedding"},
+    "communities": set(),
+    "community_reports": {"full_content_json", "findings", "rank_explanation", "full_content_embedding", "summary_embedding", "title_embedding"},
+    "text_units": {"text_embedding"},
+    "relationships": {"description_embedding"},
+    "covariates": set(),
+}
+
+# Low cardinality string columns stored as categoricals
+CATEGORICAL_COLUMNS = {
+    "entities": ["type"],
+    "covariates": ["type", "covariate_type", "status"],
+}
+
+# Large, never null text columns stored as Arrow-backed strings instead of Python objects
+ARROW_STRING_COLUMNS = {
+    "community_reports": ["full_content"],
+    "text_units": ["text"],
+}
+
+logger = logging.getLogger(__name__)
+
+_table_cache: dict[tuple, pd.DataFrame] = {}
+_table_cache_lock = threading.Lock()
+
+
+def _read_table(name: str, path: Path) -> pd.DataFrame:
+    """
+    Read the needed columns of an index table, memory-mapping the parquet file.
+    """
+    available_columns = pq.read_schema(path).names
+    columns = [column for column in available_columns if column not in UNUSED_COLUMNS.get(name, set())]
+    df = pd.read_parquet(path, columns=columns, memory_map=True)
+    for column in CATEGORICAL_COLUMNS.get(name, []):
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    for column in ARROW_STRING_COLUMNS.get(name, []):
+        if column in df.columns:
+            df[column] = df[column].astype("string[pyarrow]")
+    return df
+
+
+def _get_table(folder_id: str, name: str, path: Path) -> pd.DataFrame:
+    """
+    Return a table shared by every agent of the process, reloaded when the file changes.
+    """
+    stat = path.stat()
+    cache_key = (folder_id, str(path), stat.st_mtime_ns, stat.st_size)
+    with _table_cache_lock:
+        df = _table_cache.get(cache_key)
+        if df is not None:
+            return df
+        df = _read_table(name, path)
+        # Drop the previous versions of this table
+        for stale_key in [key for key in _table_cache if key[:2] == cache_key[:2]]:
+            del _table_cache[stale_key]
+        _table_cache[cache_key] = df
+        return df
+
+
+class GraphragIndex:
+    """
+    The tables of a graphrag index loaded for search. Tables not needed by the search type are None.
+    The version, manifest, graphrag config, in-memory entity vector store, context index and local
+    search context builder of the index generation are set by the caller.
+    """
+
+    def __init__(
+        self,
+        folder_id: str,
+        output_folder: Path,
+        tables: dict[str, pd.DataFrame | None],
+        load_seconds: float,
+        rss_delta_bytes: int,
+    ):
+        self.folder_id = folder_id
+        self.output_folder = Path(output_folder)
+        self.nodes = tables.get("nodes")
+        self.entities = tables.get("entities")
+        self.communities = tables.get("communities")
+        self.community_reports = tables.get("community_reports")
+        self.text_units = tables.get("text_units")
+        self.relationships = tables.get("relationships")
+        self.covariates = tables.get("covariates")
+        self.load_seconds = load_seconds
+        self.rss_delta_bytes = rss_delta_bytes
+        self.version = None
+        self.manifest = None
+        self.graphrag_config = None
+        self.entity_vector_store = None
+        self.context_index = None
+        self.local_context_builder = None
+
+
+def load_index(folder_id: str, index_output_folder: Path, search_type: str) -> GraphragIndex:
+    """
+    Load the tables a search type needs from an index output folder. Tables are shared between
+    agent instances pointing at the same folder as long as the parquet files do not change.
+
+    :param folder_id: Id of the managed folder holding the index.
+    :param index_output_folder: Folder containing the graphrag output parquet files.
+    :param search_type: "local", "global" or "hybrid".
+    """
+    start_time = time.perf_counter()
+    rss_before = get_rss_bytes()
+    tables = {}
+    for name in SEARCH_TABLES.get(search_type, SEARCH_TABLES["local"]):
+        path = Path(index_output_folder) / INDEX_TABLE_FILES[name]
+        if name in OPTIONAL_TABLES and not os.path.exists(path):
+            tables[name] = None
+            continue
+        tables[name] = _get_table(folder_id, name, path)
+    load_seconds = time.perf_counter() - start_time
+    rss_delta_bytes = get_rss_bytes() - rss_before
+    logger.info(
+        f"Loaded {search_type} search index from {index_output_folder} in {load_seconds:.2f}s, "
+        f"resident memory +{rss_delta_bytes / 1024 / 1024:.1f} MB (total {get_rss_bytes() / 1024 / 1024:.1f} MB)"
+    )
+    return GraphragIndex(folder_id, index_output_folder, tables, load_seconds, rss_delta_bytes)
@@ -0,0 +1,140 @@
+import logging
+import threading
+from pathlib import Path
+from typing import Callable
+
+from graphrag.config.load_config import load_config
+
+from dku_graphrag.index.context_index import ContextIndex
+from dku_graphrag.query.index_loader import INDEX_TABLE_FILES, GraphragIndex, load_index
+from dku_graphrag.query.llm_routing import route_index_llms
+from dku_graphrag.query.vector_index import load_entity_vector_store
+from dku_graphrag.utils.index_manifest import is_index_complete, read_index_manifest
+
+UNVERSIONED = "unversioned"
+
+logger = logging.getLogger(__name__)
+
+
+class IndexNotReadyError(Exception):
+    """The index files do not match the published manifest, a build is probably rewriting them."""
+
+
+def load_index_generation(
+    folder_id: str,
+    folder_path: Path,
+    search_type: str,
+    require_complete: bool = True,
+    vector_index_dtype: str | None = None,
+    chat_llm_id: str | None = None,
+    embedding_llm_id: str | None = None,
+) -> GraphragIndex:
+    """
+    Load the graphrag config and the tables of the index generation currently published in a folder.
+
+    :param require_complete: Raise IndexNotReadyError instead of loading files that do not match the manifest.
+    :param vector_index_dtype: Storage type of the in-memory entity vector index used by local search,
+        None to query LanceDB instead.
+    :param chat_llm_id: Chat LLM of the queries, defaults to the one recorded in the manifest (see `route_index_llms`).
+    :param embedding_llm_id: Embedding LLM of the queries, defaults to the one recorded in the manifest.
+    """
+    manifest = read_index_manifest(str(folder_path))
+    if manifest is not None and not is_index_complete(str(folder_path), manifest):
+        if require_complete:
+            raise IndexNotReadyError(f"Index generation {manifest['generation']} in {folder_path} is being rewritten")
+        logger.warning(f"Index files in {folder_path} do not match the manifest, loading them anyway")
+
+    graphrag_config = load_config(folder_path)
+    route_index_llms(graphrag_config, manifest, chat_llm_id=chat_llm_id, embedding_llm_id=embedding_llm_id)
+    # Each generation has its own directory, recorded in the manifest: the settings only locate the
+    # tables and vector store of indexes published before generation directories
+    if manifest is not None and manifest.get("vector_store_dir"):
+        graphrag_config.embeddings.vector_store["db_uri"] = str(folder_path / manifest["vector_store_dir"])
+    elif "db_uri" in graphrag_config.embeddings.vector_store:
+        # Update the 'db_uri' value
+        graphrag_config.embeddings.vector_store["db_uri"] = str(folder_path / graphrag_config.embeddings.vector_store["db_uri"])
+    else:
+        logger.error("Error: 'db_uri' key not found in vector_store")
+    index_output_folder = folder_path / Path(manifest["output_dir"] if manifest is not None else graphrag_config.storage.base_dir)
+
+    index = load_index(folder_id, index_output_folder, search_type)
+    # The files may have been rewritten while they were being read
+    if require_complete and manifest is not None and not is_index_complete(str(folder_path), manifest):
+        raise IndexNotReadyError(f"Index generation {manifest['generation']} in {folder_path} changed while loading")
+    index.version = manifest["generation"] if manifest is not None else UNVERSIONED
+    index.manifest = manifest
+    index.graphrag_config = graphrag_config
+    if search_type != "global":
+        context_index = ContextIndex.load(str(index_output_folder))
+        if context_index is not None and not context_index.matches(index.entities, index.relationships):
+            logger.warning(f"The context index of {index_output_folder} does not match the index tables, ignoring it")
+            context_index = None
+        index.context_index = context_index
+    if vector_index_dtype and search_type != "global":
+        entities_path = index_output_folder / INDEX_TABLE_FILES["entities"]
+        index.entity_vector_store = load_entity_vector_store(
+            graphrag_config,
+            str(index_output_folder),
+            signature=f"{index.version}:{entities_path.stat().st_mtime_ns}",
+            dtype=vector_index_dtype
+        )
+    return index
+
+
+class IndexReloader:
+    """
+    Background thread polling the index manifest of a folder. When a new generation is published,
+    it is fully loaded in the background and then handed to `on_reload`, so requests never wait for
+    a reload and never see a partially written index.
+
+    :param load_generation: Function loading the currently published generation.
+    :param on_reload: Called with the newly loaded index, typically to swap a reference.
+    """
+
+    def __init__(
+        self,
+        folder_path: Path,
+        load_generation: Callable[[], GraphragIndex],
+        on_reload: Callable[[GraphragIndex], None],
+        current_version: str,
+        poll_interval_seconds: float = 30.0,
+    ):
+        self.folder_path = folder_path
+        self.load_generation = load_generation
+        self.on_reload = on_reload
+        self.current_version = current_version
+        self.poll_interval_seconds = poll_interval_seconds
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"graphrag-index-reloader-{folder_path.name}", daemon=True)
+
+    def start(self) -> "IndexReloader":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def check(self) -> bool:
+        """
+        Load and swap in the published generation if it is new. Returns True if the index was reloaded.
+        """
+        manifest = read_index_manifest(str(self.folder_path))
+        if manifest is None or manifest["generation"] == self.current_version:
+            return False
+        logger.info(f"New index generation {manifest['generation']} detected in {self.folder_path}, loading it")
+        try:
+            index = self.load_generation()
+        except IndexNotReadyError as e:
+            logger.info(f"{e}, will retry")
+            return False
+        self.current_version = index.version
+        self.on_reload(index)
+        logger.info(f"Index generation {index.version} is now served")
+        return True
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.poll_interval_seconds):
+            try:
+                self.check()
+            except Exception:
+                logger.exception(f"Failed to reload the index of {self.folder_path}, keeping the current one")
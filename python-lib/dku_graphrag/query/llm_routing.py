@@ -0,0 +1,36 @@
+import logging
+
+from graphrag.config.models.graph_rag_config import GraphRagConfig
+
+# Models used for indexes whose manifest does not record the LLMs that built them
+DEFAULT_CHAT_LLM_ID = "openai:bs-openai:gpt-4o-mini"
+DEFAULT_EMBEDDING_LLM_ID = "openai:bs-openai:text-embedding-3-small"
+
+logger = logging.getLogger(__name__)
+
+
+def route_index_llms(
+    graphrag_config: GraphRagConfig,
+    manifest: dict | None,
+    chat_llm_id: str | None = None,
+    embedding_llm_id: str | None = None,
+) -> None:
+    """
+    Set the LLM Mesh ids the query LLMs of an index are created with, in the model fields of its
+    graphrag config read by the patched `get_llm` and `get_text_embedder`.
+
+    :param manifest: Index manifest, recording the LLMs the index-builder used.
+    :param chat_llm_id: Chat LLM answering the queries, defaults to the one that built the index.
+    :param embedding_llm_id: Embedding LLM of the queries, defaults to the one that built the index.
+        Query and index embeddings are only comparable if they come from the same model.
+    """
+    manifest = manifest or {}
+    indexed_embedding_llm_id = manifest.get("embedding_llm_id")
+    if embedding_llm_id and indexed_embedding_llm_id and embedding_llm_id != indexed_embedding_llm_id:
+        logger.warning(
+            f"Queries are embedded with {embedding_llm_id} but the index was built with {indexed_embedding_llm_id}, "
+            "vector lookups will not match"
+        )
+    graphrag_config.llm.model = chat_llm_id or manifest.get("chat_completion_llm_id") or DEFAULT_CHAT_LLM_ID
+    graphrag_config.embeddings.llm.model = embedding_llm_id or indexed_embedding_llm_id or DEFAULT_EMBEDDING_LLM_ID
+    logger.info(f"Query LLMs: chat={graphrag_config.llm.model}, embeddings={graphrag_config.embeddings.llm.model}")
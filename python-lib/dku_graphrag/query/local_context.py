@@ -0,0 +1,171 @@
+import copy
+import logging
+from typing import Any
+
+import pandas as pd
+from graphrag.model.entity import Entity
+from graphrag.model.relationship import Relationship
+from graphrag.query.context_builder.community_context import build_community_context
+from graphrag.query.context_builder.source_context import build_text_unit_context, count_relationships
+from graphrag.query.structured_search.local_search.mixed_context import LocalSearchMixedContext
+
+from dku_graphrag.index.context_index import ContextIndex
+
+logger = logging.getLogger(__name__)
+
+
+def _truncate_to_budget(items: list, token_counts: list[int], max_tokens: int) -> list:
+    """
+    Keep the leading items whose cumulative token count fits the budget, plus the first one that
+    does not: graphrag stops adding rows at that one, so the remaining items can never be used.
+    """
+    kept_count = 0
+    total_tokens = 0
+    for tokens in token_counts:
+        kept_count += 1
+        total_tokens += tokens
+        if total_tokens > max_tokens:
+            break
+    return items[:kept_count]
+
+
+class IndexedLocalSearchContext(LocalSearchMixedContext):
+    """
+    Local search context builder backed by the precomputed context index of the index-builder.
+
+    graphrag scans every relationship and covariate of the index for each selected entity; here
+    the neighbors of the selected entities are found by array indexing and only they are handed to
+    graphrag's context builders, so building the context is O(neighbors) instead of O(index). Text
+    units and community reports that cannot fit the token budget are dropped using their
+    precomputed token counts before being copied and tokenized.
+
+    The candidate context (return_candidate_context) still uses graphrag's full scan.
+    """
+
+    def __init__(self, *args: Any, context_index: ContextIndex, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.context_index = context_index
+        self._covariates_by_id = {
+            name: {covariate.id: covariate for covariate in covariates}
+            for name, covariates in self.covariates.items()
+        }
+
+    def _neighbor_relationships(self, entity_ids: list[str]) -> list[Relationship]:
+        relationship_ids = self.context_index.relationship_ids[self.context_index.relationship_positions(entity_ids)]
+        return [self.relationships[rel_id] for rel_id in relationship_ids.tolist() if rel_id in self.relationships]
+
+    def _neighbor_covariates(self, entity_ids: list[str]) -> dict[str, list]:
+        if self.context_index.covariate_ids is None:
+            return self.covariates
+        covariate_ids = self.context_index.covariate_ids[self.context_index.covariate_positions(entity_ids)].tolist()
+        return {
+            name: [covariates_by_id[cov_id] for cov_id in covariate_ids if cov_id in covariates_by_id]
+            for name, covariates_by_id in self._covariates_by_id.items()
+        }
+
+    def _build_local_context(self, selected_entities: list[Entity], *args: Any, **kwargs: Any) -> tuple[str, dict[str, pd.DataFrame]]:
+        if kwargs.get("return_candidate_context"):
+            return super()._build_local_context(selected_entities, *args, **kwargs)
+        entity_ids = [entity.id for entity in selected_entities]
+        # Every relationship or covariate graphrag could select involves a selected entity
+        scoped = copy.copy(self)
+        scoped.relationships = {rel.id: rel for rel in self._neighbor_relationships(entity_ids)}
+        scoped.covariates = self._neighbor_covariates(entity_ids)
+        return LocalSearchMixedContext._build_local_context(scoped, selected_entities, *args, **kwargs)
+
+    def _build_text_unit_context(
+        self,
+        selected_entities: list[Entity],
+        max_tokens: int = 8000,
+        return_candidate_context: bool = False,
+        column_delimiter: str = "|",
+        context_name: str = "Sources",
+    ) -> tuple[str, dict[str, pd.DataFrame]]:
+        if return_candidate_context:
+            return super()._build_text_unit_context(selected_entities, max_tokens, return_candidate_context, column_delimiter, context_name)
+        if not selected_entities or not self.text_units:
+            return ("", {context_name.lower(): pd.DataFrame()})
+
+        seen_text_unit_ids = set()
+        unit_info_list = []
+        for entity_order, entity in enumerate(selected_entities):
+            entity_relationships = self._neighbor_relationships([entity.id])
+            positions = self.context_index.text_unit_positions(entity.id)
+            for position, text_id in zip(positions.tolist(), self.context_index.text_unit_ids[positions].tolist()):
+                if text_id not in seen_text_unit_ids and text_id in self.text_units:
+                    num_relationships = count_relationships(entity_relationships, self.text_units[text_id])
+                    seen_text_unit_ids.add(text_id)
+                    unit_info_list.append((text_id, position, entity_order, num_relationships))
+
+        # Sort by entity order and number of relationships desc, as graphrag does
+        unit_info_list.sort(key=lambda x: (x[2], -x[3]))
+        token_counts = self.context_index.text_unit_tokens[[unit[1] for unit in unit_info_list]].tolist() if unit_info_list else []
+        unit_info_list = _truncate_to_budget(unit_info_list, token_counts, max_tokens)
+        selected_text_units = [copy.deepcopy(self.text_units[unit[0]]) for unit in unit_info_list]
+
+        return build_text_unit_context(
+            text_units=selected_text_units,
+            token_encoder=self.token_encoder,
+            max_tokens=max_tokens,
+            shuffle_data=False,
+            context_name=context_name,
+            column_delimiter=column_delimiter,
+        )
+
+    def _build_community_context(
+        self,
+        selected_entities: list[Entity],
+        max_tokens: int = 4000,
+        use_community_summary: bool = False,
+        column_delimiter: str = "|",
+        include_community_rank: bool = False,
+        min_community_rank: int = 0,
+        return_candidate_context: bool = False,
+        context_name: str = "Reports",
+    ) -> tuple[str, dict[str, pd.DataFrame]]:
+        # Precomputed counts are those of the full content
+        if return_candidate_context or use_community_summary:
+            return super()._build_community_context(
+                selected_entities, max_tokens, use_community_summary, column_delimiter,
+                include_community_rank, min_community_rank, return_candidate_context, context_name
+            )
+        if len(selected_entities) == 0 or len(self.community_reports) == 0:
+            return ("", {context_name.lower(): pd.DataFrame()})
+
+        # Communities of every level are looked up, the reports only hold those of the requested levels
+        community_matches = {}
+        for entity in selected_entities:
+            for community_id in self.context_index.community_ids(entity.id):
+                community_matches[community_id] = community_matches.get(community_id, 0) + 1
+        selected_communities = [
+            self.community_reports[community_id]
+            for community_id in community_matches
+            if community_id in self.community_reports
+        ]
+        selected_communities.sort(
+            key=lambda community: (community_matches[community.community_id], community.rank),
+            reverse=True,
+        )
+        token_counts = [
+            self.context_index.report_tokens_by_community.get(str(community.community_id), 0)
+            for community in selected_communities
+        ]
+        if min_community_rank <= 0:
+            selected_communities = _truncate_to_budget(selected_communities, token_counts, max_tokens)
+
+        context_text, context_data = build_community_context(
+            community_reports=selected_communities,
+            token_encoder=self.token_encoder,
+            use_community_summary=use_community_summary,
+            column_delimiter=column_delimiter,
+            shuffle_data=False,
+            include_community_rank=include_community_rank,
+            min_community_rank=min_community_rank,
+            max_tokens=max_tokens,
+            single_batch=True,
+            context_name=context_name,
+        )
+        if isinstance(context_text, list) and len(context_text) > 0:
+            context_text = "\n\n".join(context_text)
+        return (str(context_text), context_data)
+
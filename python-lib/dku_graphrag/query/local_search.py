@@ -0,0 +1,175 @@
+import logging
+import sys
+from typing import Any, AsyncGenerator
+
+import pandas as pd
+import tiktoken
+from graphrag.api.query import _get_embedding_store, _load_search_prompt, _reformat_context_data
+from graphrag.config.models.graph_rag_config import GraphRagConfig
+from graphrag.index.config.embeddings import entity_description_embedding
+from graphrag.query.context_builder.community_context import build_community_context
+from graphrag.query.context_builder.entity_extraction import EntityVectorStoreKey
+from graphrag.query.context_builder.local_context import build_entity_context
+from graphrag.query.context_builder.source_context import build_text_unit_context
+from graphrag.query.indexer_adapters import (
+    read_indexer_covariates,
+    read_indexer_entities,
+    read_indexer_relationships,
+    read_indexer_reports,
+    read_indexer_text_units,
+)
+from graphrag.query.llm import get_client
+from graphrag.query.structured_search.local_search.mixed_context import LocalSearchMixedContext
+from graphrag.query.structured_search.local_search.search import LocalSearch
+from graphrag.vector_stores.base import BaseVectorStore
+
+from dku_graphrag.index.context_index import ContextIndex
+from dku_graphrag.query.local_context import IndexedLocalSearchContext
+from dku_graphrag.utils.deadline import deadline_context_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def build_local_context_builder(
+    config: GraphRagConfig,
+    nodes: pd.DataFrame,
+    entities: pd.DataFrame,
+    community_reports: pd.DataFrame,
+    text_units: pd.DataFrame,
+    relationships: pd.DataFrame,
+    covariates: pd.DataFrame | None,
+    community_level: int,
+    description_embedding_store: BaseVectorStore | None = None,
+    context_index: ContextIndex | None = None,
+) -> LocalSearchMixedContext:
+    """
+    Convert the index tables into the local search context builder. The conversion reads every table,
+    so the builder is meant to be built once per index generation and shared by the queries.
+
+    :param description_embedding_store: Vector store of the entity description embeddings,
+        None opens the LanceDB store of the config.
+    :param context_index: Precomputed context index, None to use graphrag's table scans.
+    """
+    if description_embedding_store is None:
+        description_embedding_store = _get_embedding_store(
+            config_args=config.embeddings.vector_store,
+            embedding_name=entity_description_embedding,
+        )
+    covariates_ = read_indexer_covariates(covariates) if covariates is not None else []
+    builder_kwargs = {
+        "community_reports": read_indexer_reports(community_reports, nodes, community_level),
+        "text_units": read_indexer_text_units(text_units),
+        "entities": read_indexer_entities(nodes, entities, community_level),
+        "relationships": read_indexer_relationships(relationships),
+        "covariates": {"claims": covariates_},
+        "entity_text_embeddings": description_embedding_store,
+        "embedding_vectorstore_key": EntityVectorStoreKey.ID,
+        "text_embedder": get_client.get_text_embedder(config),
+        "token_encoder": tiktoken.get_encoding(config.encoding_model),
+    }
+    if context_index is not None:
+        return IndexedLocalSearchContext(context_index=context_index, **builder_kwargs)
+    return LocalSearchMixedContext(**builder_kwargs)
+
+
+def get_local_search_engine(
+    config: GraphRagConfig,
+    response_type: str,
+    context_builder: LocalSearchMixedContext,
+) -> LocalSearch:
+    """
+    Create a local search engine, configured like graphrag's api.query.local_search.
+    """
+    ls_config = config.local_search
+    return LocalSearch(
+        llm=get_client.get_llm(config),
+        system_prompt=_load_search_prompt(config.root_dir, ls_config.prompt),
+        context_builder=context_builder,
+        token_encoder=context_builder.token_encoder,
+        llm_params={
+            "max_tokens": ls_config.llm_max_tokens,
+            "temperature": ls_config.temperature,
+            "top_p": ls_config.top_p,
+            "n": ls_config.n,
+        },
+        context_builder_params=_context_builder_params(ls_config),
+        response_type=response_type,
+    )
+
+
+def _context_builder_params(ls_config) -> dict:
+    return {
+        "text_unit_prop": ls_config.text_unit_prop,
+        "community_prop": ls_config.community_prop,
+        "conversation_history_max_turns": ls_config.conversation_history_max_turns,
+        "conversation_history_user_turns_only": True,
+        "top_k_mapped_entities": ls_config.top_k_entities,
+        "top_k_relationships": ls_config.top_k_relationships,
+        "include_entity_rank": True,
+        "include_relationship_weight": True,
+        "include_community_rank": False,
+        "return_candidate_context": False,
+        "embedding_vectorstore_key": EntityVectorStoreKey.ID,
+        # Fewer text units and reports make the answer faster when the request is running late
+        "max_tokens": deadline_context_tokens(ls_config.max_tokens),
+    }
+
+
+def count_local_context_rows(config: GraphRagConfig, context_builder: LocalSearchMixedContext) -> None:
+    """
+    Count the tokens of the rows of every entity, text unit and community report local search can put
+    in its context, formatted by graphrag's context builders as the queries format them, so that their
+    counts can be precomputed (see `dku_graphrag.query.token_counts.load_token_counts`).
+
+    Relationship and covariate rows are left to the queries: graphrag adds a per-query link count to
+    relationships, and selects covariates with a scan of every covariate per entity.
+    """
+    params = _context_builder_params(config.local_search)
+    token_encoder = context_builder.token_encoder
+    build_entity_context(
+        selected_entities=list(context_builder.entities.values()),
+        token_encoder=token_encoder,
+        max_tokens=sys.maxsize,
+        include_entity_rank=params["include_entity_rank"],
+        # Default of LocalSearchMixedContext.build_context
+        rank_description="number of relationships",
+    )
+    build_text_unit_context(
+        text_units=list(context_builder.text_units.values()),
+        token_encoder=token_encoder,
+        max_tokens=sys.maxsize,
+        shuffle_data=False,
+    )
+    build_community_context(
+        community_reports=list(context_builder.community_reports.values()),
+        token_encoder=token_encoder,
+        use_community_summary=False,
+        shuffle_data=False,
+        include_community_rank=params["include_community_rank"],
+        max_tokens=sys.maxsize,
+        single_batch=False,
+    )
+
+
+async def local_search(config: GraphRagConfig, query: str, **kwargs: Any):
+    """
+    Equivalent of graphrag's api.query.local_search running on a prebuilt context builder.
+    """
+    search_engine = get_local_search_engine(config, **kwargs)
+    result = await search_engine.asearch(query=query)
+    return result.response, _reformat_context_data(result.context_data)
+
+
+async def local_search_streaming(config: GraphRagConfig, query: str, **kwargs: Any) -> AsyncGenerator:
+    """
+    Equivalent of graphrag's api.query.local_search_streaming: yields the context data first,
+    then the response tokens.
+    """
+    search_engine = get_local_search_engine(config, **kwargs)
+    first_chunk = True
+    async for chunk in search_engine.astream_search(query=query):
+        if first_chunk:
+            yield _reformat_context_data(chunk)
+            first_chunk = False
+        else:
+            yield chunk
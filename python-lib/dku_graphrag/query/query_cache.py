@@ -0,0 +1,156 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_TTL_SECONDS = 3600
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query so trivially different spellings of the same question share a cache entry:
+    case, surrounding and repeated whitespace, trailing punctuation.
+    """
+    return re.sub(r"\s+", " ", query).strip().rstrip("?!. ").lower()
+
+
+class QueryCacheEntry:
+    def __init__(self, scope: tuple, query: str, response, context, compute_seconds: float, embedding: np.ndarray | None):
+        self.scope = scope
+        self.query = query
+        self.response = response
+        self.context = context
+        self.compute_seconds = compute_seconds
+        self.embedding = embedding
+        self.created_at = time.monotonic()
+
+
+class QueryResultCache:
+    """
+    In-memory cache of search results with TTL and LRU eviction.
+
+    Entries are grouped by scope, typically (index version, search type, community level, response type),
+    so a new index generation or different search settings never reuse an answer. Within a scope,
+    a query hits the exact tier on its normalized text, and optionally the semantic tier when its
+    embedding has a cosine similarity of at least `similarity_threshold` with a cached query.
+    Expired entries and entries of previous index versions stay until evicted, as a fallback for
+    searches that cannot complete in time (see `get_fallback`).
+
+    :param similarity_threshold: Minimum cosine similarity of a semantic hit, None disables the semantic tier.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS, similarity_threshold: float | None = None):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries: OrderedDict[tuple, QueryCacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.fallback_hits = 0
+        self.seconds_saved = 0.0
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return bool(self.similarity_threshold)
+
+    def _is_expired(self, entry: QueryCacheEntry) -> bool:
+        return bool(self.ttl_seconds) and time.monotonic() - entry.created_at > self.ttl_seconds
+
+    def _record_hit(self, key: tuple, entry: QueryCacheEntry) -> None:
+        self._entries.move_to_end(key)
+        self.seconds_saved += entry.compute_seconds
+
+    def get(self, scope: tuple, query: str) -> QueryCacheEntry | None:
+        """
+        Exact tier lookup on the normalized query.
+        """
+        key = (scope, normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._is_expired(entry):
+                return None
+            self.hits += 1
+            self._record_hit(key, entry)
+            return entry
+
+    def get_similar(self, scope: tuple, embedding: list[float]) -> tuple[QueryCacheEntry | None, float]:
+        """
+        Semantic tier lookup. Returns the most similar cached entry of the scope and its similarity,
+        or (None, best similarity) when no cached query is similar enough.
+        """
+        query_vector = self._normalize_vector(embedding)
+        with self._lock:
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if key[0] == scope and entry.embedding is not None and not self._is_expired(entry)
+            ]
+            if not candidates or query_vector is None:
+                return None, 0.0
+            similarities = np.stack([entry.embedding for _, entry in candidates]) @ query_vector
+            best = int(np.argmax(similarities))
+            best_similarity = float(similarities[best])
+            if best_similarity < self.similarity_threshold:
+                return None, best_similarity
+            key, entry = candidates[best]
+            self.semantic_hits += 1
+            self._record_hit(key, entry)
+            return entry, best_similarity
+
+    def get_fallback(self, scope: tuple, query: str) -> QueryCacheEntry | None:
+        """
+        The most recent answer to the normalized query computed with the same search settings,
+        even expired or computed on a previous index version: the first element of a scope is the
+        index version, the others the search settings.
+        """
+        normalized_query = normalize_query(query)
+        with self._lock:
+            candidates = [
+                entry for (entry_scope, entry_query), entry in self._entries.items()
+                if entry_query == normalized_query and entry_scope[1:] == scope[1:]
+            ]
+            if not candidates:
+                return None
+            self.fallback_hits += 1
+            return max(candidates, key=lambda entry: entry.created_at)
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def set(self, scope: tuple, query: str, response, context, compute_seconds: float, embedding: list[float] | None = None) -> None:
+        key = (scope, normalize_query(query))
+        entry = QueryCacheEntry(scope, query, response, context, compute_seconds, self._normalize_vector(embedding))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _normalize_vector(embedding: list[float] | None) -> np.ndarray | None:
+        if embedding is None or len(embedding) == 0:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "fallback_hits": self.fallback_hits,
+                "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+                "seconds_saved": self.seconds_saved,
+            }
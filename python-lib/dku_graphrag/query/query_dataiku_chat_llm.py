@@ -1,20 +1,19 @@
-import asyncio
 import logging
-from typing import Any, Generator, AsyncGenerator, Literal
+from typing import Any, Generator, AsyncGenerator
 
-import dataiku
+from dataikuapi.dss.llm import DSSLLMStreamedCompletionChunk, DSSLLMStreamedCompletionFooter
 from graphrag.callbacks.llm_callbacks import BaseLLMCallback
 from graphrag.query.llm.base import BaseLLM
 
-from concurrent.futures import ThreadPoolExecutor
+from dku_graphrag.utils.concurrency import get_llm_mesh_limiter
+from dku_graphrag.utils.dataiku_client import get_dataiku_llm
+from dku_graphrag.utils.deadline import ANSWER_TRUNCATED, DeadlineExceededError, check_deadline, get_deadline, with_deadline
 
 
 class QueryDataikuChatLLM(BaseLLM):
     def __init__(self, llm_id: str):
         self.llm_id = llm_id
-        self.client = dataiku.api_client()
-        self.project = self.client.get_default_project()
-        self.llm = self.project.get_llm(self.llm_id)
+        self.llm = get_dataiku_llm(self.llm_id)
         self.logger = logging.getLogger(__name__)
 
     def _prepare_completion(self, messages: str | list[Any], **kwargs: Any):
@@ -36,6 +35,26 @@ class QueryDataikuChatLLM(BaseLLM):
 
         return completion
 
+    def _iter_tokens(self, completion) -> Generator[str, None, None]:
+        """
+        Blocking iterator over the text chunks of an LLM Mesh streamed completion.
+        An error reported in the footer of the stream is logged.
+        """
+        for chunk in completion.execute_streamed():
+            if isinstance(chunk, DSSLLMStreamedCompletionChunk):
+                text = chunk.data.get("text")
+                if text:
+                    yield text
+            elif isinstance(chunk, DSSLLMStreamedCompletionFooter):
+                error_message = chunk.data.get("errorMessage")
+                if error_message:
+                    self.logger.error(f"Streamed completion of {self.llm_id} ended with an error (finish reason {chunk.data.get('finishReason')}): {error_message}")
+
+    @staticmethod
+    def _notify_new_token(callbacks: list[BaseLLMCallback] | None, token: str) -> None:
+        for callback in callbacks or []:
+            callback.on_llm_new_token(token)
+
     def generate(
         self,
         messages: str | list[Any],
@@ -43,13 +62,14 @@ class QueryDataikuChatLLM(BaseLLM):
         callbacks: list[BaseLLMCallback] | None = None,
         **kwargs: Any,
     ) -> str:
-        """Synchronous generation."""
+        """Synchronous generation, streamed when callbacks want the tokens."""
+        if streaming and callbacks:
+            return "".join(self.stream_generate(messages, callbacks=callbacks, **kwargs))
         self.logger.debug(f"messages: {messages}, kwargs: {kwargs}")
+        check_deadline()
         completion = self._prepare_completion(messages, **kwargs)
-        resp = completion.execute()
-        clean_response = resp.text
-        # If streaming is True but we have no streaming support, just return the full response
-        return clean_response
+        resp = get_llm_mesh_limiter().run_blocking(completion.execute)
+        return resp.text
 
     def stream_generate(
         self,
@@ -57,10 +77,13 @@ class QueryDataikuChatLLM(BaseLLM):
         callbacks: list[BaseLLMCallback] | None = None,
         **kwargs: Any,
     ) -> Generator[str, None, None]:
-        """Synchronous streaming generation (if not supported, yield the entire response)."""
-        # For now, just yield the entire response as one chunk
-        full_response = self.generate(messages, streaming=True, callbacks=callbacks, **kwargs)
-        yield full_response
+        """Synchronous streaming generation, tokens are yielded as the LLM Mesh sends them."""
+        self.logger.debug(f"messages: {messages}, kwargs: {kwargs}")
+        check_deadline()
+        completion = self._prepare_completion(messages, **kwargs)
+        for token in get_llm_mesh_limiter().stream_blocking(self._iter_tokens, completion):
+            self._notify_new_token(callbacks, token)
+            yield token
 
     async def agenerate(
         self,
@@ -69,16 +92,14 @@ class QueryDataikuChatLLM(BaseLLM):
         callbacks: list[BaseLLMCallback] | None = None,
         **kwargs: Any,
     ) -> str:
-        """Asynchronous generation."""
-        loop = asyncio.get_running_loop()
-
-        # Create a wrapper lambda that calls self.generate with all arguments
-        # Here we use keyword arguments explicitly so run_in_executor only gets a function with no extra arguments
-        def sync_generate():
-            return self.generate(messages=messages, streaming=streaming, callbacks=callbacks, **kwargs)
-        with ThreadPoolExecutor() as executor:
-            result = await loop.run_in_executor(executor, sync_generate)
-        return result
+        """Asynchronous generation, streamed when callbacks want the tokens."""
+        if streaming and callbacks:
+            return "".join([token async for token in self.astream_generate(messages, callbacks=callbacks, **kwargs)])
+        self.logger.debug(f"messages: {messages}, kwargs: {kwargs}")
+        completion = self._prepare_completion(messages, **kwargs)
+        # The shared limiter bounds in-flight requests across every adapter of the process
+        resp = await with_deadline(get_llm_mesh_limiter().run(completion.execute))
+        return resp.text
 
     async def astream_generate(
         self,
@@ -86,7 +107,33 @@ class QueryDataikuChatLLM(BaseLLM):
         callbacks: list[BaseLLMCallback] | None = None,
         **kwargs: Any,
     ) -> AsyncGenerator[str, None]:
-        """Asynchronous streaming generation."""
-        # If streaming is not truly supported, just yield the full response once
-        response = await self.agenerate(messages, streaming=True, callbacks=callbacks, **kwargs)
-        yield response
\ No newline at end of file
+        """
+        Asynchronous streaming generation, tokens are yielded as the LLM Mesh sends them.
+        The answer is cut short when the request deadline passes.
+        """
+        self.logger.debug(f"messages: {messages}, kwargs: {kwargs}")
+        check_deadline()
+        deadline = get_deadline()
+        completion = self._prepare_completion(messages, **kwargs)
+        stream = get_llm_mesh_limiter().stream(self._iter_tokens, completion)
+        streamed = False
+        try:
+            while True:
+                try:
+                    token = await with_deadline(stream.__anext__())
+                except StopAsyncIteration:
+                    return
+                except DeadlineExceededError:
+                    if not streamed:
+                        raise
+                    # Keep the start of the answer rather than failing the request
+                    deadline.degrade(ANSWER_TRUNCATED)
+                    return
+                streamed = True
+                self._notify_new_token(callbacks, token)
+                yield token
+                if deadline is not None and deadline.expired():
+                    deadline.degrade(ANSWER_TRUNCATED)
+                    return
+        finally:
+            await stream.aclose()
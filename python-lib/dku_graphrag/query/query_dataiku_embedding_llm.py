@@ -1,41 +1,110 @@
 import asyncio
 import logging
+import threading
+from collections import OrderedDict
 from typing import Any
 import time 
-import dataiku
 from graphrag.query.llm.base import BaseTextEmbedding
-from concurrent.futures import ThreadPoolExecutor
+
+from dku_graphrag.utils.concurrency import get_llm_mesh_limiter
+from dku_graphrag.utils.dataiku_client import get_dataiku_llm
+from dku_graphrag.utils.deadline import check_deadline, with_deadline
+from dku_graphrag.utils.embedding_cache import EmbeddingCache, get_default_embedding_cache
+from dku_graphrag.utils.embedding_coalescer import get_embedding_coalescer
+
+# Query embeddings remembered in memory when no persistent embedding cache is configured, so that the
+# synchronous embedding of local search reuses the one computed asynchronously by the agent beforehand
+MAX_MEMO_QUERY_EMBEDDINGS = 1024
+
+_query_embeddings: OrderedDict[tuple[str, str], list[float]] = OrderedDict()
+_query_embeddings_lock = threading.Lock()
 
 
 class QueryDataikuEmbeddingLLM(BaseTextEmbedding):
-    def __init__(self, embedding_model_id: str):
+    def __init__(self, embedding_model_id: str, embedding_cache: EmbeddingCache | None = None):
         self.embedding_model_id = embedding_model_id
-        self.client = dataiku.api_client()
-        self.project = self.client.get_default_project()
-        self.emb_model = self.project.get_llm(self.embedding_model_id)
+        self.emb_model = get_dataiku_llm(self.embedding_model_id)
+        self.coalescer = get_embedding_coalescer(self.embedding_model_id, self._embed_batch)
+        # Recurring queries are served from the persistent cache configured by the agent
+        self.embedding_cache = embedding_cache or get_default_embedding_cache(self.embedding_model_id)
         self.logger = logging.getLogger(__name__)
 
+    def _embed_batch(self, texts: list[str], token_counts: list[int] | None = None) -> list[list[float]]:
+        emb_query = self.emb_model.new_embeddings()
+        for text in texts:
+            emb_query.add_text(text)
+        return emb_query.execute().get_embeddings()
+
     def embed(self, text: str, **kwargs: Any) -> list[float]:
         # Assuming the Dataiku LLM embedding endpoint:
         # If not available, you'll need to handle differently.
         # The hypothetical `self.llm.compute_embedding(text)` method returns an embedding vector (list of floats).
         
-        self.emb_model.new_embeddings()
-
-        emb_query = self.emb_model.new_embeddings()
-
-        emb_query.add_text(text)
+        cached = self._get_cached(text)
+        if cached is not None:
+            return cached
 
+        check_deadline()
         start_time = time.perf_counter()  # Start timing
-        emb_resp = emb_query.execute()
+        if self._in_event_loop():
+            # Waiting on a batch led by a coroutine of this very loop would deadlock it
+            embeddings = get_llm_mesh_limiter().run_blocking(self._embed_batch, [text])
+        else:
+            # Concurrent queries share LLM Mesh requests through the coalescer
+            embeddings = self.coalescer.embed_blocking([text])
         end_time = time.perf_counter()  # End timing
         execution_time = end_time - start_time
         self.logger.info(f"Execution time: {execution_time:.4f} seconds")
-        embeddings = emb_resp.get_embeddings()
-        return embeddings[0] if embeddings else [] 
+        return self._put_cached(text, embeddings)
 
     async def aembed(self, text: str, **kwargs: Any) -> list[float]:
-        loop = asyncio.get_running_loop()
-        with ThreadPoolExecutor() as executor:
-            emb_resp = await loop.run_in_executor(executor, self.embed, text, **kwargs)
-        return emb_resp
\ No newline at end of file
+        cached = self._get_cached(text)
+        if cached is not None:
+            return cached
+        embeddings = await with_deadline(self.coalescer.embed([text]))
+        return self._put_cached(text, embeddings)
+
+    async def aembed_many(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed several texts, only sending those missing from the cache to the LLM Mesh.
+        """
+        vectors = self.embedding_cache.get_many(texts) if self.embedding_cache is not None else [None] * len(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            embeddings = await with_deadline(self.coalescer.embed(missing_texts))
+            if self.embedding_cache is not None:
+                self.embedding_cache.put_many(missing_texts, embeddings)
+            for i, embedding in zip(missing, embeddings):
+                vectors[i] = embedding
+        return [vector.tolist() if hasattr(vector, "tolist") else vector for vector in vectors]
+
+    @staticmethod
+    def _in_event_loop() -> bool:
+        try:
+            asyncio.get_running_loop()
+            return True
+        except RuntimeError:
+            return False
+
+    def _get_cached(self, text: str) -> list[float] | None:
+        if self.embedding_cache is None:
+            with _query_embeddings_lock:
+                embedding = _query_embeddings.get((self.embedding_model_id, text))
+                if embedding is not None:
+                    _query_embeddings.move_to_end((self.embedding_model_id, text))
+                return embedding
+        vector = self.embedding_cache.get_many([text])[0]
+        return None if vector is None else vector.tolist()
+
+    def _put_cached(self, text: str, embeddings: list[list[float]]) -> list[float]:
+        if not embeddings:
+            return []
+        if self.embedding_cache is not None:
+            self.embedding_cache.put_many([text], embeddings)
+        else:
+            with _query_embeddings_lock:
+                _query_embeddings[(self.embedding_model_id, text)] = embeddings[0]
+                if len(_query_embeddings) > MAX_MEMO_QUERY_EMBEDDINGS:
+                    _query_embeddings.popitem(last=False)
+        return embeddings[0]
@@ -3,12 +3,13 @@ from dku_graphrag.query.query_dataiku_embedding_llm import QueryDataikuEmbedding
 
 import graphrag.query.llm.get_client
 
+# The LLM Mesh ids are set in the config of each index by dku_graphrag.query.llm_routing.route_index_llms
 def monkeypatched_get_llm(config):
-    llm_id = "openai:bs-openai:gpt-4o-mini"
+    llm_id = config.llm.model
     return QueryDataikuChatLLM(llm_id)
 
 def monkeypatched_get_text_embedder(config):
-    embedding_model_id = "openai:bs-openai:text-embedding-3-small"
+    embedding_model_id = config.embeddings.llm.model
     return QueryDataikuEmbeddingLLM(embedding_model_id)
 
 graphrag.query.llm.get_client.get_llm = monkeypatched_get_llm
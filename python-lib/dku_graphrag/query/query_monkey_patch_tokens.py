@@ -0,0 +1,26 @@
+from dku_graphrag.query.token_counts import num_tokens
+
+import graphrag.query.context_builder.community_context
+import graphrag.query.context_builder.conversation_history
+import graphrag.query.context_builder.local_context
+import graphrag.query.context_builder.rate_relevancy
+import graphrag.query.context_builder.source_context
+import graphrag.query.structured_search.global_search.search
+import graphrag.query.structured_search.local_search.mixed_context
+import graphrag.query.structured_search.local_search.search
+
+# Context builders and search engines count tokens from the precomputed counts of the loaded indexes
+# (see dku_graphrag.query.token_counts) instead of tokenizing every row of their contexts per query
+for module in (
+    graphrag.query.context_builder.community_context,
+    graphrag.query.context_builder.conversation_history,
+    graphrag.query.context_builder.local_context,
+    graphrag.query.context_builder.rate_relevancy,
+    graphrag.query.context_builder.source_context,
+    graphrag.query.structured_search.global_search.search,
+    graphrag.query.structured_search.local_search.mixed_context,
+    graphrag.query.structured_search.local_search.search,
+):
+    module.num_tokens = num_tokens
+
+print("  =============== Monkey patching query token counts DONE")
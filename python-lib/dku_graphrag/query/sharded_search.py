@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import math
+from typing import Any, AsyncGenerator
+
+import pandas as pd
+from graphrag.api.query import _reformat_context_data
+from graphrag.query.context_builder.builders import ContextBuilderResult
+from graphrag.query.structured_search.local_search.search import LocalSearch
+
+from dku_graphrag.query.global_search import RankedGlobalSearch
+from dku_graphrag.query.index_loader import GraphragIndex
+from dku_graphrag.query.token_counts import num_tokens
+
+# Order of the sections in graphrag's local search context
+SECTION_ORDER = ["reports", "entities", "relationships", "claims", "sources"]
+SECTION_TITLES = {"reports": "Reports", "entities": "Entities", "relationships": "Relationships", "sources": "Sources"}
+SHARD_COLUMN = "shard"
+# Shards whose entities are not similar at all to the query still contribute at this rate
+MIN_SHARD_WEIGHT = 0.05
+
+logger = logging.getLogger(__name__)
+
+
+class ShardedIndex:
+    """
+    The shards of an index, each a graphrag index built by its own index-builder run over a partition
+    of the corpus. Shards must be built with the same settings and embedding model: the search
+    configuration (LLM, prompts, token budgets) is the one of the first shard.
+    """
+
+    def __init__(self, shards: list[GraphragIndex]):
+        self.shards = shards
+        self.version = shards[0].version if len(shards) == 1 else "+".join(str(shard.version) for shard in shards)
+
+    @property
+    def graphrag_config(self):
+        return self.shards[0].graphrag_config
+
+    def replace(self, position: int, shard: GraphragIndex) -> "ShardedIndex":
+        """
+        A copy of this index with one shard replaced by a new generation.
+        """
+        shards = list(self.shards)
+        shards[position] = shard
+        return ShardedIndex(shards)
+
+
+def _shard_relevance(engine: LocalSearch, query_embedding: list[float], top_k: int) -> float:
+    """
+    Mean similarity of the query with the closest entities of a shard.
+    """
+    store = engine.context_builder.entity_text_embeddings
+    results = store.similarity_search_by_vector(query_embedding, k=top_k)
+    if not results:
+        return 0.0
+    return sum(result.score for result in results) / len(results)
+
+
+def _build_shard_context(engine: LocalSearch, query: str, query_embedding: list[float]) -> tuple[float, ContextBuilderResult]:
+    params = engine.context_builder_params
+    relevance = _shard_relevance(engine, query_embedding, params.get("top_k_mapped_entities", 10))
+    return relevance, engine.context_builder.build_context(query=query, **params)
+
+
+def _format_row(row: list, column_delimiter: str) -> str:
+    return column_delimiter.join(str(value) for value in row) + "\n"
+
+
+def merge_local_contexts(
+    contexts: list[tuple[float, ContextBuilderResult]],
+    shard_names: list[str],
+    max_tokens: int,
+    token_encoder: Any,
+    column_delimiter: str = "|",
+) -> tuple[str, dict[str, pd.DataFrame]]:
+    """
+    Merge the local search contexts of the shards into one context fitting `max_tokens`.
+
+    Each section (reports, entities, relationships, claims, sources) keeps the share of the budget
+    it has in the shard contexts. Its rows are interleaved from the shards at a rate proportional to
+    the relevance of each shard to the query, keeping the order graphrag ranked them in within a
+    shard, until the section budget is used. Record ids are prefixed with the shard number so that
+    the references of the answer stay unambiguous.
+    """
+    best_relevance = max((relevance for relevance, _ in contexts), default=0.0)
+    weights = [
+        max(MIN_SHARD_WEIGHT, relevance / best_relevance) if best_relevance > 0 else 1.0
+        for relevance, _ in contexts
+    ]
+    sections = list(dict.fromkeys(
+        [name for name in SECTION_ORDER if any(name in result.context_records for _, result in contexts)]
+        + [name for _, result in contexts for name in result.context_records]
+    ))
+
+    section_tokens = {}
+    for name in sections:
+        section_tokens[name] = sum(
+            num_tokens("".join(_format_row(row, column_delimiter) for row in result.context_records[name].itertuples(index=False)), token_encoder)
+            for _, result in contexts
+            if name in result.context_records
+        )
+    total_tokens = sum(section_tokens.values()) or 1
+
+    context_text = []
+    context_records = {}
+    for name in sections:
+        budget = max_tokens * section_tokens[name] / total_tokens
+        candidates = []
+        columns = None
+        for shard_position, (_, result) in enumerate(contexts):
+            records = result.context_records.get(name)
+            if records is None or records.empty:
+                continue
+            columns = list(records.columns)
+            for rank, row in enumerate(records.itertuples(index=False)):
+                candidates.append(((rank + 1) / weights[shard_position], shard_position, list(row)))
+        if columns is None:
+            continue
+        candidates.sort(key=lambda candidate: candidate[0])
+
+        title = SECTION_TITLES.get(name, name)
+        text = f"-----{title}-----\n" + _format_row(columns, column_delimiter)
+        used_tokens = num_tokens(text, token_encoder)
+        rows = []
+        for _, shard_position, row in candidates:
+            if "id" in columns:
+                row[columns.index("id")] = f"{shard_position + 1}-{row[columns.index('id')]}"
+            row_text = _format_row(row, column_delimiter)
+            row_tokens = num_tokens(row_text, token_encoder)
+            if used_tokens + row_tokens > budget:
+                break
+            text += row_text
+            used_tokens += row_tokens
+            rows.append([shard_names[shard_position], *row])
+        if rows:
+            context_text.append(text)
+            context_records[name] = pd.DataFrame(rows, columns=[SHARD_COLUMN, *columns])
+    return "\n\n".join(context_text), context_records
+
+
+class ShardedLocalSearch:
+    """
+    Local search over the shards of an index: the contexts of the shards are built concurrently,
+    merged and reranked into one context (see `merge_local_contexts`), and a single answer is
+    generated from it by the engine of the first shard.
+
+    :param engines: Local search engines of the shards, in shard order.
+    :param shard_names: Names of the shards, reported in the context records.
+    """
+
+    def __init__(self, engines: list[LocalSearch], shard_names: list[str]):
+        self.engines = engines
+        self.shard_names = shard_names
+
+    async def build_context(self, query: str) -> tuple[str, dict[str, pd.DataFrame]]:
+        main_engine = self.engines[0]
+        query_embedding = await main_engine.context_builder.text_embedder.aembed(query)
+        # Building a context is synchronous, the shards are built in worker threads
+        contexts = await asyncio.gather(*[
+            asyncio.to_thread(_build_shard_context, engine, query, query_embedding)
+            for engine in self.engines
+        ])
+        logger.info(f"Local search shard relevances: {dict(zip(self.shard_names, [round(relevance, 3) for relevance, _ in contexts]))}")
+        return merge_local_contexts(
+            contexts,
+            self.shard_names,
+            max_tokens=main_engine.context_builder_params.get("max_tokens", 8000),
+            token_encoder=main_engine.token_encoder,
+        )
+
+    def _messages(self, query: str, context_text: str) -> list[dict]:
+        main_engine = self.engines[0]
+        search_prompt = main_engine.system_prompt.format(context_data=context_text, response_type=main_engine.response_type)
+        return [
+            {"role": "system", "content": search_prompt},
+            {"role": "user", "content": query},
+        ]
+
+    async def asearch(self, query: str) -> tuple[str, dict[str, pd.DataFrame]]:
+        context_text, context_records = await self.build_context(query)
+        main_engine = self.engines[0]
+        response = await main_engine.llm.agenerate(
+            messages=self._messages(query, context_text),
+            streaming=True,
+            callbacks=main_engine.callbacks,
+            **main_engine.llm_params,
+        )
+        return response, context_records
+
+    async def astream_search(self, query: str) -> AsyncGenerator:
+        context_text, context_records = await self.build_context(query)
+        main_engine = self.engines[0]
+        yield context_records
+        async for response in main_engine.llm.astream_generate(
+            messages=self._messages(query, context_text),
+            callbacks=main_engine.callbacks,
+            **main_engine.llm_params,
+        ):
+            yield response
+
+
+class ShardedGlobalSearch:
+    """
+    Global search over the shards of an index: the map phases of the shards run concurrently, then
+    a single reduce call ranks the key points of every shard by score and answers from the best ones.
+
+    :param engines: Global search engines of the shards, in shard order.
+    :param shard_names: Names of the shards, reported in the context records.
+    """
+
+    def __init__(self, engines: list[RankedGlobalSearch], shard_names: list[str]):
+        self.engines = engines
+        self.shard_names = shard_names
+
+    async def map_phase(self, query: str) -> tuple[dict[str, pd.DataFrame], list]:
+        """
+        Map the report batches of every shard, without the reduce step.
+        Returns the context records of the shards and their map responses.
+        """
+        shard_results = await asyncio.gather(*[engine.map_phase(query) for engine in self.engines])
+        context_records = {}
+        map_responses = []
+        for shard_name, (records, responses) in zip(self.shard_names, shard_results):
+            map_responses.extend(responses)
+            for name, df in records.items():
+                context_records.setdefault(name, []).append(df.assign(**{SHARD_COLUMN: shard_name}))
+        merged_records = {name: pd.concat(dfs, ignore_index=True) for name, dfs in context_records.items()}
+        return merged_records, map_responses
+
+    async def asearch(self, query: str) -> tuple[str, dict[str, pd.DataFrame]]:
+        context_records, map_responses = await self.map_phase(query)
+        main_engine = self.engines[0]
+        reduce_response = await main_engine._reduce_response(map_responses=map_responses, query=query, **main_engine.reduce_llm_params)
+        return reduce_response.response, context_records
+
+    async def astream_search(self, query: str) -> AsyncGenerator:
+        context_records, map_responses = await self.map_phase(query)
+        main_engine = self.engines[0]
+        yield context_records
+        async for response in main_engine._stream_reduce_response(map_responses=map_responses, query=query, **main_engine.reduce_llm_params):
+            yield response
+
+
+def shard_target_key_points(target_key_points: int, n_shards: int) -> int:
+    """
+    Early stopping target of the map phase of each shard, so that the shards together collect the target.
+    """
+    return math.ceil(target_key_points / n_shards) if target_key_points > 0 else 0
+
+
+async def sharded_search(engine: ShardedLocalSearch | ShardedGlobalSearch, query: str):
+    response, context_records = await engine.asearch(query)
+    return response, _reformat_context_data(context_records)
+
+
+async def sharded_search_streaming(engine: ShardedLocalSearch | ShardedGlobalSearch, query: str) -> AsyncGenerator:
+    """
+    Yields the context data first, then the response tokens.
+    """
+    first_chunk = True
+    async for chunk in engine.astream_search(query):
+        if first_chunk:
+            yield _reformat_context_data(chunk)
+            first_chunk = False
+        else:
+            yield chunk
@@ -0,0 +1,183 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+import numpy as np
+import tiktoken
+
+TOKEN_COUNTS_FILE_NAME = "token_counts.npz"
+# Texts counted at query time that are remembered, on top of the precomputed ones
+DEFAULT_MAX_MEMO_ENTRIES = 100_000
+
+# The pre-tokenizers of the encodings with a rule for runs of newlines (cl100k_base, o200k_base) never
+# merge a newline with the non-space character following it, but for "/" in o200k_base, so the token
+# count of a text is the sum of the counts of its parts split there: a context table is counted from
+# the counts of its rows
+_SEGMENT_BOUNDARY = re.compile(r"(?<=\n)(?=[^\s/])")
+_NEWLINES_RULE = r"\s*[\r\n]"
+
+logger = logging.getLogger(__name__)
+
+
+def _text_key(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class TokenCountCache:
+    """
+    Token counts of the context rows of the loaded indexes for one tokenizer, keyed by the 64-bit hash
+    of their text.
+
+    The counts of each index are precomputed when it is loaded (see `load_token_counts`) and held as a
+    pair of sorted key and count arrays, so the context builders of a query look counts up instead of
+    tokenizing the same text units and community reports again. Texts that were not precomputed, such
+    as rows carrying per-query values, are tokenized once and remembered in a bounded LRU memo.
+
+    :param encoding_name: Name of the tiktoken encoding the counts are for.
+    """
+
+    def __init__(self, encoding_name: str, max_memo_entries: int = DEFAULT_MAX_MEMO_ENTRIES):
+        self.encoding_name = encoding_name
+        self.max_memo_entries = max_memo_entries
+        self._tables_by_source: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        self._tables: tuple[tuple[np.ndarray, np.ndarray], ...] = ()
+        self._memo: OrderedDict[int, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self._recording = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, source: str, keys: np.ndarray, counts: np.ndarray) -> None:
+        """
+        Use the precomputed counts of an index, replacing those previously registered for the same source.
+        """
+        order = np.argsort(keys, kind="stable")
+        with self._lock:
+            self._tables_by_source[source] = (keys[order], counts[order])
+            self._tables = tuple(self._tables_by_source.values())
+
+    def _precomputed(self, key: int) -> int | None:
+        key = np.uint64(key)
+        for keys, counts in self._tables:
+            position = keys.searchsorted(key)
+            if position < len(keys) and keys[position] == key:
+                return int(counts[position])
+        return None
+
+    def _segment_tokens(self, segment: str, token_encoder: tiktoken.Encoding) -> int:
+        key = _text_key(segment)
+        recorded = getattr(self._recording, "counts", None)
+        if recorded is not None:
+            tokens = recorded.get(key)
+            if tokens is None:
+                tokens = self._precomputed(key)
+                recorded[key] = tokens if tokens is not None else len(token_encoder.encode(segment))
+            return recorded[key]
+        tokens = self._precomputed(key)
+        if tokens is not None:
+            self.hits += 1
+            return tokens
+        with self._lock:
+            tokens = self._memo.get(key)
+            if tokens is not None:
+                self._memo.move_to_end(key)
+                self.hits += 1
+                return tokens
+        tokens = len(token_encoder.encode(segment))
+        with self._lock:
+            self.misses += 1
+            self._memo[key] = tokens
+            if len(self._memo) > self.max_memo_entries:
+                self._memo.popitem(last=False)
+        return tokens
+
+    def count(self, text: str, token_encoder: tiktoken.Encoding) -> int:
+        if not text:
+            return 0
+        if _NEWLINES_RULE not in getattr(token_encoder, "_pat_str", ""):
+            return self._segment_tokens(text, token_encoder)
+        return sum(self._segment_tokens(segment, token_encoder) for segment in _SEGMENT_BOUNDARY.split(text))
+
+    def record(self, render: Callable[[], None]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Run `render`, which builds contexts from the rows of an index, and return the keys and token
+        counts of every text it counted in the calling thread.
+        """
+        self._recording.counts = {}
+        try:
+            render()
+            recorded = self._recording.counts
+        finally:
+            self._recording.counts = None
+        return np.fromiter(recorded.keys(), dtype=np.uint64, count=len(recorded)), np.fromiter(recorded.values(), dtype=np.int32, count=len(recorded))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "precomputed": sum(len(keys) for keys, _ in self._tables),
+                "memo": len(self._memo),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_token_count_caches: dict[str, TokenCountCache] = {}
+_token_count_caches_lock = threading.Lock()
+
+
+def get_token_count_cache(encoding_name: str) -> TokenCountCache:
+    """
+    Return the process-wide token count cache of a tokenizer, shared by every agent and index.
+    """
+    with _token_count_caches_lock:
+        cache = _token_count_caches.get(encoding_name)
+        if cache is None:
+            cache = _token_count_caches[encoding_name] = TokenCountCache(encoding_name)
+        return cache
+
+
+def num_tokens(text: str, token_encoder: tiktoken.Encoding | None = None) -> int:
+    """
+    Drop-in replacement of graphrag's `num_tokens` answering from the token count cache of the encoder.
+    """
+    if token_encoder is None:
+        token_encoder = tiktoken.get_encoding("cl100k_base")
+    return get_token_count_cache(token_encoder.name).count(text, token_encoder)
+
+
+def load_token_counts(index_output_folder: str, source: str, signature: str, encoding_name: str, render: Callable[[], None]) -> None:
+    """
+    Register the token counts of an index, read from the file persisted next to its parquet files or
+    precomputed by running `render` and persisted.
+
+    :param source: Identifies the index, its previous counts are replaced.
+    :param signature: Identifies the index generation and search setup the persisted file was built for.
+    :param render: Builds the contexts of every row a search of the index can use.
+    """
+    start_time = time.perf_counter()
+    cache = get_token_count_cache(encoding_name)
+    path = os.path.join(index_output_folder, TOKEN_COUNTS_FILE_NAME)
+    signature = f"{signature}:{encoding_name}"
+    keys = counts = None
+    if os.path.exists(path):
+        with np.load(path, allow_pickle=False) as data:
+            if str(data["signature"]) == signature:
+                keys, counts = data["keys"], data["counts"]
+    if keys is None:
+        keys, counts = cache.record(render)
+        tmp_path = path + ".tmp.npz"
+        try:
+            np.savez(tmp_path, keys=keys, counts=counts, signature=np.asarray(signature))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not persist the token counts to {path}: {e}")
+    cache.register(source, keys, counts)
+    logger.info(
+        f"Token counts of {source} ready in {time.perf_counter() - start_time:.2f}s: {len(keys)} texts, "
+        f"{(keys.nbytes + counts.nbytes) / 1024 / 1024:.1f} MB"
+    )
@@ -0,0 +1,231 @@
+import logging
+import os
+import time
+from typing import Any
+
+import numpy as np
+from graphrag.model.types import TextEmbedder
+from graphrag.vector_stores.base import BaseVectorStore, VectorStoreDocument, VectorStoreSearchResult
+
+ENTITY_VECTOR_INDEX_FILE_NAME = "entity_description_ivf.npz"
+# Below this size every query scans all the vectors, which is already sub-millisecond
+EXACT_SEARCH_MAX_VECTORS = 4096
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _spherical_kmeans(vectors: np.ndarray, n_lists: int, seed: int = 0) -> np.ndarray:
+    """
+    Cluster normalized vectors on a sample, returns the normalized centroids.
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), n_lists * KMEANS_SAMPLE_PER_LIST)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)].astype(np.float32)
+    centroids = sample[rng.choice(sample_size, n_lists, replace=False)]
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        empty = ~np.bincount(assignments, minlength=n_lists).astype(bool)
+        # Re-seed empty lists with random points
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted file index over normalized vectors for cosine similarity search.
+
+    Vectors are clustered into `sqrt(n)` lists and stored contiguously list by list, so a query
+    only scores the vectors of the `n_probe` lists whose centroids are closest to it. Small
+    collections use a single list, i.e. an exact search.
+
+    :param ids: Document id of each vector.
+    :param vectors: Vectors, normalized and in list order.
+    :param centroids: Normalized list centroids.
+    :param offsets: Start of each list in `vectors`, followed by the total number of vectors.
+    """
+
+    def __init__(self, ids: np.ndarray, vectors: np.ndarray, centroids: np.ndarray, offsets: np.ndarray, n_probe: int | None = None):
+        self.ids = ids
+        self.vectors = vectors
+        self.centroids = centroids
+        self.offsets = offsets
+        self.n_lists = len(centroids)
+        self.n_probe = min(self.n_lists, n_probe or max(8, self.n_lists // 16))
+        self._positions = {str(doc_id): position for position, doc_id in enumerate(ids)}
+
+    @classmethod
+    def build(cls, ids: list, vectors: np.ndarray, dtype: str = "float32", n_probe: int | None = None) -> "IVFIndex":
+        vectors = _normalize(vectors)
+        ids = np.asarray([str(doc_id) for doc_id in ids])
+        if len(vectors) <= EXACT_SEARCH_MAX_VECTORS:
+            centroids = _normalize(vectors.mean(axis=0, keepdims=True)) if len(vectors) else np.zeros((1, 0), dtype=np.float32)
+            assignments = np.zeros(len(vectors), dtype=np.int64)
+        else:
+            centroids = _spherical_kmeans(vectors, int(np.sqrt(len(vectors))))
+            # Assign in blocks to bound the size of the similarity matrix
+            assignments = np.concatenate([
+                np.argmax(vectors[start:start + 65536] @ centroids.T, axis=1)
+                for start in range(0, len(vectors), 65536)
+            ])
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=len(centroids)))]).astype(np.int64)
+        return cls(ids[order], vectors[order].astype(dtype), centroids, offsets, n_probe=n_probe)
+
+    def search(self, query_vector: list[float], k: int, mask: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return the positions and similarities of the k nearest vectors, most similar first.
+
+        :param mask: Optional boolean array, False for vectors that must not be returned.
+        """
+        if len(self.ids) == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+        if self.n_lists == 1:
+            lists = [0]
+        else:
+            centroid_scores = self.centroids @ query
+            lists = np.argpartition(-centroid_scores, self.n_probe - 1)[:self.n_probe]
+        positions = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists])
+        scores = np.concatenate([
+            # float16 storage is widened per probed list, numpy has no fast float16 matrix product
+            self.vectors[self.offsets[i]:self.offsets[i + 1]].astype(np.float32, copy=False) @ query for i in lists
+        ])
+        if mask is not None:
+            scores[~mask[positions]] = -np.inf
+        k = min(k, len(positions))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = top[np.isfinite(scores[top])]
+        return positions[top], scores[top]
+
+    def position(self, doc_id: str) -> int | None:
+        return self._positions.get(str(doc_id))
+
+    def save(self, path: str, signature: str) -> None:
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, ids=self.ids, vectors=self.vectors, centroids=self.centroids, offsets=self.offsets, signature=np.asarray(signature))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, signature: str, n_probe: int | None = None) -> "IVFIndex | None":
+        """
+        Load a persisted index, None if it is missing or was built from another source.
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            if str(data["signature"]) != signature:
+                return None
+            return cls(data["ids"], data["vectors"], data["centroids"], data["offsets"], n_probe=n_probe)
+
+
+class InMemoryVectorStore(BaseVectorStore):
+    """
+    Read-only graphrag vector store answering similarity searches from an in-memory IVFIndex,
+    without any file I/O at query time.
+    """
+
+    def __init__(self, index: IVFIndex, collection_name: str = "", **kwargs: Any):
+        super().__init__(collection_name=collection_name, **kwargs)
+        self.index = index
+        self._mask = None
+
+    def connect(self, **kwargs: Any) -> None:
+        pass
+
+    def load_documents(self, documents: list[VectorStoreDocument], overwrite: bool = True) -> None:
+        raise NotImplementedError("InMemoryVectorStore is read-only, it is built from the index embeddings")
+
+    def filter_by_id(self, include_ids: list[str] | list[int]) -> Any:
+        if len(include_ids) == 0:
+            self._mask = None
+        else:
+            self._mask = np.zeros(len(self.index.ids), dtype=bool)
+            positions = [self.index.position(doc_id) for doc_id in include_ids]
+            self._mask[[position for position in positions if position is not None]] = True
+        self.query_filter = self._mask
+        return self._mask
+
+    def similarity_search_by_vector(self, query_embedding: list[float], k: int = 10, **kwargs: Any) -> list[VectorStoreSearchResult]:
+        positions, scores = self.index.search(query_embedding, k, mask=self._mask)
+        return [
+            VectorStoreSearchResult(
+                document=VectorStoreDocument(id=str(self.index.ids[position]), text=None, vector=None),
+                score=float(score),
+            )
+            for position, score in zip(positions, scores)
+        ]
+
+    def similarity_search_by_text(self, text: str, text_embedder: TextEmbedder, k: int = 10, **kwargs: Any) -> list[VectorStoreSearchResult]:
+        query_embedding = text_embedder(text)
+        if query_embedding:
+            return self.similarity_search_by_vector(query_embedding, k)
+        return []
+
+    def search_by_id(self, id: str) -> VectorStoreDocument:
+        position = self.index.position(id)
+        if position is None:
+            return VectorStoreDocument(id=id, text=None, vector=None)
+        return VectorStoreDocument(id=id, text=None, vector=self.index.vectors[position].astype(np.float32).tolist())
+
+
+def _read_lancedb_vectors(db_uri: str, collection_name: str) -> tuple[list[str], np.ndarray]:
+    import lancedb
+
+    table = lancedb.connect(db_uri).open_table(collection_name).to_arrow().select(["id", "vector"])
+    ids = table.column("id").to_pylist()
+    vectors = table.column("vector").combine_chunks()
+    dimension = len(vectors[0]) if len(vectors) else 0
+    return ids, vectors.flatten().to_numpy().astype(np.float32).reshape(len(ids), dimension)
+
+
+def load_entity_vector_store(
+    graphrag_config,
+    index_output_folder: str,
+    signature: str,
+    dtype: str = "float32",
+) -> InMemoryVectorStore | None:
+    """
+    Load the in-memory entity description index persisted next to the parquet files,
+    or build it from the LanceDB embeddings and persist it. Returns None if the embeddings
+    cannot be read, search then falls back to LanceDB.
+
+    :param signature: Identifies the index generation the persisted file was built from.
+    """
+    from graphrag.index.config.embeddings import entity_description_embedding
+    from graphrag.utils.embeddings import create_collection_name
+
+    start_time = time.perf_counter()
+    path = os.path.join(index_output_folder, ENTITY_VECTOR_INDEX_FILE_NAME)
+    signature = f"{signature}:{dtype}"
+    index = IVFIndex.load(path, signature)
+    if index is None:
+        vector_store_args = graphrag_config.embeddings.vector_store
+        collection_name = create_collection_name(vector_store_args.get("container_name", "default"), entity_description_embedding)
+        try:
+            ids, vectors = _read_lancedb_vectors(vector_store_args["db_uri"], collection_name)
+        except Exception as e:
+            logger.warning(f"Could not read the entity embeddings of {collection_name}, using the LanceDB store: {e}")
+            return None
+        index = IVFIndex.build(ids, vectors, dtype=dtype)
+        try:
+            index.save(path, signature)
+        except OSError as e:
+            logger.warning(f"Could not persist the entity vector index to {path}: {e}")
+    logger.info(
+        f"Entity vector index ready in {time.perf_counter() - start_time:.2f}s: {len(index.ids)} vectors, "
+        f"{index.n_lists} lists, {index.vectors.nbytes / 1024 / 1024:.1f} MB ({index.vectors.dtype})"
+    )
+    return InMemoryVectorStore(index)
@@ -0,0 +1,468 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncGenerator, Callable, Generator, Iterable
+
+DEFAULT_MAX_IN_FLIGHT = 50
+DEFAULT_REQUESTS_PER_SECOND = 0.0
+
+logger = logging.getLogger(__name__)
+
+
+class _AsyncWaiter:
+    """A pending acquisition made from a coroutine, woken on its own event loop."""
+
+    def __init__(self, semaphore: "CrossLoopSemaphore"):
+        self.semaphore = semaphore
+        self.loop = asyncio.get_running_loop()
+        self.future = self.loop.create_future()
+
+    def grant(self) -> bool:
+        """
+        Wake the waiter up on its loop. Returns False if the loop has been closed, the slot is then
+        not taken. Called with the lock of the semaphore held.
+        """
+        try:
+            self.loop.call_soon_threadsafe(self._set_granted)
+        except RuntimeError:
+            return False
+        return True
+
+    def _set_granted(self) -> None:
+        if self.future.cancelled():
+            self.semaphore.release()
+        else:
+            self.future.set_result(None)
+
+
+class _ThreadWaiter:
+    """A pending acquisition made from plain synchronous code."""
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def grant(self) -> bool:
+        self.event.set()
+        return True
+
+
+class CrossLoopSemaphore:
+    """
+    A counting semaphore that can be shared by coroutines running on different event loops
+    and by synchronous threads.
+
+    asyncio.Semaphore binds itself to the first loop that uses it, which does not work for a
+    process-wide limit: the index recipe, graphrag's threaded workflows and the agent all run
+    their own loops. Waiters are served in FIFO order and the limit can be changed at runtime.
+    """
+
+    def __init__(self, limit: int):
+        self._lock = threading.Lock()
+        self._limit = max(1, int(limit))
+        self._in_flight = 0
+        self._waiters = deque()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def set_limit(self, limit: int) -> None:
+        with self._lock:
+            self._limit = max(1, int(limit))
+            self._wake_waiters()
+
+    async def acquire(self) -> None:
+        with self._lock:
+            if self._in_flight < self._limit and not self._waiters:
+                self._in_flight += 1
+                return
+            waiter = _AsyncWaiter(self)
+            self._waiters.append(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    waiter = None
+            if waiter is not None and waiter.future.done() and not waiter.future.cancelled():
+                # The slot was granted right before the cancellation reached us.
+                self.release()
+            raise
+
+    def acquire_blocking(self) -> None:
+        with self._lock:
+            if self._in_flight < self._limit and not self._waiters:
+                self._in_flight += 1
+                return
+            waiter = _ThreadWaiter()
+            self._waiters.append(waiter)
+        waiter.event.wait()
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        # Must be called with the lock held. The slot is reserved for the waiter before it
+        # is woken up, so a new caller cannot steal it in between.
+        while self._waiters and self._in_flight < self._limit:
+            waiter = self._waiters.popleft()
+            self._in_flight += 1
+            if not waiter.grant():
+                # Nobody will release the slot of a waiter whose loop is closed
+                self._in_flight -= 1
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Callers reserve a token and get back how long they must wait
+    before using it, so waiting can be done with asyncio.sleep or time.sleep as appropriate.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self._lock = threading.Lock()
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+
+    def set_rate(self, rate: float) -> None:
+        with self._lock:
+            self.rate = float(rate)
+            self.capacity = max(1.0, self.rate)
+            self._tokens = min(self._tokens, self.capacity)
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1.0
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD controller of a CrossLoopSemaphore limit. The limit is multiplied by `decrease_factor` when
+    the provider throttles and grows by one after `limit` consecutive successes, up to `max_limit`,
+    so the number of in-flight requests settles around what the provider sustains.
+
+    Requests in flight when throttling starts tend to fail together: the limit is decreased at most
+    once per `cooldown_seconds`.
+    """
+
+    def __init__(self, semaphore: CrossLoopSemaphore, max_limit: int, min_limit: int = 1, decrease_factor: float = 0.5, cooldown_seconds: float = 5.0):
+        self._lock = threading.Lock()
+        self.semaphore = semaphore
+        self.max_limit = max(1, int(max_limit))
+        self.min_limit = max(1, min(int(min_limit), self.max_limit))
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+        self._successes = 0
+        self._last_decrease = 0.0
+        self.throttled = 0
+        self.decreases = 0
+
+    def set_max_limit(self, max_limit: int) -> None:
+        with self._lock:
+            self.max_limit = max(1, int(max_limit))
+            self.min_limit = min(self.min_limit, self.max_limit)
+            self.semaphore.set_limit(min(self.semaphore.limit, self.max_limit))
+
+    def on_throttled(self) -> None:
+        with self._lock:
+            self.throttled += 1
+            self._successes = 0
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown_seconds:
+                return
+            self._last_decrease = now
+            limit = max(self.min_limit, int(self.semaphore.limit * self.decrease_factor))
+            if limit < self.semaphore.limit:
+                self.decreases += 1
+                logger.warning(f"LLM Mesh throttling, reducing in-flight requests from {self.semaphore.limit} to {limit}")
+                self.semaphore.set_limit(limit)
+
+    def on_success(self) -> None:
+        with self._lock:
+            if self.semaphore.limit >= self.max_limit:
+                return
+            self._successes += 1
+            if self._successes >= self.semaphore.limit:
+                self._successes = 0
+                self.semaphore.set_limit(self.semaphore.limit + 1)
+                logger.debug(f"LLM Mesh healthy, in-flight requests raised to {self.semaphore.limit}")
+
+
+class LLMMeshLimiter:
+    """
+    Process-wide executor and concurrency limiter for LLM Mesh requests.
+
+    Every Dataiku adapter runs its blocking `execute()` calls through this object instead of
+    creating a thread pool per call. It bounds the number of in-flight requests, optionally
+    caps the request rate, and keeps queue-depth and wait-time metrics. When `adaptive` is set,
+    throttled requests reported with `report_throttled` shrink the in-flight limit, which grows
+    back as requests succeed (see AdaptiveConcurrency).
+    """
+
+    def __init__(self, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND, adaptive: bool = False):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.requests_per_second = float(requests_per_second or 0)
+        self._semaphore = CrossLoopSemaphore(self.max_in_flight)
+        self._adaptive = AdaptiveConcurrency(self._semaphore, self.max_in_flight) if adaptive else None
+        self._bucket = TokenBucket(self.requests_per_second) if self.requests_per_second > 0 else None
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="dku-llm-mesh")
+        self._stats_lock = threading.Lock()
+        self._reset_counters()
+
+    def _reset_counters(self) -> None:
+        self._total_requests = 0
+        self._total_wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._max_queue_depth = 0
+
+    def configure(self, max_in_flight: int | None = None, requests_per_second: float | None = None, adaptive: bool | None = None) -> None:
+        """
+        Change the limits of a live limiter. Requests already in flight are not affected.
+        """
+        if max_in_flight is not None and int(max_in_flight) != self.max_in_flight:
+            self.max_in_flight = max(1, int(max_in_flight))
+            old_executor = self._executor
+            self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="dku-llm-mesh")
+            old_executor.shutdown(wait=False)
+            self._semaphore.set_limit(self.max_in_flight)
+            if self._adaptive is not None:
+                self._adaptive.set_max_limit(self.max_in_flight)
+        if adaptive is not None and adaptive != (self._adaptive is not None):
+            self._adaptive = AdaptiveConcurrency(self._semaphore, self.max_in_flight) if adaptive else None
+            self._semaphore.set_limit(self.max_in_flight)
+        if requests_per_second is not None and float(requests_per_second) != self.requests_per_second:
+            self.requests_per_second = float(requests_per_second)
+            if self.requests_per_second <= 0:
+                self._bucket = None
+            elif self._bucket is None:
+                self._bucket = TokenBucket(self.requests_per_second)
+            else:
+                self._bucket.set_rate(self.requests_per_second)
+        logger.info(
+            f"LLM Mesh limiter configured: max_in_flight={self.max_in_flight}, requests_per_second={self.requests_per_second}, "
+            f"adaptive={self._adaptive is not None}"
+        )
+
+    def report_throttled(self) -> None:
+        """
+        Report a request rejected by the provider rate limits.
+        """
+        if self._adaptive is not None:
+            self._adaptive.on_throttled()
+
+    def report_success(self) -> None:
+        if self._adaptive is not None:
+            self._adaptive.on_success()
+
+    def _record_wait(self, wait_time: float) -> None:
+        with self._stats_lock:
+            self._total_requests += 1
+            self._total_wait_time += wait_time
+            self._max_wait_time = max(self._max_wait_time, wait_time)
+
+    def _record_queued(self) -> None:
+        if self._semaphore.in_flight < self._semaphore.limit:
+            return
+        with self._stats_lock:
+            self._max_queue_depth = max(self._max_queue_depth, self._semaphore.waiting + 1)
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run a blocking LLM Mesh call on the shared executor, once a slot and a rate token are available.
+        """
+        enqueued_at = time.perf_counter()
+        self._record_queued()
+        await self._semaphore.acquire()
+        try:
+            if self._bucket is not None:
+                delay = self._bucket.reserve()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self._record_wait(time.perf_counter() - enqueued_at)
+            future = self._executor.submit(functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            self._semaphore.release()
+            raise
+        # The slot is held until the call really finishes, even if the awaiting task is cancelled.
+        future.add_done_callback(lambda _: self._semaphore.release())
+        return await asyncio.wrap_future(future)
+
+    def run_blocking(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run a blocking LLM Mesh call in the calling thread, under the same limits as `run`.
+        """
+        enqueued_at = time.perf_counter()
+        self._record_queued()
+        self._semaphore.acquire_blocking()
+        try:
+            if self._bucket is not None:
+                delay = self._bucket.reserve()
+                if delay > 0:
+                    time.sleep(delay)
+            self._record_wait(time.perf_counter() - enqueued_at)
+            return fn(*args, **kwargs)
+        finally:
+            self._semaphore.release()
+
+    async def stream(self, fn: Callable[..., Iterable[Any]], *args: Any, **kwargs: Any) -> AsyncGenerator[Any, None]:
+        """
+        Run a blocking LLM Mesh streaming call on the shared executor and yield its items as they arrive.
+        The slot is held until the stream is exhausted or abandoned by the consumer.
+        """
+        enqueued_at = time.perf_counter()
+        self._record_queued()
+        await self._semaphore.acquire()
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        end_of_stream = object()
+        abandoned = threading.Event()
+
+        def put(item, error=None) -> None:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+            except RuntimeError:
+                # The consumer's loop has been closed
+                abandoned.set()
+
+        def consume() -> None:
+            try:
+                for item in fn(*args, **kwargs):
+                    if abandoned.is_set():
+                        return
+                    put(item)
+            except BaseException as e:
+                put(end_of_stream, e)
+                return
+            put(end_of_stream)
+
+        try:
+            if self._bucket is not None:
+                delay = self._bucket.reserve()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self._record_wait(time.perf_counter() - enqueued_at)
+            future = self._executor.submit(consume)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        future.add_done_callback(lambda _: self._semaphore.release())
+        try:
+            while True:
+                item, error = await queue.get()
+                if item is end_of_stream:
+                    if error is not None:
+                        raise error
+                    return
+                yield item
+        finally:
+            abandoned.set()
+
+    def stream_blocking(self, fn: Callable[..., Iterable[Any]], *args: Any, **kwargs: Any) -> Generator[Any, None, None]:
+        """
+        Iterate over a blocking LLM Mesh streaming call in the calling thread, under the same limits as `stream`.
+        """
+        enqueued_at = time.perf_counter()
+        self._record_queued()
+        self._semaphore.acquire_blocking()
+        try:
+            if self._bucket is not None:
+                delay = self._bucket.reserve()
+                if delay > 0:
+                    time.sleep(delay)
+            self._record_wait(time.perf_counter() - enqueued_at)
+            yield from fn(*args, **kwargs)
+        finally:
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        """
+        Snapshot of the limiter metrics.
+        """
+        with self._stats_lock:
+            total = self._total_requests
+            stats = {
+                "max_in_flight": self._semaphore.limit,
+                "configured_max_in_flight": self.max_in_flight,
+                "requests_per_second": self.requests_per_second,
+                "in_flight": self._semaphore.in_flight,
+                "queue_depth": self._semaphore.waiting,
+                "max_queue_depth": self._max_queue_depth,
+                "total_requests": total,
+                "total_wait_seconds": self._total_wait_time,
+                "avg_wait_seconds": self._total_wait_time / total if total else 0.0,
+                "max_wait_seconds": self._max_wait_time,
+            }
+        if self._adaptive is not None:
+            stats["throttled_requests"] = self._adaptive.throttled
+            stats["limit_decreases"] = self._adaptive.decreases
+        return stats
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self._reset_counters()
+
+
+_limiter: LLMMeshLimiter | None = None
+_limiter_lock = threading.Lock()
+
+
+def get_llm_mesh_limiter() -> LLMMeshLimiter:
+    """
+    Return the process-wide LLM Mesh limiter, creating it with default limits if needed.
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = LLMMeshLimiter()
+        return _limiter
+
+
+def configure_llm_mesh_limiter(
+    max_in_flight: int | None = None,
+    requests_per_second: float | None = None,
+    adaptive: bool | None = None,
+) -> LLMMeshLimiter:
+    """
+    Create or reconfigure the process-wide LLM Mesh limiter.
+
+    :param max_in_flight: Maximum number of concurrent LLM Mesh requests in this process.
+    :param requests_per_second: Maximum request rate, 0 or None for unlimited.
+    :param adaptive: Shrink the in-flight limit when the provider throttles, None keeps the current setting.
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = LLMMeshLimiter(
+                max_in_flight=max_in_flight or DEFAULT_MAX_IN_FLIGHT,
+                requests_per_second=requests_per_second or DEFAULT_REQUESTS_PER_SECOND,
+                adaptive=bool(adaptive),
+            )
+            logger.info(
+                f"LLM Mesh limiter created: max_in_flight={_limiter.max_in_flight}, requests_per_second={_limiter.requests_per_second}, "
+                f"adaptive={bool(adaptive)}"
+            )
+        else:
+            _limiter.configure(max_in_flight=max_in_flight, requests_per_second=requests_per_second, adaptive=adaptive)
+        return _limiter
@@ -0,0 +1,132 @@
+import logging
+import threading
+from typing import Any
+
+import dataiku
+
+from dku_graphrag.utils.concurrency import get_llm_mesh_limiter
+
+try:
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    HTTPAdapter = None
+
+logger = logging.getLogger(__name__)
+
+
+class DataikuClientRegistry:
+    """
+    Process-wide Dataiku API client and LLM Mesh handles.
+
+    Every Dataiku adapter used to create its own API client, default project and LLM handle, and
+    graphrag creates adapters for every named child LLM it needs. The registry creates the client
+    once, with a keep-alive HTTP connection pool as large as the number of concurrent LLM Mesh
+    requests so that bursts of requests do not open new connections, and caches one LLM handle
+    per llm_id. LLM handles only hold the project and the id, they are safe to share across threads.
+
+    :param pool_size: Number of keep-alive connections to the DSS backend, defaults to the
+        in-flight limit of the LLM Mesh limiter.
+    """
+
+    def __init__(self, pool_size: int | None = None):
+        self._lock = threading.Lock()
+        self.pool_size = pool_size
+        self._client = None
+        self._project = None
+        self._llms: dict[str, Any] = {}
+
+    def _mount_pool(self, client: Any) -> None:
+        # dataikuapi's DSSClient sends every request through a requests.Session
+        session = getattr(client, "_session", None)
+        if session is None or HTTPAdapter is None:
+            return
+        pool_size = self.pool_size or get_llm_mesh_limiter().max_in_flight
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        logger.info(f"Dataiku API client connection pool sized to {pool_size}")
+
+    @property
+    def client(self) -> Any:
+        with self._lock:
+            if self._client is None:
+                self._client = dataiku.api_client()
+                self._mount_pool(self._client)
+            return self._client
+
+    @property
+    def project(self) -> Any:
+        client = self.client
+        with self._lock:
+            if self._project is None:
+                self._project = client.get_default_project()
+            return self._project
+
+    def get_llm(self, llm_id: str) -> Any:
+        """
+        Return the cached LLM Mesh handle of `llm_id`.
+        """
+        project = self.project
+        with self._lock:
+            llm = self._llms.get(llm_id)
+            if llm is None:
+                llm = project.get_llm(llm_id)
+                self._llms[llm_id] = llm
+            return llm
+
+    def resize_pool(self, pool_size: int) -> None:
+        with self._lock:
+            if pool_size == self.pool_size:
+                return
+            self.pool_size = pool_size
+            if self._client is not None:
+                self._mount_pool(self._client)
+
+
+_registry: DataikuClientRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_dataiku_client_registry() -> DataikuClientRegistry:
+    """
+    Return the process-wide client registry, creating it with a default pool size if needed.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = DataikuClientRegistry()
+        return _registry
+
+
+def configure_dataiku_client(pool_size: int | None = None) -> DataikuClientRegistry:
+    """
+    Create the process-wide client registry or resize its connection pool.
+
+    :param pool_size: Number of keep-alive connections to the DSS backend, usually the maximum
+        number of in-flight LLM Mesh requests.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = DataikuClientRegistry(pool_size)
+            return _registry
+    if pool_size:
+        _registry.resize_pool(pool_size)
+    return _registry
+
+
+def reset_dataiku_client() -> None:
+    """
+    Drop the cached client and LLM handles, the next call creates them again from `dataiku.api_client()`.
+    """
+    global _registry
+    with _registry_lock:
+        pool_size = _registry.pool_size if _registry is not None else None
+        _registry = DataikuClientRegistry(pool_size)
+
+
+def get_dataiku_llm(llm_id: str) -> Any:
+    """
+    Return the shared LLM Mesh handle of `llm_id`.
+    """
+    return get_dataiku_client_registry().get_llm(llm_id)
@@ -0,0 +1,130 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from typing import Any, Awaitable
+
+# Share of the budget kept for writing the answer: the stages before it (global map phase) stop
+# once only this share is left
+ANSWER_RESERVE_SHARE = 0.3
+# Contexts are shrunk when a search only starts building them after this share of the budget
+SHRINK_CONTEXT_AFTER_SHARE = 0.5
+SHRUNK_CONTEXT_SHARE = 0.5
+
+# Degradations reported to the caller
+CONTEXT_SHRUNK = "context_shrunk"
+MAP_BATCHES_DROPPED = "map_batches_dropped"
+LLM_CALL_TIMED_OUT = "llm_call_timed_out"
+ANSWER_TRUNCATED = "answer_truncated"
+CACHED_ANSWER = "cached_answer"
+NO_ANSWER = "no_answer"
+
+logger = logging.getLogger(__name__)
+
+_current_deadline: contextvars.ContextVar["Deadline | None"] = contextvars.ContextVar("graphrag_deadline", default=None)
+
+
+class DeadlineExceededError(TimeoutError):
+    """The request deadline passed before an LLM Mesh call completed."""
+
+
+class Deadline:
+    """
+    Time budget of one agent request, shared by every stage of its search through a context variable
+    (see `deadline_context`), so that the LLM calls it makes give up when it passes and the stages
+    that can trade quality for time do so as it approaches. The degradations applied are recorded
+    and reported with the answer.
+
+    :param seconds: Budget of the request, from its creation.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = float(seconds)
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + self.seconds
+        self.degradations: list[str] = []
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def elapsed_share(self) -> float:
+        return (time.monotonic() - self.started_at) / self.seconds if self.seconds > 0 else 1.0
+
+    def stage_remaining(self) -> float:
+        """
+        Time left to the stages preceding the answer, keeping `ANSWER_RESERVE_SHARE` of the budget for it.
+        """
+        return max(0.0, self.remaining() - self.seconds * ANSWER_RESERVE_SHARE)
+
+    @property
+    def degraded(self) -> bool:
+        return bool(self.degradations)
+
+    def degrade(self, reason: str) -> None:
+        with self._lock:
+            if reason in self.degradations:
+                return
+            self.degradations.append(reason)
+        logger.warning(f"Request degraded ({reason}) with {self.remaining():.1f}s left of its {self.seconds:g}s deadline")
+
+
+def get_deadline() -> Deadline | None:
+    """
+    The deadline of the request being served in the current context, None if it has none.
+    """
+    return _current_deadline.get()
+
+
+def deadline_context(deadline: Deadline | None) -> contextvars.Context:
+    """
+    A copy of the current context in which `deadline` is the request deadline. Coroutines started
+    from it, and the tasks and threads they start, see the deadline.
+    """
+    context = contextvars.copy_context()
+    context.run(_current_deadline.set, deadline)
+    return context
+
+
+async def with_deadline(awaitable: Awaitable, reserve: bool = False) -> Any:
+    """
+    Await `awaitable` within the time left to the request deadline, raising DeadlineExceededError
+    when it passes. Without a deadline, simply await it.
+
+    :param reserve: Only use the time left to the stages preceding the answer (see `Deadline.stage_remaining`).
+    """
+    deadline = get_deadline()
+    if deadline is None:
+        return await awaitable
+    timeout = deadline.stage_remaining() if reserve else deadline.remaining()
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        deadline.degrade(LLM_CALL_TIMED_OUT)
+        raise DeadlineExceededError(f"Deadline of {deadline.seconds:g}s exceeded") from None
+
+
+def check_deadline() -> None:
+    """
+    Raise DeadlineExceededError if the request deadline has passed, for blocking calls that cannot be timed out.
+    """
+    deadline = get_deadline()
+    if deadline is not None and deadline.expired():
+        deadline.degrade(LLM_CALL_TIMED_OUT)
+        raise DeadlineExceededError(f"Deadline of {deadline.seconds:g}s exceeded")
+
+
+def deadline_context_tokens(max_tokens: int) -> int:
+    """
+    Token budget of a search context: shrunk to `SHRUNK_CONTEXT_SHARE` when the request only starts
+    building it late in its deadline, so that the prompt is faster to process.
+    """
+    deadline = get_deadline()
+    if deadline is None or deadline.elapsed_share() < SHRINK_CONTEXT_AFTER_SHARE:
+        return max_tokens
+    deadline.degrade(CONTEXT_SHRUNK)
+    return int(max_tokens * SHRUNK_CONTEXT_SHARE)
@@ -0,0 +1,320 @@
+import contextlib
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: the cache directory must not be shared by several processes
+    fcntl = None
+
+DEFAULT_INITIAL_CAPACITY = 4096
+# Hash table file of the caches written before table files were versioned
+LEGACY_TABLE_FILE = "index.i64"
+
+logger = logging.getLogger(__name__)
+
+
+def _text_key(model_id: str, text: str) -> int:
+    digest = hashlib.blake2b(f"{model_id}\0{text}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _table_file(table_size: int) -> str:
+    return f"index.{table_size}.i64"
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache mapping (model id, text hash) to a float32 vector.
+
+    Vectors are stored in a memory-mapped `vectors.f32` array, next to a `keys.u64` array holding
+    the 64-bit text hash of each row and an open-addressing hash table `index.<size>.i64` mapping
+    hashes to rows. Nothing is loaded into Python objects: lookups probe the memory-mapped table and
+    return views into the vector file, so the cache can hold millions of vectors.
+
+    The directory can be shared by several processes, such as an index-builder recipe and agents:
+    writers take an exclusive file lock, catch up with the rows the others persisted, then append
+    theirs and persist them before releasing it. `meta.json` is only replaced once the arrays it
+    describes are written, and a rebuilt hash table goes to a new file, so a crash at any point leaves
+    the metadata consistent with the files; rows written after it are ignored.
+
+    :param directory: Directory of the cache, one sub-directory is used per model.
+    :param model_id: The embedding model the vectors were computed with.
+    """
+
+    def __init__(self, directory: str, model_id: str, initial_capacity: int = DEFAULT_INITIAL_CAPACITY):
+        self.model_id = model_id
+        self.directory = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]", "_", model_id))
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._meta_path = os.path.join(self.directory, "meta.json")
+        self._meta_signature = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.dim = None
+        self.count = 0
+        self.capacity = initial_capacity
+        self.table_size = 2 * initial_capacity
+        self.table_file = _table_file(self.table_size)
+        self._keys = None
+        self._vectors = None
+        self._table = None
+        with self._lock:
+            self._sync()
+        if self.dim is not None:
+            logger.info(f"Embedding cache opened at {self.directory} with {self.count} vectors")
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """
+        Serialize the writers of every process sharing the directory.
+        """
+        with open(self._path("lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _sync(self, locked: bool = False) -> None:
+        """
+        Catch up with the rows, growths and table rebuilds persisted by other processes.
+        Must be called with the lock held.
+
+        :param locked: Whether the file lock is held. Writers always read the metadata again, readers
+            only when its file changed, and take the file lock to re-map files a writer may replace.
+        """
+        try:
+            stat = os.stat(self._meta_path)
+        except FileNotFoundError:
+            return
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature == self._meta_signature and not locked:
+            return
+        with open(self._meta_path) as f:
+            meta = json.load(f)
+        table_file = meta.get("table_file", LEGACY_TABLE_FILE)
+        remap = self._keys is None or meta["capacity"] != self.capacity or table_file != self.table_file
+        if remap and not locked:
+            with self._file_lock():
+                self._sync(locked=True)
+            return
+        self.dim = meta["dim"]
+        self.count = meta["count"]
+        self.capacity = meta["capacity"]
+        self.table_size = meta["table_size"]
+        self.table_file = table_file
+        if remap:
+            self._open_arrays("r+")
+        self._meta_signature = signature
+
+    def _open_arrays(self, mode: str) -> None:
+        self._keys = np.memmap(self._path("keys.u64"), dtype=np.uint64, mode=mode, shape=(self.capacity,))
+        self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode=mode, shape=(self.capacity, self.dim))
+        self._table = np.memmap(self._path(self.table_file), dtype=np.int64, mode=mode, shape=(self.table_size,))
+        if mode == "w+":
+            self._table[:] = -1
+
+    def _find_row(self, key: int) -> int:
+        # Must be called with the lock held. Linear probing, -1 marks an empty slot.
+        mask = self.table_size - 1
+        slot = key & mask
+        key = np.uint64(key)
+        while True:
+            row = int(self._table[slot])
+            if row < 0:
+                return -1
+            if row < self.count and self._keys[row] == key:
+                return row
+            slot = (slot + 1) & mask
+
+    def _insert_slot(self, key: int, row: int) -> None:
+        # Slots of rows past the persisted count were left by a writer that died before persisting them
+        mask = self.table_size - 1
+        slot = key & mask
+        while self._table[slot] >= 0 and self._table[slot] < self.count:
+            slot = (slot + 1) & mask
+        self._table[slot] = row
+
+    def _grow(self) -> None:
+        # Double the row capacity: extend the files in place and re-map them. The metadata keeps
+        # describing a prefix of the files until it is persisted.
+        self._keys.flush()
+        self._vectors.flush()
+        del self._keys, self._vectors
+        self.capacity *= 2
+        with open(self._path("keys.u64"), "r+b") as f:
+            f.truncate(self.capacity * 8)
+        with open(self._path("vectors.f32"), "r+b") as f:
+            f.truncate(self.capacity * self.dim * 4)
+        self._keys = np.memmap(self._path("keys.u64"), dtype=np.uint64, mode="r+", shape=(self.capacity,))
+        self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+
+    def _rebuild_table(self, table_size: int) -> None:
+        """
+        Rebuild the hash table for all stored rows in a new file, vectorized: rows whose slot is free
+        are placed, the others move on to the next slot, until every row is placed. The previous file
+        stays valid for the metadata until it is persisted.
+        """
+        self.table_size = table_size
+        self.table_file = _table_file(table_size)
+        self._table = np.memmap(self._path(self.table_file), dtype=np.int64, mode="w+", shape=(self.table_size,))
+        self._table[:] = -1
+        mask = np.uint64(self.table_size - 1)
+        rows = np.arange(self.count, dtype=np.int64)
+        slots = (np.asarray(self._keys[: self.count]) & mask).astype(np.int64)
+        while rows.size:
+            free = self._table[slots] < 0
+            free_slots, first = np.unique(slots[free], return_index=True)
+            placed_rows = rows[free][first]
+            self._table[free_slots] = placed_rows
+            remaining = np.ones(rows.size, dtype=bool)
+            remaining[np.flatnonzero(free)[first]] = False
+            rows = rows[remaining]
+            slots = (slots[remaining] + 1) & int(mask)
+
+    def get_many(self, texts: list[str]) -> list[np.ndarray | None]:
+        """
+        Look up the vectors of several texts. Hits are returned as views into the memory-mapped
+        vector file, which is opened for writing: callers must copy them before modifying them.
+        Misses are returned as None.
+        """
+        results = []
+        with self._lock:
+            self._sync()
+            for text in texts:
+                row = -1 if self.count == 0 else self._find_row(_text_key(self.model_id, text))
+                if row < 0:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    results.append(self._vectors[row])
+        return results
+
+    def put_many(self, texts: list[str], vectors: list[list[float]]) -> None:
+        """
+        Store the vectors of several texts and persist them.
+        """
+        with self._lock, self._file_lock():
+            self._sync(locked=True)
+            written = 0
+            for text, vector in zip(texts, vectors):
+                vector = np.asarray(vector, dtype=np.float32)
+                if self.dim is None:
+                    self.dim = int(vector.shape[0])
+                    self._open_arrays("w+")
+                if vector.shape != (self.dim,):
+                    logger.warning(f"Not caching an embedding of shape {vector.shape}, the cache holds vectors of dimension {self.dim}")
+                    continue
+                key = _text_key(self.model_id, text)
+                if self._find_row(key) >= 0:
+                    continue
+                if self.count >= self.capacity:
+                    self._grow()
+                if 2 * (self.count + 1) > self.table_size:
+                    self._rebuild_table(self.table_size * 2)
+                row = self.count
+                self._keys[row] = key
+                self._vectors[row] = vector
+                self.count += 1
+                self._insert_slot(key, row)
+                written += 1
+            if written:
+                self.writes += written
+                self._persist()
+
+    def _persist(self) -> None:
+        """
+        Write the arrays, then the metadata describing them, and remove the hash table files it no
+        longer refers to. Must be called with both locks held.
+        """
+        self._keys.flush()
+        self._vectors.flush()
+        self._table.flush()
+        meta = {
+            "model_id": self.model_id,
+            "dim": self.dim,
+            "count": self.count,
+            "capacity": self.capacity,
+            "table_size": self.table_size,
+            "table_file": self.table_file,
+        }
+        tmp_path = self._meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path)
+        stat = os.stat(self._meta_path)
+        self._meta_signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        for table_path in glob.glob(self._path("index*.i64")):
+            if os.path.basename(table_path) != self.table_file:
+                os.remove(table_path)
+
+    def flush(self) -> None:
+        """
+        Write the memory-mapped arrays to disk. Every `put_many` already persists its rows and the
+        metadata, this only forces the pages out.
+        """
+        with self._lock:
+            if self.dim is None:
+                return
+            self._keys.flush()
+            self._vectors.flush()
+            self._table.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "vectors": self.count,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "writes": self.writes,
+            }
+
+
+_caches: dict[tuple[str, str], EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+_default_directory: str | None = None
+
+
+def get_embedding_cache(directory: str, model_id: str) -> EmbeddingCache:
+    """
+    Return the process-wide embedding cache of a model in a directory.
+    """
+    with _caches_lock:
+        cache_key = (os.path.abspath(directory), model_id)
+        cache = _caches.get(cache_key)
+        if cache is None:
+            cache = EmbeddingCache(directory, model_id)
+            _caches[cache_key] = cache
+        return cache
+
+
+def set_default_embedding_cache_dir(directory: str | None) -> None:
+    """
+    Set the directory used by adapters that are not given an explicit embedding cache,
+    None disables caching for them.
+    """
+    global _default_directory
+    _default_directory = directory
+
+
+def get_default_embedding_cache(model_id: str) -> EmbeddingCache | None:
+    if _default_directory is None:
+        return None
+    return get_embedding_cache(_default_directory, model_id)
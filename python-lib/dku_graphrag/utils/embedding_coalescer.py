@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable
+
+from dku_graphrag.utils.concurrency import get_llm_mesh_limiter
+from dku_graphrag.utils.tokens import count_tokens
+
+DEFAULT_MAX_BATCH_ITEMS = 256
+DEFAULT_MAX_BATCH_TOKENS = 100_000
+DEFAULT_WINDOW_SECONDS = 0.02
+
+logger = logging.getLogger(__name__)
+
+
+class _EmbeddingRequest:
+    """The texts of one caller and the future its embeddings are scattered back into."""
+
+    def __init__(self, size: int):
+        self.future = Future()
+        self.results = [None] * size
+        self.remaining = size
+        self._lock = threading.Lock()
+
+    def set_result(self, position: int, embedding) -> None:
+        # Batches holding texts of the same request can complete on different threads
+        with self._lock:
+            self.results[position] = embedding
+            self.remaining -= 1
+            done = self.remaining == 0
+        if done and not self.future.done():
+            self.future.set_result(self.results)
+
+    def set_exception(self, exc: BaseException) -> None:
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+class EmbeddingCoalescer:
+    """
+    Gathers concurrent embedding calls made over a short time window into larger LLM Mesh requests.
+
+    Texts of every caller are queued. A batch is sent as soon as it reaches `max_batch_items` texts
+    or `max_batch_tokens` tokens, and whatever remains is flushed by the first caller of the window
+    once `window_seconds` has elapsed. Large caller inputs are split over several batches. Results
+    are scattered back to each caller in the order of its texts.
+
+    :param embed_batch: Blocking function embedding a list of texts, given with the token counts the
+        batches were sized with, returning one vector per text.
+    :param encoding_name: Tokenizer the texts are counted with, the default one if None.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[list[str], list[int]], list[list[float]]],
+        max_batch_items: int = DEFAULT_MAX_BATCH_ITEMS,
+        max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+        window_seconds: float = DEFAULT_WINDOW_SECONDS,
+        encoding_name: str | None = None,
+    ):
+        self.embed_batch = embed_batch
+        self.max_batch_items = max(1, int(max_batch_items))
+        self.max_batch_tokens = max(1, int(max_batch_tokens))
+        self.window_seconds = max(0.0, float(window_seconds))
+        self.encoding_name = encoding_name
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._pending_tokens = 0
+        self._flush_scheduled = False
+        self.total_texts = 0
+        self.total_batches = 0
+
+    def _count_tokens(self, text: str) -> int:
+        if self.encoding_name:
+            return count_tokens(text, self.encoding_name)
+        return count_tokens(text)
+
+    def _enqueue(self, texts: list[str]) -> tuple[_EmbeddingRequest, list[list[tuple]], bool]:
+        """
+        Queue the texts of a caller. Returns the request, the full batches that are ready to be
+        sent right away, and whether the caller is responsible for the time-based flush.
+        """
+        request = _EmbeddingRequest(len(texts))
+        items = [(request, position, text, self._count_tokens(text)) for position, text in enumerate(texts)]
+        with self._lock:
+            self._pending.extend(items)
+            self._pending_tokens += sum(item[3] for item in items)
+            self.total_texts += len(items)
+            ready_batches = []
+            while len(self._pending) >= self.max_batch_items or self._pending_tokens >= self.max_batch_tokens:
+                ready_batches.append(self._take_batch())
+            is_leader = bool(self._pending) and not self._flush_scheduled
+            if is_leader:
+                self._flush_scheduled = True
+        return request, ready_batches, is_leader
+
+    def _take_batch(self) -> list[tuple]:
+        # Must be called with the lock held
+        batch = []
+        batch_tokens = 0
+        while self._pending and len(batch) < self.max_batch_items:
+            tokens = self._pending[0][3]
+            if batch and batch_tokens + tokens > self.max_batch_tokens:
+                break
+            batch.append(self._pending.popleft())
+            batch_tokens += tokens
+        self._pending_tokens -= batch_tokens
+        self.total_batches += 1
+        return batch
+
+    def _take_remaining_batches(self) -> list[list[tuple]]:
+        with self._lock:
+            batches = []
+            while self._pending:
+                batches.append(self._take_batch())
+            self._flush_scheduled = False
+        return batches
+
+    def _send_batch(self, batch: list[tuple]) -> None:
+        texts = [item[2] for item in batch]
+        try:
+            embeddings = self.embed_batch(texts, [item[3] for item in batch])
+            if len(embeddings) != len(texts):
+                raise ValueError(f"LLM Mesh returned {len(embeddings)} embeddings for {len(texts)} texts")
+        except BaseException as exc:
+            for request, _, _, _ in batch:
+                request.set_exception(exc)
+            return
+        for (request, position, _, _), embedding in zip(batch, embeddings):
+            request.set_result(position, embedding)
+
+    async def _dispatch(self, batches: list[list[tuple]]) -> None:
+        limiter = get_llm_mesh_limiter()
+        await asyncio.gather(*[limiter.run(self._send_batch, batch) for batch in batches])
+
+    def _dispatch_blocking(self, batches: list[list[tuple]]) -> None:
+        limiter = get_llm_mesh_limiter()
+        for batch in batches:
+            limiter.run_blocking(self._send_batch, batch)
+
+    def _flush_blocking(self) -> None:
+        self._dispatch_blocking(self._take_remaining_batches())
+
+    async def _flush_window(self) -> None:
+        """
+        Send what the callers of the window queued once it has elapsed.
+        """
+        try:
+            await asyncio.sleep(self.window_seconds)
+        except asyncio.CancelledError:
+            # Do not strand the texts of the other callers of this window
+            threading.Thread(target=self._flush_blocking, daemon=True).start()
+            raise
+        await self._dispatch(self._take_remaining_batches())
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed texts, sharing LLM Mesh requests with the other callers of the same window.
+        """
+        if not texts:
+            return []
+        request, ready_batches, is_leader = self._enqueue(texts)
+        # The window runs while the full batches are sent: it adds at most window_seconds to the
+        # partial batches of the other callers
+        dispatches = []
+        if ready_batches:
+            dispatches.append(self._dispatch(ready_batches))
+        if is_leader:
+            dispatches.append(self._flush_window())
+        if dispatches:
+            await asyncio.gather(*dispatches)
+        return await asyncio.wrap_future(request.future)
+
+    def embed_blocking(self, texts: list[str]) -> list[list[float]]:
+        """
+        Synchronous counterpart of `embed`.
+        """
+        if not texts:
+            return []
+        request, ready_batches, is_leader = self._enqueue(texts)
+        if is_leader:
+            flush = threading.Timer(self.window_seconds, self._flush_blocking)
+            flush.daemon = True
+            flush.start()
+        if ready_batches:
+            self._dispatch_blocking(ready_batches)
+        return request.future.result()
+
+    def stats(self) -> dict:
+        total_batches = self.total_batches
+        return {
+            "texts": self.total_texts,
+            "batches": total_batches,
+            "avg_batch_size": self.total_texts / total_batches if total_batches else 0.0,
+        }
+
+
+_coalescer_settings = {
+    "max_batch_items": DEFAULT_MAX_BATCH_ITEMS,
+    "max_batch_tokens": DEFAULT_MAX_BATCH_TOKENS,
+    "window_seconds": DEFAULT_WINDOW_SECONDS,
+    "encoding_name": None,
+}
+_coalescers: dict[str, EmbeddingCoalescer] = {}
+_coalescers_lock = threading.Lock()
+
+
+def configure_embedding_coalescing(
+    max_batch_items: int | None = None,
+    max_batch_tokens: int | None = None,
+    window_seconds: float | None = None,
+    encoding_name: str | None = None,
+) -> None:
+    """
+    Set the batching limits used by every embedding coalescer of the process.
+
+    :param max_batch_items: Maximum number of texts per LLM Mesh embedding request.
+    :param max_batch_tokens: Maximum total number of tokens per LLM Mesh embedding request.
+    :param window_seconds: How long concurrent calls are gathered before a partial batch is sent.
+    :param encoding_name: Tokenizer the texts are counted with, for the batch limit and the usage statistics.
+    """
+    with _coalescers_lock:
+        if max_batch_items:
+            _coalescer_settings["max_batch_items"] = int(max_batch_items)
+        if max_batch_tokens:
+            _coalescer_settings["max_batch_tokens"] = int(max_batch_tokens)
+        if window_seconds is not None:
+            _coalescer_settings["window_seconds"] = float(window_seconds)
+        if encoding_name:
+            _coalescer_settings["encoding_name"] = encoding_name
+        for coalescer in _coalescers.values():
+            coalescer.max_batch_items = _coalescer_settings["max_batch_items"]
+            coalescer.max_batch_tokens = _coalescer_settings["max_batch_tokens"]
+            coalescer.window_seconds = _coalescer_settings["window_seconds"]
+            coalescer.encoding_name = _coalescer_settings["encoding_name"]
+    logger.info(f"Embedding coalescing configured: {_coalescer_settings}")
+
+
+def get_embedding_coalescer(embedding_llm_id: str, embed_batch: Callable[[list[str], list[int]], list[list[float]]]) -> EmbeddingCoalescer:
+    """
+    Return the process-wide coalescer of an embedding LLM, creating it with `embed_batch` if needed.
+    """
+    with _coalescers_lock:
+        coalescer = _coalescers.get(embedding_llm_id)
+        if coalescer is None:
+            coalescer = EmbeddingCoalescer(embed_batch, **_coalescer_settings)
+            _coalescers[embedding_llm_id] = coalescer
+        return coalescer
+
+
+def get_embedding_coalescing_stats() -> dict:
+    with _coalescers_lock:
+        return {llm_id: coalescer.stats() for llm_id, coalescer in _coalescers.items()}
@@ -0,0 +1,83 @@
+import asyncio
+import contextvars
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncGenerator, Coroutine, Generator
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundEventLoop:
+    """
+    A long-lived event loop running in a daemon thread.
+
+    Synchronous callers, such as the request threads of an agent, submit coroutines to it instead of
+    running a loop of their own, so concurrent requests interleave on one loop and their LLM calls are
+    in flight at the same time.
+    """
+
+    def __init__(self, name: str = "graphrag-event-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coroutine: Coroutine, context: contextvars.Context | None = None) -> Future:
+        """
+        Schedule a coroutine on the loop and return a concurrent.futures.Future of its result.
+
+        :param context: Context variables the coroutine runs with, defaults to those of the calling thread.
+        """
+        if context is not None:
+            # The task is created in a copy of the context the scheduling call runs in
+            return context.run(asyncio.run_coroutine_threadsafe, coroutine, self.loop)
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine: Coroutine, timeout: float | None = None, context: contextvars.Context | None = None) -> Any:
+        """
+        Run a coroutine on the loop and block the calling thread until it completes.
+        """
+        future = self.submit(coroutine, context)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def iterate(self, async_generator: AsyncGenerator, context: contextvars.Context | None = None) -> Generator[Any, None, None]:
+        """
+        Consume an async generator running on the loop from the calling thread.
+
+        :param context: Context variables every step of the generator runs with.
+        """
+        try:
+            while True:
+                try:
+                    yield self.run(async_generator.__anext__(), context=context)
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.run(async_generator.aclose(), context=context)
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+_background_loop: BackgroundEventLoop | None = None
+_background_loop_lock = threading.Lock()
+
+
+def get_background_event_loop() -> BackgroundEventLoop:
+    """
+    Return the process-wide background event loop, starting it if needed.
+    """
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = BackgroundEventLoop()
+            logger.info("Started the background event loop")
+        return _background_loop
@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import shutil
+import time
+
+INDEX_MANIFEST_FILE_NAME = "index_manifest.json"
+# Each build writes its tables and vector store to a directory of its own, named after its generation
+GENERATIONS_DIR_NAME = "generations"
+VECTOR_STORE_DIR_NAME = "lancedb"
+# Output directory of the indexes built before generation directories
+LEGACY_OUTPUT_DIR_NAME = "output"
+
+logger = logging.getLogger(__name__)
+
+
+def write_index_manifest(folder_path: str, generation: str, output_dir: str, **properties) -> dict:
+    """
+    Publish a new index generation. The manifest lists the size of every file of the output
+    directory and is written atomically once the build is complete, so readers can tell a
+    finished index from one still being written.
+
+    :param folder_path: Root of the managed folder holding the index.
+    :param generation: Unique id of the build, typically its run id.
+    :param output_dir: Directory holding the graphrag output tables.
+    :param properties: Additional properties recorded in the manifest (LLM ids, build mode...).
+    """
+    files = {}
+    for file_name in sorted(os.listdir(output_dir)):
+        file_path = os.path.join(output_dir, file_name)
+        if os.path.isfile(file_path):
+            files[file_name] = os.path.getsize(file_path)
+    manifest = {
+        "generation": generation,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "output_dir": os.path.relpath(output_dir, folder_path),
+        "files": files,
+        **properties,
+    }
+    manifest_path = os.path.join(folder_path, INDEX_MANIFEST_FILE_NAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    logger.info(f"Published index generation {generation} with {len(files)} files")
+    return manifest
+
+
+def read_index_manifest(folder_path: str) -> dict | None:
+    """
+    Read the manifest of the current index generation, None if the index predates manifests.
+    """
+    manifest_path = os.path.join(folder_path, INDEX_MANIFEST_FILE_NAME)
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def is_index_complete(folder_path: str, manifest: dict) -> bool:
+    """
+    Check that the files of the output directory still match the sizes recorded in the manifest,
+    i.e. that no newer build is rewriting them.
+    """
+    output_dir = os.path.join(folder_path, manifest["output_dir"])
+    for file_name, size in manifest["files"].items():
+        file_path = os.path.join(output_dir, file_name)
+        if not os.path.exists(file_path) or os.path.getsize(file_path) != size:
+            logger.debug(f"Index file {file_path} does not match the manifest")
+            return False
+    return True
+
+
+def get_generation_dir(folder_path: str, generation: str) -> str:
+    """
+    Directory holding the tables of an index generation, the vector store in its `lancedb` subdirectory.
+    """
+    return os.path.join(folder_path, GENERATIONS_DIR_NAME, generation)
+
+
+def stage_generation(source_dir: str, target_dir: str) -> None:
+    """
+    Start a generation from the tables of another one. The files are hard-linked when possible:
+    replacing a table of the new generation leaves the source one untouched.
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    for file_name in os.listdir(source_dir):
+        source_path = os.path.join(source_dir, file_name)
+        if not os.path.isfile(source_path):
+            continue
+        target_path = os.path.join(target_dir, file_name)
+        try:
+            os.link(source_path, target_path)
+        except OSError:
+            shutil.copy2(source_path, target_path)
+
+
+def remove_stale_generations(folder_path: str, keep_dirs: list[str]) -> list[str]:
+    """
+    Remove the generation directories other than `keep_dirs`, typically the published generation and
+    the previous one that agents serve until they reload, and the legacy output directory.
+    Returns the removed directories.
+    """
+    keep_dirs = {os.path.realpath(path) for path in keep_dirs if path}
+    generations_dir = os.path.join(folder_path, GENERATIONS_DIR_NAME)
+    candidates = [os.path.join(folder_path, LEGACY_OUTPUT_DIR_NAME)]
+    if os.path.isdir(generations_dir):
+        candidates += [os.path.join(generations_dir, name) for name in sorted(os.listdir(generations_dir))]
+    removed = []
+    for path in candidates:
+        if os.path.isdir(path) and os.path.realpath(path) not in keep_dirs:
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path)
+    if removed:
+        logger.info(f"Removed {len(removed)} stale index generations: {removed}")
+    return removed
@@ -0,0 +1,86 @@
+import json
+import logging
+import re
+from typing import Any
+
+from json_repair import repair_json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_REPAIR_PROMPT = """The response below should be a single JSON object{schema_hint}, but it is not valid: {error}
+
+Return only the corrected JSON object, without any explanation or markdown.
+
+Response:
+{response}"""
+MAX_ERROR_LENGTH = 1000
+
+_CODE_FENCE_PATTERN = re.compile(r'```json\s*|\s*```')
+
+logger = logging.getLogger(__name__)
+
+
+def strip_code_fences(text: str) -> str:
+    """
+    Remove markdown code fences, only scanning the text when it contains one.
+    """
+    if "```" not in text:
+        return text
+    return _CODE_FENCE_PATTERN.sub("", text)
+
+
+def extract_json_object(text: str) -> str:
+    """
+    The outermost JSON object of an LLM response, dropping the markdown fences or the sentences
+    around it. Only looks for the first opening and the last closing brace, no regex over the text.
+    """
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end < start:
+        return text.strip()
+    return text[start:end + 1]
+
+
+def loads(text: str | bytes) -> Any:
+    """
+    json.loads, with orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def parse_json_model(text: str, json_model: Any) -> Any:
+    """
+    Validate a JSON text against a pydantic model, in a single pass with `model_validate_json`
+    when the model supports it. Raises a ValueError if the text is not a valid instance.
+    """
+    if hasattr(json_model, "model_validate_json"):
+        return json_model.model_validate_json(text)
+    return json_model(**loads(text))
+
+
+def repair_json_text(text: str) -> str | None:
+    """
+    Fix the usual syntax errors of LLM JSON (truncation, trailing commas, single quotes...) locally.
+    Returns None if nothing could be recovered.
+    """
+    try:
+        repaired = repair_json(text)
+    except Exception:
+        logger.debug("Local JSON repair failed", exc_info=True)
+        return None
+    return repaired if isinstance(repaired, str) and repaired not in ("", '""', "{}") else None
+
+
+def build_repair_prompt(response_text: str, error: Exception, json_model: Any = None) -> str:
+    """
+    Ask the LLM to fix a broken response, without resending the prompt that produced it.
+    """
+    schema_hint = ""
+    if hasattr(json_model, "model_json_schema"):
+        schema_hint = f" matching the JSON schema {json.dumps(json_model.model_json_schema())}"
+    return JSON_REPAIR_PROMPT.format(schema_hint=schema_hint, error=str(error)[:MAX_ERROR_LENGTH], response=response_text)
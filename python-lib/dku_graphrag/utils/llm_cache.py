@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any
+
+DEFAULT_MAX_SIZE_MB = 2048
+CACHE_DIR_NAME = ".dku_cache"
+
+logger = logging.getLogger(__name__)
+
+
+def get_cache_dir(folder_path: str) -> str:
+    """
+    Return (and create) the cache directory of a managed folder.
+    The index-builder recipe keeps this directory when it cleans the output folder.
+    """
+    cache_dir = os.path.join(folder_path, CACHE_DIR_NAME)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def _normalize_messages(messages: list[Any]) -> list[tuple[str, str]]:
+    normalized = []
+    for msg in messages:
+        if isinstance(msg, str):
+            role, content = "user", msg
+        elif isinstance(msg, dict):
+            role, content = msg.get("role", "user"), msg.get("content", "")
+        else:
+            role, content = getattr(msg, "role", "assistant"), getattr(msg, "content", "")
+        normalized.append((role, " ".join(str(content or "").split())))
+    return normalized
+
+
+class SQLiteLLMCache:
+    """
+    Persistent, content-addressed cache of LLM responses stored in a local SQLite file.
+
+    Entries are keyed on a hash of (llm_id, normalized messages, json mode, model parameters).
+    When the total size of the stored responses exceeds `max_size_bytes`, the least recently
+    used entries are evicted.
+    """
+
+    def __init__(self, path: str, max_size_bytes: int = DEFAULT_MAX_SIZE_MB * 1024 * 1024):
+        self.path = path
+        self.max_size_bytes = max_size_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache(last_access)")
+        self._total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        logger.info(f"LLM response cache opened at {path} ({self._total_size / 1024 / 1024:.1f} MB)")
+
+    @staticmethod
+    def make_key(llm_id: str, messages: list[Any], json_mode: bool = False, model_parameters: dict | None = None) -> str:
+        payload = json.dumps(
+            {
+                "llm_id": llm_id,
+                "messages": _normalize_messages(messages),
+                "json": bool(json_mode),
+                "model_parameters": model_parameters or {},
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._total_size += size - (previous[0] if previous else 0)
+            self.writes += 1
+            if self._total_size > self.max_size_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # Must be called with the lock held. Evict down to 90% of the budget so that eviction
+        # does not run again on the next write.
+        target = int(self.max_size_bytes * 0.9)
+        rows = self._conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access ASC").fetchall()
+        evicted_keys = []
+        for key, size in rows:
+            if self._total_size <= target:
+                break
+            evicted_keys.append((key,))
+            self._total_size -= size
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", evicted_keys)
+        self.evictions += len(evicted_keys)
+        logger.debug(f"Evicted {len(evicted_keys)} entries from the LLM response cache")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "size_mb": self._total_size / 1024 / 1024,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
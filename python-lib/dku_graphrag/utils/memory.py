@@ -0,0 +1,25 @@
+import os
+import resource
+import sys
+
+
+def get_rss_bytes() -> int:
+    """
+    Current resident set size of the process, in bytes. Falls back to the peak RSS on
+    platforms without /proc.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return get_peak_rss_bytes()
+
+
+def get_peak_rss_bytes() -> int:
+    """
+    Peak resident set size of the process, in bytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak if sys.platform == "darwin" else peak * 1024
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import random
+import re
+from typing import Any, Awaitable, Callable, TypeVar
+
+from dku_graphrag.utils.concurrency import get_llm_mesh_limiter
+from dku_graphrag.utils.telemetry import get_usage_tracker
+
+THROTTLED = "throttled"
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+DEFAULT_MAX_ATTEMPTS = 6
+DEFAULT_BASE_DELAY_SECONDS = 1.0
+DEFAULT_MAX_DELAY_SECONDS = 60.0
+
+_THROTTLED_PATTERN = re.compile(r"\b429\b|rate.?limit|too many requests|throttl|quota|capacity exceeded|tokens per min", re.IGNORECASE)
+_TRANSIENT_PATTERN = re.compile(
+    r"\b(500|502|503|504|529)\b|time.?out|timed out|temporar|unavailable|overloaded|connection (reset|refused|aborted)|bad gateway|try again",
+    re.IGNORECASE,
+)
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class LLMMeshError(Exception):
+    """
+    An LLM Mesh request that failed, with the kind of failure.
+
+    :param kind: THROTTLED, TRANSIENT or PERMANENT.
+    """
+
+    def __init__(self, message: str, kind: str = PERMANENT):
+        super().__init__(message)
+        self.kind = kind
+
+
+def classify_error(error: BaseException | str) -> str:
+    """
+    Tell throttling (retry later, with less concurrency), transient failures (retry) and permanent
+    ones (invalid request, content filter, context too long: retrying cannot help) apart.
+    """
+    if isinstance(error, LLMMeshError):
+        return error.kind
+    if isinstance(error, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return TRANSIENT
+    message = str(error)
+    if _THROTTLED_PATTERN.search(message):
+        return THROTTLED
+    if _TRANSIENT_PATTERN.search(message):
+        return TRANSIENT
+    return PERMANENT
+
+
+def response_error(resp: Any) -> LLMMeshError:
+    """
+    The error of an unsuccessful LLM Mesh completion response, classified from its error message.
+    """
+    raw = getattr(resp, "_raw", None)
+    message = (raw.get("errorMessage") if isinstance(raw, dict) else None) or getattr(resp, "text", None) or "unknown error"
+    return LLMMeshError(f"LLM Mesh completion failed: {message}", classify_error(message))
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: the n-th retry waits a random delay between 0 and
+    min(max_delay, base_delay * 2^n). Permanent errors are not retried.
+
+    :param max_attempts: Total number of attempts, including the first one.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        base_delay_seconds: float = DEFAULT_BASE_DELAY_SECONDS,
+        max_delay_seconds: float = DEFAULT_MAX_DELAY_SECONDS,
+    ):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+
+    def delay(self, retry: int) -> float:
+        return random.uniform(0, min(self.max_delay_seconds, self.base_delay_seconds * 2 ** retry))
+
+    async def run(self, call: Callable[[], Awaitable[T]], description: str = "LLM Mesh request") -> T:
+        """
+        Await `call()` until it succeeds, retrying throttled and transient failures. Throttling is
+        reported to the LLM Mesh limiter so that it lowers the number of in-flight requests.
+        """
+        limiter = get_llm_mesh_limiter()
+        for attempt in range(self.max_attempts):
+            try:
+                result = await call()
+            except Exception as e:
+                kind = classify_error(e)
+                if kind == THROTTLED:
+                    limiter.report_throttled()
+                if kind == PERMANENT or attempt + 1 >= self.max_attempts:
+                    raise
+                delay = self.delay(attempt)
+                get_usage_tracker().add(retries=1)
+                logger.warning(f"{description} failed ({kind}), retry {attempt + 1}/{self.max_attempts - 1} in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                continue
+            limiter.report_success()
+            return result
@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from dku_graphrag.utils.concurrency import get_llm_mesh_limiter
+from dku_graphrag.utils.tokens import DEFAULT_ENCODING_MODEL
+
+BUILD_STATS_FILE_NAME = "build_stats.json"
+# LLM calls made outside of a graphrag workflow (recipe setup, context index...)
+OUTSIDE_WORKFLOWS = "other"
+COUNTERS = (
+    "llm_calls",
+    "llm_errors",
+    "llm_seconds",
+    "prompt_tokens",
+    "completion_tokens",
+    "estimated_token_calls",
+    "cache_hits",
+    "retries",
+    "json_parse_failures",
+    "json_repairs",
+    "json_repair_calls",
+    "embedding_requests",
+    "embedded_texts",
+    "embedding_tokens",
+    "embedding_cache_hits",
+)
+
+logger = logging.getLogger(__name__)
+
+
+class UsageTracker:
+    """
+    Aggregates the LLM usage of an index build per graphrag workflow: duration, LLM calls, token
+    counts, cache hits, retries, JSON repairs and the time requests waited for an LLM Mesh slot.
+
+    graphrag runs its workflows one after the other, so calls are attributed to the workflow
+    started last. Token counts are estimated with `encoding_name` when the LLM Mesh omits them.
+    """
+
+    def __init__(self, encoding_name: str = DEFAULT_ENCODING_MODEL):
+        self.encoding_name = encoding_name
+        self.started_at = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        self._start_time = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stages: dict[str, dict] = {}
+        self._current_stage = OUTSIDE_WORKFLOWS
+        self._stage_start: dict[str, tuple[float, dict]] = {}
+
+    def _stage(self, name: str) -> dict:
+        # Must be called with the lock held
+        if name not in self._stages:
+            self._stages[name] = {"duration_seconds": 0.0, "queue_wait_seconds": 0.0, "queued_requests": 0, **{c: 0 for c in COUNTERS}}
+        return self._stages[name]
+
+    def start_stage(self, name: str) -> None:
+        limiter_stats = get_llm_mesh_limiter().stats()
+        with self._lock:
+            self._stage(name)
+            self._current_stage = name
+            self._stage_start[name] = (time.perf_counter(), limiter_stats)
+
+    def end_stage(self, name: str) -> None:
+        limiter_stats = get_llm_mesh_limiter().stats()
+        with self._lock:
+            started = self._stage_start.pop(name, None)
+            if started is not None:
+                start_time, start_stats = started
+                stage = self._stage(name)
+                stage["duration_seconds"] += time.perf_counter() - start_time
+                stage["queue_wait_seconds"] += limiter_stats["total_wait_seconds"] - start_stats["total_wait_seconds"]
+                stage["queued_requests"] += limiter_stats["total_requests"] - start_stats["total_requests"]
+            if self._current_stage == name:
+                self._current_stage = OUTSIDE_WORKFLOWS
+
+    def add(self, **counters) -> None:
+        """
+        Add to the counters of the current stage.
+        """
+        with self._lock:
+            stage = self._stage(self._current_stage)
+            for name, value in counters.items():
+                stage[name] += value
+
+    def record_llm_call(self, prompt_tokens: int, completion_tokens: int, seconds: float, success: bool = True, estimated: bool = False) -> None:
+        self.add(
+            llm_calls=1,
+            llm_errors=0 if success else 1,
+            llm_seconds=seconds,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            estimated_token_calls=1 if estimated else 0,
+        )
+
+    def record_embedding_request(self, texts: int, tokens: int) -> None:
+        self.add(embedding_requests=1, embedded_texts=texts, embedding_tokens=tokens)
+
+    def summary(self) -> dict:
+        with self._lock:
+            stages = {name: dict(stage) for name, stage in self._stages.items()}
+        totals = {c: sum(stage[c] for stage in stages.values()) for c in ("queue_wait_seconds", "queued_requests", *COUNTERS)}
+        total_tokens = totals["prompt_tokens"] + totals["completion_tokens"]
+        for stage in stages.values():
+            stage["token_share"] = (stage["prompt_tokens"] + stage["completion_tokens"]) / total_tokens if total_tokens else 0.0
+        return {
+            "started_at": self.started_at,
+            "wall_seconds": time.perf_counter() - self._start_time,
+            "encoding_model": self.encoding_name,
+            "totals": totals,
+            "stages": stages,
+        }
+
+    def to_records(self) -> list[dict]:
+        """
+        One row per stage, for a Dataiku dataset.
+        """
+        summary = self.summary()
+        return [
+            {"started_at": summary["started_at"], "stage": name, **stage}
+            for name, stage in summary["stages"].items()
+        ]
+
+    def write(self, path: str) -> dict:
+        """
+        Write the summary as JSON, atomically.
+        """
+        summary = self.summary()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(summary, f, indent=2)
+        os.replace(tmp_path, path)
+        return summary
+
+    def log_summary(self) -> None:
+        summary = self.summary()
+        for name, stage in sorted(summary["stages"].items(), key=lambda item: -item[1]["duration_seconds"]):
+            logger.info(
+                f"Stage {name}: {stage['duration_seconds']:.1f}s, {stage['llm_calls']} LLM calls "
+                f"({stage['llm_errors']} failed, {stage['cache_hits']} cached, {stage['retries']} retries), "
+                f"{stage['prompt_tokens']} prompt and {stage['completion_tokens']} completion tokens, "
+                f"{stage['json_parse_failures']} invalid JSON responses ({stage['json_repairs']} repaired), "
+                f"{stage['embedded_texts']} texts embedded in {stage['embedding_requests']} requests, "
+                f"{stage['queue_wait_seconds']:.1f}s waiting for the LLM Mesh"
+            )
+        logger.info(f"Build usage totals: {summary['totals']}")
+
+
+_tracker: UsageTracker | None = None
+_tracker_lock = threading.Lock()
+
+
+def get_usage_tracker() -> UsageTracker:
+    """
+    Return the process-wide usage tracker, creating it if needed.
+    """
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = UsageTracker()
+        return _tracker
+
+
+def configure_usage_tracker(encoding_name: str = DEFAULT_ENCODING_MODEL) -> UsageTracker:
+    """
+    Start a new process-wide usage tracker, typically once per index build.
+
+    :param encoding_name: Tokenizer used to estimate the token counts the LLM Mesh does not report.
+    """
+    global _tracker
+    with _tracker_lock:
+        _tracker = UsageTracker(encoding_name)
+        return _tracker
@@ -0,0 +1,33 @@
+import functools
+import logging
+
+DEFAULT_ENCODING_MODEL = "cl100k_base"
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def get_token_encoder(encoding_name: str = DEFAULT_ENCODING_MODEL):
+    """
+    Return the tiktoken encoding with the given name, or None if tiktoken is not available.
+    Encodings are loaded once per process.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken is not installed, token counts will be estimated from text length")
+        return None
+    return tiktoken.get_encoding(encoding_name)
+
+
+def count_tokens(text: str, encoding_name: str = DEFAULT_ENCODING_MODEL) -> int:
+    """
+    Count the tokens of a text with the configured tokenizer, falling back to a
+    4-characters-per-token estimate when no tokenizer is available.
+    """
+    if not text:
+        return 0
+    encoder = get_token_encoder(encoding_name)
+    if encoder is None:
+        return len(text) // 4 + 1
+    return len(encoder.encode(text, disallowed_special=()))
@@ -0,0 +1,51 @@
+import importlib.util
+import os
+import sys
+import types
+
+# The plugin modules are imported from python-lib, as in the code env of the plugin
+PYTHON_LIB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PYTHON_LIB_DIR not in sys.path:
+    sys.path.insert(0, PYTHON_LIB_DIR)
+
+
+def _stub_module(name: str, **attributes) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
+def _not_in_dss(*args, **kwargs):
+    raise RuntimeError("dataiku is only available inside DSS, patch it in the test")
+
+
+def _install_dataiku_stubs() -> None:
+    """
+    The dataiku and dataikuapi packages only exist inside DSS. Outside of it, stand-ins providing
+    the names the plugin modules import are registered, and tests patch in the behaviour they need.
+    """
+    if importlib.util.find_spec("dataiku") is None:
+        _stub_module("dataiku", Folder=_not_in_dss, Dataset=_not_in_dss, api_client=_not_in_dss)
+        _stub_module("dataiku.llm")
+        _stub_module("dataiku.llm.python", BaseLLM=type("BaseLLM", (), {}))
+        _stub_module("dataiku.langchain")
+        _stub_module("dataiku.langchain.dku_tracer", LangchainToDKUTracer=type("LangchainToDKUTracer", (), {}))
+    if importlib.util.find_spec("dataikuapi") is None:
+        class _StreamedCompletionEvent:
+            def __init__(self, data: dict):
+                self.data = data
+
+        _stub_module("dataikuapi")
+        _stub_module("dataikuapi.dss")
+        _stub_module(
+            "dataikuapi.dss.llm",
+            DSSLLMStreamedCompletionChunk=type("DSSLLMStreamedCompletionChunk", (_StreamedCompletionEvent,), {}),
+            DSSLLMStreamedCompletionFooter=type("DSSLLMStreamedCompletionFooter", (_StreamedCompletionEvent,), {}),
+        )
+
+
+_install_dataiku_stubs()
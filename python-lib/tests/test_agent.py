@@ -0,0 +1,101 @@
+import importlib.util
+import os
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("graphrag")
+
+AGENT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "python-agents", "graphrag", "agent.py")
+
+
+@pytest.fixture(scope="module")
+def agent_module():
+    # Loaded under its own name: the agent directory is named like the graphrag package
+    spec = importlib.util.spec_from_file_location("graphrag_agent", AGENT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def loaded_indexes(agent_module, tmp_path, monkeypatch):
+    """
+    Index folders of the agent, each holding a published index generation that loads as a stand-in.
+    """
+    loads = []
+    rendered_settings = []
+
+    def folder(folder_id):
+        return SimpleNamespace(get_path=lambda: str(tmp_path / folder_id))
+
+    def load_index_generation(folder_id, folder_path, search_type, **kwargs):
+        output_folder = Path(folder_path) / "output"
+        output_folder.mkdir(parents=True, exist_ok=True)
+        (output_folder / agent_module.INDEX_TABLE_FILES["entities"]).touch()
+        loads.append((folder_id, search_type, kwargs["require_complete"]))
+        return SimpleNamespace(
+            folder_id=folder_id,
+            version=f"{folder_id}-v1",
+            output_folder=output_folder,
+            graphrag_config=SimpleNamespace(encoding_model="cl100k_base", llm=SimpleNamespace(model="chat-llm")),
+            nodes=None,
+            entities=None,
+            communities=None,
+            community_reports=None,
+        )
+
+    def count_global_context_rows(*args, **kwargs):
+        rendered_settings.append(kwargs)
+
+    monkeypatch.setattr(agent_module.dataiku, "Folder", folder)
+    monkeypatch.setattr(agent_module, "load_index_generation", load_index_generation)
+    monkeypatch.setattr(agent_module, "count_global_context_rows", count_global_context_rows)
+    return SimpleNamespace(loads=loads, rendered_settings=rendered_settings)
+
+
+def _config(**overrides) -> dict:
+    config = {
+        "index_folder_id": "index",
+        "search_type": "global",
+        "use_embedding_cache": False,
+        "rank_community_reports": False,
+        "index_reload_interval": 0,
+    }
+    config.update(overrides)
+    return config
+
+
+def test_agent_starts_on_sharded_indexes(agent_module, loaded_indexes):
+    llm = agent_module.MyLLM()
+    llm.set_config(_config(shard_index_folder_ids=["shard", ""], dynamic_community_selection=True), {})
+
+    assert sorted(loaded_indexes.loads) == [("index", "global", False), ("shard", "global", False)]
+    assert llm.index.version == "index-v1+shard-v1"
+    assert llm.index_reloaders == []
+    # The token counts of each shard are precomputed with the search settings of the agent
+    assert [settings["dynamic_community_selection"] for settings in loaded_indexes.rendered_settings] == [True, True]
+    for folder_id in ("index", "shard"):
+        assert (Path(llm.folder_paths[0]).parent / folder_id / "output" / "token_counts.npz").exists()
+
+
+def test_agent_answers_and_caches_queries(agent_module, loaded_indexes, monkeypatch):
+    searches = []
+
+    async def ranked_global_search(config, query, **kwargs):
+        searches.append(query)
+        return "The answer.", {"reports": []}
+
+    monkeypatch.setattr(agent_module, "ranked_global_search", ranked_global_search)
+    llm = agent_module.MyLLM()
+    llm.set_config(_config(), {})
+
+    for _ in range(2):
+        trace = SimpleNamespace(attributes={})
+        result = llm.process({"messages": [{"content": "Who founded the company?"}]}, {}, trace)
+        assert result["text"].startswith("The answer.")
+        assert '"reports": []' in result["text"]
+
+    assert searches == ["Who founded the company?"]
+    assert trace.attributes["graphrag_query_cache"]["query_cache"] == "hit"
@@ -0,0 +1,254 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from dku_graphrag.utils.concurrency import AdaptiveConcurrency, CrossLoopSemaphore, LLMMeshLimiter, TokenBucket
+
+
+class _InFlightProbe:
+    """Blocking call recording how many of its invocations run at the same time."""
+
+    def __init__(self, seconds: float = 0.02):
+        self.seconds = seconds
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, value=None):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.seconds)
+        with self._lock:
+            self.in_flight -= 1
+        return value
+
+
+def test_semaphore_bounds_threads_and_coroutines_of_several_loops():
+    semaphore = CrossLoopSemaphore(2)
+    probe = _InFlightProbe()
+
+    def hold_blocking():
+        semaphore.acquire_blocking()
+        try:
+            probe()
+        finally:
+            semaphore.release()
+
+    async def hold():
+        await semaphore.acquire()
+        try:
+            await asyncio.to_thread(probe)
+        finally:
+            semaphore.release()
+
+    async def run_loop():
+        await asyncio.gather(*[hold() for _ in range(4)])
+
+    threads = [threading.Thread(target=hold_blocking) for _ in range(4)]
+    threads += [threading.Thread(target=asyncio.run, args=(run_loop(),)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert probe.max_in_flight == 2
+    assert semaphore.in_flight == 0
+    assert semaphore.waiting == 0
+
+
+def test_semaphore_serves_waiters_in_order():
+    semaphore = CrossLoopSemaphore(1)
+    order = []
+
+    async def main():
+        await semaphore.acquire()
+
+        async def wait(name):
+            await semaphore.acquire()
+            order.append(name)
+            semaphore.release()
+
+        waiters = [asyncio.create_task(wait(name)) for name in "abc"]
+        await asyncio.sleep(0)
+        semaphore.release()
+        await asyncio.gather(*waiters)
+
+    asyncio.run(main())
+    assert order == ["a", "b", "c"]
+
+
+def test_cancelled_waiter_does_not_leak_its_slot():
+    semaphore = CrossLoopSemaphore(1)
+
+    async def main():
+        await semaphore.acquire()
+        waiter = asyncio.create_task(semaphore.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        semaphore.release()
+        await asyncio.wait_for(semaphore.acquire(), timeout=1)
+        semaphore.release()
+
+    asyncio.run(main())
+    assert semaphore.in_flight == 0
+
+
+def test_waiter_of_a_closed_loop_is_skipped():
+    semaphore = CrossLoopSemaphore(1)
+    semaphore.acquire_blocking()
+    loop = asyncio.new_event_loop()
+    loop.create_task(semaphore.acquire())
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+    blocking_waiter = threading.Thread(target=semaphore.acquire_blocking, daemon=True)
+    blocking_waiter.start()
+    while semaphore.waiting < 2:
+        time.sleep(0.001)
+
+    releaser = threading.Thread(target=semaphore.release, daemon=True)
+    releaser.start()
+    releaser.join(timeout=1)
+    blocking_waiter.join(timeout=1)
+
+    assert not releaser.is_alive()
+    # The slot goes to the next waiter instead of the closed loop
+    assert not blocking_waiter.is_alive()
+    assert semaphore.in_flight == 1
+    assert semaphore.waiting == 0
+
+
+def test_raising_the_limit_wakes_waiters():
+    semaphore = CrossLoopSemaphore(1)
+
+    async def main():
+        await semaphore.acquire()
+        waiter = asyncio.create_task(semaphore.acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        semaphore.set_limit(2)
+        await asyncio.wait_for(waiter, timeout=1)
+
+    asyncio.run(main())
+    assert semaphore.in_flight == 2
+
+
+def test_token_bucket_spaces_requests_beyond_the_burst():
+    bucket = TokenBucket(rate=10, burst=2)
+    delays = [bucket.reserve() for _ in range(4)]
+    assert delays[:2] == [0.0, 0.0]
+    assert delays[2] == pytest.approx(0.1, abs=0.02)
+    assert delays[3] == pytest.approx(0.2, abs=0.02)
+
+
+def test_limiter_bounds_in_flight_requests_of_run_and_run_blocking():
+    limiter = LLMMeshLimiter(max_in_flight=3)
+    probe = _InFlightProbe()
+
+    async def main():
+        return await asyncio.gather(*[limiter.run(probe, i) for i in range(10)])
+
+    blocking = [threading.Thread(target=limiter.run_blocking, args=(probe,)) for _ in range(5)]
+    for thread in blocking:
+        thread.start()
+    assert asyncio.run(main()) == list(range(10))
+    for thread in blocking:
+        thread.join()
+
+    stats = limiter.stats()
+    assert probe.max_in_flight == 3
+    assert stats["total_requests"] == 15
+    assert stats["in_flight"] == 0
+
+
+def test_limiter_holds_the_slot_of_a_cancelled_call_until_it_finishes():
+    limiter = LLMMeshLimiter(max_in_flight=1)
+    release = threading.Event()
+
+    async def main():
+        call = asyncio.create_task(limiter.run(release.wait))
+        await asyncio.sleep(0.05)
+        call.cancel()
+        await asyncio.sleep(0.01)
+        assert limiter.stats()["in_flight"] == 1
+        release.set()
+        await asyncio.wait_for(limiter.run(lambda: None), timeout=1)
+
+    asyncio.run(main())
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_limiter_streams_items_and_propagates_errors():
+    limiter = LLMMeshLimiter(max_in_flight=1)
+
+    def tokens():
+        yield "a"
+        yield "b"
+        raise ValueError("stream broken")
+
+    async def main():
+        received = []
+        with pytest.raises(ValueError, match="stream broken"):
+            async for token in limiter.stream(tokens):
+                received.append(token)
+        return received
+
+    assert asyncio.run(main()) == ["a", "b"]
+    assert list(limiter.stream_blocking(lambda: iter("xyz"))) == ["x", "y", "z"]
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_adaptive_concurrency_halves_the_limit_once_per_cooldown():
+    semaphore = CrossLoopSemaphore(16)
+    controller = AdaptiveConcurrency(semaphore, max_limit=16, cooldown_seconds=60)
+    # Requests in flight when throttling starts fail together: a single decrease
+    for _ in range(5):
+        controller.on_throttled()
+    assert semaphore.limit == 8
+    assert controller.throttled == 5
+    assert controller.decreases == 1
+
+    controller.cooldown_seconds = 0
+    for _ in range(10):
+        controller.on_throttled()
+    assert semaphore.limit == 1
+
+
+def test_adaptive_concurrency_grows_by_one_per_window_of_successes():
+    semaphore = CrossLoopSemaphore(4)
+    controller = AdaptiveConcurrency(semaphore, max_limit=6)
+    for _ in range(3):
+        controller.on_success()
+    assert semaphore.limit == 4
+    controller.on_success()
+    assert semaphore.limit == 5
+    # Throttling halves the limit, it then grows back one window at a time up to max_limit
+    for _ in range(4):
+        controller.on_success()
+    controller.on_throttled()
+    assert semaphore.limit == 2
+    for _ in range(2 + 3 + 4 + 5 + 6 + 10):
+        controller.on_success()
+    assert semaphore.limit == 6
+
+
+def test_limiter_only_adapts_when_adaptive():
+    static = LLMMeshLimiter(max_in_flight=8)
+    static.report_throttled()
+    assert static.stats()["max_in_flight"] == 8
+    assert "throttled_requests" not in static.stats()
+
+    adaptive = LLMMeshLimiter(max_in_flight=8, adaptive=True)
+    adaptive.report_throttled()
+    stats = adaptive.stats()
+    assert stats["max_in_flight"] == 4
+    assert stats["configured_max_in_flight"] == 8
+    assert stats["throttled_requests"] == 1
+    assert stats["limit_decreases"] == 1
+
+    adaptive.configure(max_in_flight=2)
+    assert adaptive.stats()["max_in_flight"] == 2
@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+import dku_graphrag.index.context_index as context_index_module
+from dku_graphrag.index.context_index import ContextIndex, build_context_index
+
+
+@pytest.fixture
+def output_dir(tmp_path, monkeypatch):
+    # Token counts are estimated from the text length
+    monkeypatch.setattr(context_index_module, "get_token_encoder", lambda encoding_name: None)
+    tables = {
+        "entities": pd.DataFrame({
+            "id": ["e1", "e2", "e3"],
+            "title": ["ALPHA", "BETA", "GAMMA"],
+            "text_unit_ids": [["t1"], ["t1", "t2"], []],
+        }),
+        "relationships": pd.DataFrame({"id": ["r1", "r2"], "source": ["ALPHA", "BETA"], "target": ["BETA", "GAMMA"]}),
+        "text_units": pd.DataFrame({"id": ["t1", "t2"], "text": ["first text unit", "second"]}),
+        "community_reports": pd.DataFrame({"id": ["c0", "c1", "c2"], "community": [0, 1, 2], "full_content": ["report 0", "report 1", "report 2"]}),
+        # One row per level of each entity, community 3 has no report
+        "nodes": pd.DataFrame({
+            "id": ["e1", "e1", "e2", "e2", "e3", "e3"],
+            "community": [0, 1, 0, 2, 0, 3],
+        }),
+    }
+    for name, table in tables.items():
+        table.to_parquet(tmp_path / f"create_final_{name}.parquet")
+    return tmp_path
+
+
+def test_neighbors_of_entities_are_looked_up(output_dir):
+    build_context_index(str(output_dir))
+    index = ContextIndex.load(str(output_dir))
+
+    assert index.relationship_ids[index.relationship_positions(["e2"])].tolist() == ["r1", "r2"]
+    assert index.text_unit_ids[index.text_unit_positions("e2")].tolist() == ["t1", "t2"]
+    assert index.text_unit_positions("unknown").tolist() == []
+    assert index.report_tokens_by_community["1"] == len("report 1") // 4 + 1
+
+
+def test_communities_of_every_level_with_a_report_are_looked_up(output_dir):
+    build_context_index(str(output_dir))
+    index = ContextIndex.load(str(output_dir))
+
+    assert index.community_ids("e1") == ["0", "1"]
+    assert index.community_ids("e2") == ["0", "2"]
+    assert index.community_ids("e3") == ["0"]
+    assert index.community_ids("unknown") == []
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+import dku_graphrag.utils.deadline as deadline_module
+from dku_graphrag.utils.deadline import (
+    CONTEXT_SHRUNK,
+    LLM_CALL_TIMED_OUT,
+    Deadline,
+    DeadlineExceededError,
+    check_deadline,
+    deadline_context,
+    deadline_context_tokens,
+    get_deadline,
+    with_deadline,
+)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(deadline_module, "time", clock)
+    return clock
+
+
+def _run(coroutine, deadline: Deadline | None):
+    return deadline_context(deadline).run(asyncio.run, coroutine)
+
+
+async def _answer(seconds: float = 0.0) -> str:
+    await asyncio.sleep(seconds)
+    return "answer"
+
+
+def test_without_deadline_nothing_is_limited():
+    assert _run(with_deadline(_answer()), None) == "answer"
+    assert deadline_context(None).run(deadline_context_tokens, 8000) == 8000
+    deadline_context(None).run(check_deadline)
+
+
+def test_calls_outliving_the_deadline_are_cancelled():
+    deadline = Deadline(0.05)
+    with pytest.raises(DeadlineExceededError, match="0.05s"):
+        _run(with_deadline(_answer(seconds=5)), deadline)
+    assert deadline.degradations == [LLM_CALL_TIMED_OUT]
+
+
+def test_reserved_calls_leave_time_for_the_answer(clock):
+    deadline = Deadline(10)
+    clock.now += 7.5
+    # 2.5s are left, less than the 3s kept for writing the answer
+    assert deadline.stage_remaining() == 0.0
+    with pytest.raises(DeadlineExceededError):
+        _run(with_deadline(_answer(seconds=0.01), reserve=True), deadline)
+    assert _run(with_deadline(_answer(seconds=0.01)), deadline) == "answer"
+
+
+def test_blocking_calls_check_the_deadline(clock):
+    deadline = Deadline(2)
+    deadline_context(deadline).run(check_deadline)
+    clock.now += 2
+    with pytest.raises(DeadlineExceededError):
+        deadline_context(deadline).run(check_deadline)
+    assert deadline.degraded
+
+
+def test_tasks_and_threads_of_a_request_see_its_deadline():
+    deadline = Deadline(30)
+
+    async def search():
+        in_task = await asyncio.create_task(asyncio.sleep(0, result=get_deadline()))
+        in_thread = await asyncio.to_thread(get_deadline)
+        return in_task, in_thread
+
+    assert _run(search(), deadline) == (deadline, deadline)
+    assert get_deadline() is None
+
+
+def test_contexts_built_late_in_the_deadline_are_shrunk(clock):
+    deadline = Deadline(10)
+    context = deadline_context(deadline)
+    assert context.run(deadline_context_tokens, 8000) == 8000
+    clock.now += 6
+    assert context.run(deadline_context_tokens, 8000) == 4000
+    context.run(deadline_context_tokens, 8000)
+    # Each degradation is reported once
+    assert deadline.degradations == [CONTEXT_SHRUNK]
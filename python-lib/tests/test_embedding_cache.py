@@ -0,0 +1,124 @@
+import json
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+from dku_graphrag.utils.embedding_cache import LEGACY_TABLE_FILE, EmbeddingCache
+
+
+def _vector(text: str) -> list[float]:
+    return [float(len(text)), float(sum(map(ord, text)) % 997), 1.0]
+
+
+def _put(cache: EmbeddingCache, texts: list[str]) -> None:
+    cache.put_many(texts, [_vector(text) for text in texts])
+
+
+def _assert_cached(cache: EmbeddingCache, texts: list[str]) -> None:
+    vectors = cache.get_many(texts)
+    for text, vector in zip(texts, vectors):
+        assert vector is not None, text
+        assert vector.tolist() == _vector(text)
+
+
+def test_vectors_persist_across_instances(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "embedding/model:v1")
+    assert cache.get_many(["a", "b"]) == [None, None]
+    _put(cache, ["a", "b"])
+    _assert_cached(cache, ["a", "b"])
+
+    reopened = EmbeddingCache(str(tmp_path), "embedding/model:v1")
+    _assert_cached(reopened, ["a", "b"])
+    assert reopened.get_many(["c"]) == [None]
+    assert reopened.stats()["vectors"] == 2
+    # Vectors of another model are not shared
+    assert EmbeddingCache(str(tmp_path), "other-model").get_many(["a"]) == [None]
+
+
+def test_cache_grows_past_its_initial_capacity(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", initial_capacity=8)
+    texts = [f"text {i}" for i in range(1000)]
+    for start in range(0, len(texts), 64):
+        _put(cache, texts[start:start + 64])
+    # Already cached texts are not stored again
+    _put(cache, texts[:10])
+
+    _assert_cached(EmbeddingCache(str(tmp_path), "model"), texts)
+    assert cache.count == 1000
+    assert cache.capacity >= 1000
+    # Only the hash table referenced by the metadata is kept
+    assert [name for name in os.listdir(cache.directory) if name.endswith(".i64")] == [cache.table_file]
+
+
+def test_vectors_of_another_dimension_are_not_cached(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model")
+    cache.put_many(["a", "b"], [[1.0, 2.0], [1.0, 2.0, 3.0]])
+    assert cache.get_many(["a"])[0].tolist() == [1.0, 2.0]
+    assert cache.get_many(["b"]) == [None]
+
+
+def test_rows_of_a_writer_that_died_before_persisting_them_are_ignored(tmp_path, monkeypatch):
+    cache = EmbeddingCache(str(tmp_path), "model", initial_capacity=8)
+    _put(cache, ["kept"])
+
+    def die():
+        raise KeyboardInterrupt
+
+    # The rows, a growth and a table rebuild are written, but not the metadata describing them
+    monkeypatch.setattr(cache, "_persist", die)
+    with pytest.raises(KeyboardInterrupt):
+        _put(cache, [f"lost {i}" for i in range(20)])
+
+    survivor = EmbeddingCache(str(tmp_path), "model")
+    assert survivor.count == 1
+    _assert_cached(survivor, ["kept"])
+    assert survivor.get_many(["lost 0", "lost 19"]) == [None, None]
+    # Their slots are reused by the next writer
+    _put(survivor, [f"new {i}" for i in range(20)])
+    _assert_cached(EmbeddingCache(str(tmp_path), "model"), ["kept"] + [f"new {i}" for i in range(20)])
+
+
+def test_caches_written_before_table_files_were_versioned_are_read(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model")
+    _put(cache, ["a", "b"])
+    os.replace(os.path.join(cache.directory, cache.table_file), os.path.join(cache.directory, LEGACY_TABLE_FILE))
+    meta_path = os.path.join(cache.directory, "meta.json")
+    with open(meta_path) as f:
+        meta = json.load(f)
+    del meta["table_file"]
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+
+    legacy = EmbeddingCache(str(tmp_path), "model")
+    _assert_cached(legacy, ["a", "b"])
+    _put(legacy, ["c"])
+    _assert_cached(EmbeddingCache(str(tmp_path), "model"), ["a", "b", "c"])
+
+
+def _write_from_process(directory: str, worker: int) -> None:
+    cache = EmbeddingCache(directory, "model", initial_capacity=8)
+    for batch in range(30):
+        texts = [f"text {(worker * 37 + batch * 5 + i) % 400}" for i in range(10)]
+        _put(cache, texts)
+        _assert_cached(cache, texts)
+
+
+def test_processes_share_the_cache_directory(tmp_path):
+    if "fork" not in multiprocessing.get_all_start_methods():
+        pytest.skip("Forking processes is not supported on this platform")
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_write_from_process, args=(str(tmp_path), worker)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [process.exitcode for process in processes] == [0, 0, 0, 0]
+
+    texts = sorted({f"text {(worker * 37 + batch * 5 + i) % 400}" for worker in range(4) for batch in range(30) for i in range(10)})
+    cache = EmbeddingCache(str(tmp_path), "model")
+    _assert_cached(cache, texts)
+    # Every text was stored once
+    assert cache.count == len(texts)
+    assert len(np.unique(np.asarray(cache._keys[: cache.count]))) == len(texts)
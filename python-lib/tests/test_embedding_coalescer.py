@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import dku_graphrag.utils.embedding_coalescer as embedding_coalescer
+from dku_graphrag.utils.embedding_coalescer import EmbeddingCoalescer
+
+
+@pytest.fixture(autouse=True)
+def word_token_counts(monkeypatch):
+    # One token per word, so that the batch limits do not depend on a tokenizer
+    monkeypatch.setattr(embedding_coalescer, "count_tokens", lambda text, *args: len(text.split()))
+
+
+class _RecordingEmbedder:
+    """Embeds a text as [its length], recording the batches it was sent."""
+
+    def __init__(self, error: BaseException | None = None):
+        self.batches = []
+        self.token_counts = []
+        self.error = error
+        self._lock = threading.Lock()
+
+    def __call__(self, texts: list[str], token_counts: list[int]) -> list[list[float]]:
+        with self._lock:
+            self.batches.append(list(texts))
+            self.token_counts.append(list(token_counts))
+        if self.error is not None:
+            raise self.error
+        return [[float(len(text))] for text in texts]
+
+
+def test_concurrent_callers_of_a_window_share_one_request():
+    embedder = _RecordingEmbedder()
+    coalescer = EmbeddingCoalescer(embedder, window_seconds=0.05)
+
+    async def main():
+        return await asyncio.gather(
+            coalescer.embed(["a", "bb"]),
+            coalescer.embed(["ccc"]),
+            coalescer.embed(["dddd", "e", "ff"]),
+        )
+
+    results = asyncio.run(main())
+    assert results == [[[1.0], [2.0]], [[3.0]], [[4.0], [1.0], [2.0]]]
+    assert len(embedder.batches) == 1
+    assert coalescer.stats() == {"texts": 6, "batches": 1, "avg_batch_size": 6.0}
+
+
+def test_batches_are_split_at_the_item_and_token_limits():
+    embedder = _RecordingEmbedder()
+    coalescer = EmbeddingCoalescer(embedder, max_batch_items=3, max_batch_tokens=5, window_seconds=0)
+    texts = ["one", "two words", "three more words", "four", "a text over the token limit", "six"]
+
+    results = asyncio.run(coalescer.embed(texts))
+
+    assert results == [[float(len(text))] for text in texts]
+    assert embedder.batches == [["one", "two words"], ["three more words", "four"], ["a text over the token limit"], ["six"]]
+    # The counts the batches were sized with are handed to the LLM adapter
+    assert embedder.token_counts == [[1, 2], [3, 1], [6], [1]]
+
+
+def test_blocking_callers_are_coalesced():
+    embedder = _RecordingEmbedder()
+    coalescer = EmbeddingCoalescer(embedder, window_seconds=0.1)
+    results = {}
+    barrier = threading.Barrier(4)
+
+    def embed(position):
+        barrier.wait()
+        results[position] = coalescer.embed_blocking(["x" * position])
+
+    threads = [threading.Thread(target=embed, args=(position,)) for position in range(1, 5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {position: [[float(position)]] for position in range(1, 5)}
+    assert len(embedder.batches) == 1
+
+
+def test_a_failed_request_fails_every_caller_of_the_batch():
+    coalescer = EmbeddingCoalescer(_RecordingEmbedder(error=RuntimeError("LLM Mesh down")), window_seconds=0.02)
+
+    async def main():
+        return await asyncio.gather(coalescer.embed(["a"]), coalescer.embed(["b"]), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+
+
+def test_a_response_with_missing_embeddings_is_an_error():
+    coalescer = EmbeddingCoalescer(lambda texts, token_counts: [[0.0]], window_seconds=0)
+    with pytest.raises(ValueError, match="1 embeddings for 2 texts"):
+        asyncio.run(coalescer.embed(["a", "b"]))
+
+
+def _slow_for(slow_text: str, seconds: float):
+    def embed_batch(texts: list[str], token_counts: list[int]) -> list[list[float]]:
+        if slow_text in texts:
+            time.sleep(seconds)
+        return [[float(len(text))] for text in texts]
+    return embed_batch
+
+
+def test_the_window_is_not_delayed_by_the_full_batches_of_its_leader():
+    coalescer = EmbeddingCoalescer(_slow_for("a", seconds=0.5), max_batch_items=3, window_seconds=0.05)
+
+    async def other_caller():
+        await asyncio.sleep(0.01)
+        start_time = time.perf_counter()
+        await coalescer.embed(["ee"])
+        return time.perf_counter() - start_time
+
+    async def main():
+        # The leader's first three texts fill a batch, its last one opens the window
+        return await asyncio.gather(coalescer.embed(["a", "b", "c", "dddd"]), other_caller())
+
+    leader_results, other_seconds = asyncio.run(main())
+    assert leader_results == [[1.0], [1.0], [1.0], [4.0]]
+    assert other_seconds < 0.3
+
+
+def test_the_blocking_window_is_not_delayed_by_the_full_batches_of_its_leader():
+    coalescer = EmbeddingCoalescer(_slow_for("a", seconds=0.5), max_batch_items=3, window_seconds=0.05)
+    leader = threading.Thread(target=coalescer.embed_blocking, args=(["a", "b", "c", "dddd"],))
+    leader.start()
+    time.sleep(0.01)
+
+    start_time = time.perf_counter()
+    assert coalescer.embed_blocking(["ee"]) == [[2.0]]
+    assert time.perf_counter() - start_time < 0.3
+    leader.join()
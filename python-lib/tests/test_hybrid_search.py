@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("graphrag")
+
+from dku_graphrag.query.hybrid_search import NO_DATA_ANSWER, is_good_answer, race_searches
+
+GOOD_ANSWER = "A detailed answer. " * 20
+SHORT_ANSWER = "Too short."
+
+
+def _search(response, seconds: float = 0.0, unwound: list | None = None, error: BaseException | None = None):
+    async def search():
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            # A search releasing its resources when it is cancelled
+            await asyncio.sleep(0.01)
+            if unwound is not None:
+                unwound.append(response)
+            raise
+        if error is not None:
+            raise error
+        return response, {"answered_by": response}
+    return search
+
+
+def test_good_answers_are_long_and_not_the_no_data_answer():
+    assert is_good_answer(GOOD_ANSWER)
+    assert not is_good_answer(SHORT_ANSWER)
+    assert not is_good_answer(None)
+    assert not is_good_answer(NO_DATA_ANSWER + GOOD_ANSWER)
+
+
+def test_first_good_answer_wins_and_the_other_search_is_cancelled_and_awaited():
+    unwound = []
+    response, context, report = asyncio.run(race_searches({
+        "local": _search(GOOD_ANSWER, seconds=0.01),
+        "global": _search("global answer", seconds=5, unwound=unwound),
+    }))
+
+    assert response == GOOD_ANSWER
+    assert context == {"answered_by": GOOD_ANSWER}
+    assert report["winner"] == "local"
+    assert report["good_answer"]
+    assert report["cancelled"] == ["global"]
+    # The cancelled search finished unwinding before the race returned
+    assert unwound == ["global answer"]
+
+
+def test_a_poor_first_answer_waits_for_a_good_one_within_the_budget():
+    response, _, report = asyncio.run(race_searches({
+        "local": _search(SHORT_ANSWER, seconds=0.01),
+        "global": _search(GOOD_ANSWER, seconds=0.05),
+    }, latency_budget=1.0))
+
+    assert response == GOOD_ANSWER
+    assert report["winner"] == "global"
+    assert not report["over_budget"]
+
+
+def test_the_first_answer_is_returned_once_the_budget_is_spent():
+    response, _, report = asyncio.run(race_searches({
+        "local": _search(SHORT_ANSWER, seconds=0.01),
+        "global": _search(GOOD_ANSWER, seconds=5),
+    }, latency_budget=0.1))
+
+    assert response == SHORT_ANSWER
+    assert report["winner"] == "local"
+    assert report["over_budget"]
+    assert not report["good_answer"]
+    assert report["cancelled"] == ["global"]
+
+
+def test_failed_searches_are_skipped_and_the_error_raised_when_all_fail():
+    response, _, report = asyncio.run(race_searches({
+        "local": _search(None, error=RuntimeError("local failed")),
+        "global": _search(GOOD_ANSWER, seconds=0.02),
+    }))
+    assert response == GOOD_ANSWER
+    assert report["failed"] == ["local"]
+
+    with pytest.raises(RuntimeError, match="local failed"):
+        asyncio.run(race_searches({
+            "local": _search(None, error=RuntimeError("local failed")),
+            "global": _search(None, seconds=0.02, error=RuntimeError("global failed")),
+        }))
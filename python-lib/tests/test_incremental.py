@@ -0,0 +1,70 @@
+import pandas as pd
+
+from dku_graphrag.index.incremental import DocumentDiffer, compute_manifest, load_manifest, save_manifest
+
+COLUMNS = ["text", "title"]
+
+
+def _documents(rows: list[tuple]) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=["id", *COLUMNS])
+
+
+def _diff(previous: pd.DataFrame | None, chunks: list[pd.DataFrame], id_column: str | None = "id"):
+    differ = DocumentDiffer(previous)
+    masks = [differ.diff_chunk(compute_manifest(chunk, COLUMNS, id_column)).tolist() for chunk in chunks]
+    return differ.finish(), masks
+
+
+def test_first_run_indexes_every_document():
+    diff, masks = _diff(None, [_documents([(1, "a", "A"), (2, "b", "B")])])
+    assert (diff.added, diff.changed, diff.removed) == (2, 0, 0)
+    assert masks == [[True, True]]
+
+
+def test_documents_are_compared_with_the_previous_manifest_by_id():
+    previous, _ = _diff(None, [_documents([(1, "a", "A"), (2, "b", "B"), (3, "c", "C")])])
+    chunks = [
+        _documents([(1, "a", "A"), (2, "b changed", "B")]),
+        _documents([(4, "d", "D")]),
+    ]
+    diff, masks = _diff(previous.manifest, chunks)
+
+    assert (diff.added, diff.changed, diff.removed) == (1, 1, 1)
+    assert masks == [[False, True], [True]]
+    assert diff.manifest["key"].tolist() == ["1", "2", "4"]
+
+
+def test_without_ids_a_changed_document_is_a_new_one():
+    previous, _ = _diff(None, [_documents([(1, "a", "A"), (2, "b", "B")])], id_column=None)
+    diff, masks = _diff(previous.manifest, [_documents([(1, "a", "A"), (2, "b changed", "B")])], id_column=None)
+    assert (diff.added, diff.changed, diff.removed) == (1, 0, 1)
+    assert masks == [[False, True]]
+
+
+def test_manifest_round_trips_through_the_state_directory(tmp_path):
+    assert load_manifest(str(tmp_path)) is None
+    diff, _ = _diff(None, [_documents([(1, "a", "A")])])
+    save_manifest(str(tmp_path), diff.manifest)
+    pd.testing.assert_frame_equal(load_manifest(str(tmp_path)), diff.manifest)
+
+
+def test_hashes_do_not_depend_on_the_dtypes_a_chunk_is_read_with():
+    # The same rows, read from chunks where pandas inferred integers, floats (missing values) or strings
+    as_integers = pd.DataFrame({"id": [1, 2], "text": ["a", "b"], "title": [3, 4]})
+    as_floats = pd.DataFrame({"id": [1.0, 2.0], "text": ["a", "b"], "title": [3.0, None]})
+    as_strings = pd.DataFrame({"id": ["1", "2"], "text": ["a", "b"], "title": ["3", None]})
+
+    manifests = [compute_manifest(chunk, COLUMNS, "id") for chunk in (as_integers, as_floats, as_strings)]
+
+    assert [manifest["key"].tolist() for manifest in manifests] == [["1", "2"]] * 3
+    assert manifests[0]["row_hash"][0] == manifests[1]["row_hash"][0] == manifests[2]["row_hash"][0]
+    assert manifests[1]["row_hash"][1] == manifests[2]["row_hash"][1]
+    assert manifests[0]["row_hash"][1] != manifests[1]["row_hash"][1]
+
+
+def test_non_integral_floats_keep_their_decimals():
+    manifests = [
+        compute_manifest(pd.DataFrame({"id": [1], "text": ["a"], "title": [title]}), COLUMNS, "id")
+        for title in (3.5, 3)
+    ]
+    assert manifests[0]["row_hash"][0] != manifests[1]["row_hash"][0]
@@ -0,0 +1,78 @@
+import os
+
+from dku_graphrag.utils.index_manifest import (
+    GENERATIONS_DIR_NAME,
+    LEGACY_OUTPUT_DIR_NAME,
+    get_generation_dir,
+    is_index_complete,
+    read_index_manifest,
+    remove_stale_generations,
+    stage_generation,
+    write_index_manifest,
+)
+
+
+def _write(path, content: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def _read(path) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def test_published_generation_is_checked_against_its_files(tmp_path):
+    folder = str(tmp_path)
+    generation_dir = get_generation_dir(folder, "run-1")
+    _write(os.path.join(generation_dir, "entities.parquet"), "entities")
+
+    write_index_manifest(folder, "run-1", generation_dir, vector_store_dir="generations/run-1/lancedb")
+    manifest = read_index_manifest(folder)
+    assert manifest["output_dir"] == os.path.join(GENERATIONS_DIR_NAME, "run-1")
+    assert manifest["vector_store_dir"] == "generations/run-1/lancedb"
+    assert is_index_complete(folder, manifest)
+
+    _write(os.path.join(generation_dir, "entities.parquet"), "rewritten entities")
+    assert not is_index_complete(folder, manifest)
+
+
+def test_staged_tables_are_replaced_without_changing_the_published_ones(tmp_path):
+    folder = str(tmp_path)
+    published_dir = get_generation_dir(folder, "run-1")
+    _write(os.path.join(published_dir, "entities.parquet"), "entities v1")
+    os.makedirs(os.path.join(published_dir, "lancedb"))
+
+    staged_dir = get_generation_dir(folder, "run-2")
+    stage_generation(published_dir, staged_dir)
+    assert sorted(os.listdir(staged_dir)) == ["entities.parquet"]
+    assert _read(os.path.join(staged_dir, "entities.parquet")) == "entities v1"
+
+    # An update run moves its merged tables over the staged ones
+    _write(os.path.join(tmp_path, "merged.parquet"), "entities v2")
+    os.replace(os.path.join(tmp_path, "merged.parquet"), os.path.join(staged_dir, "entities.parquet"))
+    assert _read(os.path.join(staged_dir, "entities.parquet")) == "entities v2"
+    assert _read(os.path.join(published_dir, "entities.parquet")) == "entities v1"
+
+
+def test_generations_other_than_the_kept_ones_are_removed(tmp_path):
+    folder = str(tmp_path)
+    for generation in ["run-1", "run-2", "run-3"]:
+        os.makedirs(get_generation_dir(folder, generation))
+    os.makedirs(os.path.join(folder, LEGACY_OUTPUT_DIR_NAME))
+
+    removed = remove_stale_generations(folder, keep_dirs=[get_generation_dir(folder, "run-2"), get_generation_dir(folder, "run-3")])
+
+    assert sorted(os.path.basename(path) for path in removed) == [LEGACY_OUTPUT_DIR_NAME, "run-1"]
+    assert sorted(os.listdir(os.path.join(folder, GENERATIONS_DIR_NAME))) == ["run-2", "run-3"]
+
+
+def test_legacy_output_directory_is_kept_while_it_is_served(tmp_path):
+    folder = str(tmp_path)
+    legacy_dir = os.path.join(folder, LEGACY_OUTPUT_DIR_NAME)
+    os.makedirs(legacy_dir)
+    os.makedirs(get_generation_dir(folder, "run-1"))
+
+    assert remove_stale_generations(folder, keep_dirs=[get_generation_dir(folder, "run-1"), legacy_dir]) == []
+    assert os.path.isdir(legacy_dir)
@@ -0,0 +1,24 @@
+import pytest
+
+pytest.importorskip("json_repair")
+
+from dku_graphrag.utils.json_parsing import extract_json_object, repair_json_text, strip_code_fences
+
+
+@pytest.mark.parametrize("text, repaired", [
+    ('{"a": 1,}', '{"a": 1}'),
+    ("{'a': 'b'}", '{"a": "b"}'),
+    ('{"title": "x", "findings": [{"summary": "s"', '{"title": "x", "findings": [{"summary": "s"}]}'),
+])
+def test_usual_llm_json_errors_are_repaired_locally(text, repaired):
+    assert repair_json_text(text) == repaired
+
+
+@pytest.mark.parametrize("text", ["", "not json at all"])
+def test_nothing_is_returned_when_nothing_can_be_recovered(text):
+    assert repair_json_text(text) is None
+
+
+def test_json_object_is_extracted_from_the_response():
+    assert strip_code_fences('```json\n{"a": 1}\n```') == '{"a": 1}'
+    assert extract_json_object('Here it is: {"a": {"b": 1}} Hope it helps.') == '{"a": {"b": 1}}'
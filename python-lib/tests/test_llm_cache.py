@@ -0,0 +1,70 @@
+import itertools
+import types
+
+import pytest
+
+import dku_graphrag.utils.llm_cache as llm_cache
+from dku_graphrag.utils.llm_cache import SQLiteLLMCache, get_cache_dir
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Strictly increasing access times, so that the LRU order does not depend on the clock resolution
+    ticks = itertools.count(1)
+    monkeypatch.setattr(llm_cache, "time", types.SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+def test_keys_ignore_message_formatting_only():
+    key = SQLiteLLMCache.make_key("llm", [{"role": "user", "content": "Extract  the\nentities"}])
+    assert SQLiteLLMCache.make_key("llm", ["Extract the entities"]) == key
+    assert SQLiteLLMCache.make_key("other-llm", ["Extract the entities"]) != key
+    assert SQLiteLLMCache.make_key("llm", ["Extract the entities"], json_mode=True) != key
+    assert SQLiteLLMCache.make_key("llm", ["Extract the entities"], model_parameters={"temperature": 0.5}) != key
+    assert SQLiteLLMCache.make_key("llm", [{"role": "system", "content": "Extract the entities"}]) != key
+
+
+def test_responses_persist_across_runs(tmp_path):
+    path = str(tmp_path / "llm_responses.sqlite")
+    cache = SQLiteLLMCache(path)
+    key = SQLiteLLMCache.make_key("llm", ["prompt"])
+    assert cache.get(key) is None
+    cache.set(key, "response")
+    assert cache.get(key) == "response"
+    cache.close()
+
+    reopened = SQLiteLLMCache(path)
+    assert reopened.get(key) == "response"
+    assert reopened.stats()["hits"] == 1
+    assert reopened.stats()["size_mb"] == pytest.approx(len("response") / 1024 / 1024)
+    reopened.close()
+
+
+def test_least_recently_used_responses_are_evicted(tmp_path, clock):
+    cache = SQLiteLLMCache(str(tmp_path / "llm_responses.sqlite"), max_size_bytes=350)
+    for name in "abc":
+        cache.set(name, name * 100)
+    # Reading "a" makes "b" the least recently used entry, evicting it frees enough space
+    assert cache.get("a") == "a" * 100
+    cache.set("d", "d" * 100)
+
+    assert cache.get("b") is None
+    assert [cache.get(name) for name in "acd"] == ["a" * 100, "c" * 100, "d" * 100]
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["writes"] == 4
+    cache.close()
+
+
+def test_replacing_a_response_does_not_count_its_size_twice(tmp_path):
+    cache = SQLiteLLMCache(str(tmp_path / "llm_responses.sqlite"), max_size_bytes=150)
+    for _ in range(5):
+        cache.set("key", "x" * 100)
+    assert cache.stats()["evictions"] == 0
+    assert cache.get("key") == "x" * 100
+    cache.close()
+
+
+def test_cache_dir_is_created_in_the_folder(tmp_path):
+    cache_dir = get_cache_dir(str(tmp_path))
+    assert cache_dir == str(tmp_path / llm_cache.CACHE_DIR_NAME)
+    assert (tmp_path / llm_cache.CACHE_DIR_NAME).is_dir()
@@ -0,0 +1,79 @@
+import pytest
+
+pytest.importorskip("graphrag")
+
+import numpy as np
+from graphrag.model.community_report import CommunityReport
+from graphrag.model.entity import Entity
+from graphrag.model.text_unit import TextUnit
+from graphrag.query.context_builder.source_context import build_text_unit_context
+
+from dku_graphrag.index.context_index import ContextIndex
+from dku_graphrag.query.local_context import IndexedLocalSearchContext, _truncate_to_budget
+
+
+class _WordEncoder:
+    """One token per whitespace separated word."""
+
+    name = "test-words"
+
+    def encode(self, text: str, **kwargs) -> list[str]:
+        return text.split()
+
+
+def test_leading_items_are_kept_up_to_the_first_one_over_budget():
+    items = ["a", "b", "c", "d"]
+    assert _truncate_to_budget(items, [3, 3, 3, 3], max_tokens=7) == ["a", "b", "c"]
+    assert _truncate_to_budget(items, [3, 3, 3, 3], max_tokens=6) == ["a", "b", "c"]
+    assert _truncate_to_budget(items, [3, 3, 3, 3], max_tokens=100) == items
+    assert _truncate_to_budget(items, [10, 1, 1, 1], max_tokens=5) == ["a"]
+    assert _truncate_to_budget([], [], max_tokens=5) == []
+
+
+@pytest.mark.parametrize("max_tokens", [5, 12, 20, 31, 200])
+def test_truncation_leaves_the_graphrag_context_unchanged(max_tokens):
+    text_units = [
+        TextUnit(id=f"unit-{i}", short_id=str(i), text=" ".join(["word"] * (i % 4 + 2)))
+        for i in range(10)
+    ]
+    # The token counts of the rows graphrag renders, as precomputed by the index-builder
+    token_counts = [len(f"{unit.short_id}|{unit.text}\n".split()) for unit in text_units]
+
+    kept = _truncate_to_budget(text_units, token_counts, max_tokens)
+
+    def build(units):
+        return build_text_unit_context(units, token_encoder=_WordEncoder(), shuffle_data=False, max_tokens=max_tokens)
+
+    expected_text, expected_records = build(text_units)
+    text, records = build(kept)
+    assert text == expected_text
+    assert records["sources"].equals(expected_records["sources"])
+
+
+def test_communities_of_the_selected_entities_come_from_the_context_index():
+    context_index = ContextIndex({
+        "entity_ids": np.asarray(["e1", "e2"]),
+        "relationship_ids": np.asarray([], dtype=str),
+        "text_unit_ids": np.asarray([], dtype=str),
+        "report_community_ids": np.asarray(["0", "1", "2"]),
+        "text_unit_tokens": np.asarray([], dtype=np.int32),
+        "report_tokens": np.asarray([3, 3, 3], dtype=np.int32),
+        "entity_communities_indptr": np.asarray([0, 2, 4]),
+        "entity_communities": np.asarray([0, 1, 0, 2], dtype=np.int32),
+    })
+    # The report of community 2 is not at the requested level
+    reports = [
+        CommunityReport(id=f"report-{i}", short_id=str(i), title=f"Community {i}", community_id=str(i), full_content=f"report {i}")
+        for i in range(2)
+    ]
+    context = IndexedLocalSearchContext.__new__(IndexedLocalSearchContext)
+    context.context_index = context_index
+    context.community_reports = {report.community_id: report for report in reports}
+    context.token_encoder = _WordEncoder()
+    # The communities of the entities are not read from the entities
+    entities = [Entity(id=entity_id, short_id=entity_id, title=entity_id, community_ids=None) for entity_id in ("e1", "e2")]
+
+    _, records = context._build_community_context(entities, max_tokens=1000, context_name="Reports")
+
+    # Community 0 is shared by both entities and comes first
+    assert records["reports"]["id"].tolist() == ["0", "1"]
@@ -0,0 +1,73 @@
+import pytest
+
+import dku_graphrag.query.query_cache as query_cache
+from dku_graphrag.query.query_cache import QueryResultCache
+
+SCOPE = ("v1", "local", 2, "multiple paragraphs")
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(query_cache, "time", clock)
+    return clock
+
+
+def test_exact_tier_matches_normalized_queries():
+    cache = QueryResultCache()
+    cache.set(SCOPE, "Who founded  the company?", "answer", {"reports": []}, compute_seconds=3.0)
+
+    entry = cache.get(SCOPE, "  who founded the COMPANY ")
+    assert entry.response == "answer"
+    assert cache.get(SCOPE, "Who founded the company's rival?") is None
+    # Another index version or other search settings never reuse the answer
+    assert cache.get(("v2", *SCOPE[1:]), "Who founded the company?") is None
+    assert cache.get((SCOPE[0], "global", *SCOPE[2:]), "Who founded the company?") is None
+    assert cache.stats()["seconds_saved"] == 3.0
+
+
+def test_semantic_tier_matches_similar_query_embeddings():
+    cache = QueryResultCache(similarity_threshold=0.9)
+    cache.set(SCOPE, "Who founded the company?", "answer", {}, compute_seconds=1.0, embedding=[1.0, 0.0, 0.0])
+
+    entry, similarity = cache.get_similar(SCOPE, [0.95, 0.1, 0.0])
+    assert entry.response == "answer"
+    assert similarity > 0.9
+
+    entry, similarity = cache.get_similar(SCOPE, [0.0, 1.0, 0.0])
+    assert entry is None
+    assert similarity == pytest.approx(0.0)
+    assert cache.get_similar(("v2", *SCOPE[1:]), [1.0, 0.0, 0.0]) == (None, 0.0)
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = QueryResultCache(max_entries=2)
+    cache.set(SCOPE, "a", "A", {}, compute_seconds=1.0)
+    cache.set(SCOPE, "b", "B", {}, compute_seconds=1.0)
+    cache.get(SCOPE, "a")
+    cache.set(SCOPE, "c", "C", {}, compute_seconds=1.0)
+
+    assert cache.get(SCOPE, "b") is None
+    assert [cache.get(SCOPE, query).response for query in "ac"] == ["A", "C"]
+    assert cache.stats()["entries"] == 2
+
+
+def test_expired_entries_are_only_served_as_fallback(clock):
+    cache = QueryResultCache(ttl_seconds=60)
+    cache.set(SCOPE, "question", "old answer", {}, compute_seconds=1.0)
+    clock.now = 30.0
+    cache.set(("v2", *SCOPE[1:]), "question", "new answer", {}, compute_seconds=1.0)
+    clock.now = 120.0
+
+    assert cache.get(SCOPE, "question") is None
+    # The most recent answer computed with the same settings, whatever the index version
+    assert cache.get_fallback(("v3", *SCOPE[1:]), "question").response == "new answer"
+    assert cache.get_fallback((SCOPE[0], "global", *SCOPE[2:]), "question") is None
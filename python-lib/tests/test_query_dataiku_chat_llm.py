@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("graphrag")
+
+import dku_graphrag.query.query_dataiku_chat_llm as query_dataiku_chat_llm
+from dku_graphrag.query.query_dataiku_chat_llm import QueryDataikuChatLLM
+from dku_graphrag.utils.deadline import ANSWER_TRUNCATED, Deadline, DeadlineExceededError, deadline_context
+
+
+@pytest.fixture
+def chat_llm(monkeypatch):
+    monkeypatch.setattr(query_dataiku_chat_llm, "get_dataiku_llm", lambda llm_id: None)
+    llm = QueryDataikuChatLLM("chat-llm")
+    monkeypatch.setattr(llm, "_prepare_completion", lambda messages, **kwargs: messages)
+    return llm
+
+
+def _slow_tokens(first_token_seconds: float, token_seconds: float, count: int = 20):
+    def iter_tokens(completion):
+        time.sleep(first_token_seconds)
+        for position in range(count):
+            if position:
+                time.sleep(token_seconds)
+            yield f"token{position} "
+    return iter_tokens
+
+
+def _stream(llm: QueryDataikuChatLLM, deadline: Deadline) -> list[str]:
+    async def consume():
+        return [token async for token in llm.astream_generate("question")]
+    return deadline_context(deadline).run(asyncio.run, consume())
+
+
+def test_stream_is_truncated_when_the_deadline_passes(chat_llm, monkeypatch):
+    monkeypatch.setattr(chat_llm, "_iter_tokens", _slow_tokens(first_token_seconds=0.0, token_seconds=0.05))
+    deadline = Deadline(0.3)
+
+    tokens = _stream(chat_llm, deadline)
+
+    assert 0 < len(tokens) < 20
+    assert tokens[0] == "token0 "
+    assert ANSWER_TRUNCATED in deadline.degradations
+
+
+def test_stream_fails_when_no_token_comes_before_the_deadline(chat_llm, monkeypatch):
+    monkeypatch.setattr(chat_llm, "_iter_tokens", _slow_tokens(first_token_seconds=0.5, token_seconds=0.0))
+    with pytest.raises(DeadlineExceededError):
+        _stream(chat_llm, Deadline(0.1))
+
+
+def test_errors_reported_in_the_stream_footer_are_logged(chat_llm, caplog):
+    class _Completion:
+        def execute_streamed(self):
+            yield query_dataiku_chat_llm.DSSLLMStreamedCompletionChunk({"text": "partial "})
+            yield query_dataiku_chat_llm.DSSLLMStreamedCompletionChunk({"text": "answer"})
+            yield query_dataiku_chat_llm.DSSLLMStreamedCompletionFooter({"finishReason": "ERROR", "errorMessage": "quota exceeded"})
+
+    with caplog.at_level("ERROR", logger=query_dataiku_chat_llm.__name__):
+        assert list(chat_llm._iter_tokens(_Completion())) == ["partial ", "answer"]
+    assert "quota exceeded" in caplog.text
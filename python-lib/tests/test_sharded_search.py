@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("graphrag")
+
+from graphrag.query.context_builder.builders import ContextBuilderResult
+
+from dku_graphrag.query.sharded_search import SHARD_COLUMN, merge_local_contexts
+
+
+class _WordEncoder:
+    """One token per whitespace separated word."""
+
+    name = "test-words"
+
+    def encode(self, text: str, **kwargs) -> list[str]:
+        return text.split()
+
+
+def _shard_context(shard: str, entities: int, relationships: int) -> ContextBuilderResult:
+    return ContextBuilderResult(
+        context_chunks="",
+        context_records={
+            "entities": pd.DataFrame({
+                "id": [f"{shard}{i}" for i in range(entities)],
+                "entity": [f"entity {shard}{i}" for i in range(entities)],
+                "description": ["some description of the entity"] * entities,
+            }),
+            "relationships": pd.DataFrame({
+                "id": [f"{shard}{i}" for i in range(relationships)],
+                "source": [f"entity {shard}{i}" for i in range(relationships)],
+                "description": ["how the entities relate"] * relationships,
+            }),
+        },
+    )
+
+
+def _merge(max_tokens: int):
+    contexts = [(0.9, _shard_context("a", 4, 2)), (0.45, _shard_context("b", 4, 2))]
+    return merge_local_contexts(contexts, ["shard-a", "shard-b"], max_tokens, _WordEncoder())
+
+
+def test_rows_are_interleaved_by_shard_relevance_with_unambiguous_ids():
+    text, records = _merge(max_tokens=10_000)
+
+    # Shard b is half as relevant: its n-th row ranks with the 2n-th row of shard a
+    entities = records["entities"]
+    assert entities["id"].tolist() == ["1-a0", "1-a1", "2-b0", "1-a2", "1-a3", "2-b1", "2-b2", "2-b3"]
+    assert entities[SHARD_COLUMN].tolist()[:3] == ["shard-a", "shard-a", "shard-b"]
+    assert list(entities.columns) == [SHARD_COLUMN, "id", "entity", "description"]
+    assert records["relationships"]["id"].tolist() == ["1-a0", "1-a1", "2-b0", "2-b1"]
+    assert text.startswith("-----Entities-----\nid|entity|description\n1-a0|entity a0|")
+    assert "\n\n-----Relationships-----\n" in text
+
+
+@pytest.mark.parametrize("max_tokens", [20, 40, 60])
+def test_merged_context_fits_the_token_budget(max_tokens):
+    full_text, full_records = _merge(max_tokens=10_000)
+    text, records = _merge(max_tokens=max_tokens)
+
+    assert len(text.split()) <= max_tokens
+    assert len(text.split()) < len(full_text.split())
+    # The most relevant rows of each section are kept
+    for name, section in records.items():
+        assert section["id"].tolist() == full_records[name]["id"].tolist()[: len(section)]
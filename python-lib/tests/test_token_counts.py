@@ -0,0 +1,102 @@
+import random
+
+import numpy as np
+import pytest
+
+tiktoken = pytest.importorskip("tiktoken")
+
+from tiktoken_ext import openai_public
+
+import dku_graphrag.query.token_counts as token_counts
+from dku_graphrag.query.token_counts import _NEWLINES_RULE, _SEGMENT_BOUNDARY, TokenCountCache, load_token_counts
+
+# Texts are drawn from this alphabet, every pair of its characters is merged by the test vocabulary
+ALPHABET = "\n /|aT1."
+
+
+def _offline_ranks(*args, **kwargs) -> dict[bytes, int]:
+    # The encodings cannot be downloaded here: their pre-tokenizers, which decide where a text may be
+    # split, are used with a small vocabulary merging across every character pair of the alphabet
+    ranks = {bytes([byte]): byte for byte in range(256)}
+    for first in ALPHABET:
+        for second in ALPHABET:
+            ranks[(first + second).encode()] = len(ranks)
+    return ranks
+
+
+@pytest.fixture(params=["cl100k_base", "o200k_base", "p50k_base"])
+def encoder(request, monkeypatch):
+    monkeypatch.setattr(openai_public, "load_tiktoken_bpe", _offline_ranks)
+    spec = getattr(openai_public, request.param)()
+    return tiktoken.Encoding(spec["name"], pat_str=spec["pat_str"], mergeable_ranks=spec["mergeable_ranks"], special_tokens={})
+
+
+class _WordEncoder:
+    """One token per whitespace separated word, counting its calls."""
+
+    name = "test-words"
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, text: str, **kwargs) -> list[str]:
+        self.calls += 1
+        return text.split()
+
+
+def _table_like_texts(count: int) -> list[str]:
+    rng = random.Random(7)
+    texts = ["-----Entities-----\nid|entity|description\n1|aTa|a.a\n2|T1|/a/\n", "\n\n/a\n \n/\na|\n"]
+    for _ in range(count):
+        texts.append("".join(rng.choice(ALPHABET) for _ in range(rng.randint(1, 60))))
+    return texts
+
+
+def test_segmented_counts_are_the_tokenizer_counts(encoder):
+    cache = TokenCountCache(encoder.name)
+    texts = _table_like_texts(500)
+    if encoder.name != "p50k_base":
+        # The encodings with a newline rule are counted by segments
+        assert _NEWLINES_RULE in encoder._pat_str
+        assert max(len(_SEGMENT_BOUNDARY.split(text)) for text in texts) > 1
+
+    for text in texts:
+        assert cache.count(text, encoder) == len(encoder.encode(text)), repr(text)
+
+
+def test_precomputed_counts_are_used_instead_of_the_tokenizer():
+    rows = ["1|first row\n", "2|second row\n"]
+    recording_encoder = _WordEncoder()
+    cache = TokenCountCache(recording_encoder.name)
+    keys, counts = cache.record(lambda: [cache.count(row, recording_encoder) for row in rows])
+    assert sorted(counts.tolist()) == [2, 2]
+
+    cache.register("index", keys, counts)
+    query_encoder = _WordEncoder()
+    assert [cache.count(row, query_encoder) for row in rows] == [2, 2]
+    assert cache.count("3|per query row\n", query_encoder) == 3
+    assert cache.count("3|per query row\n", query_encoder) == 3
+    # Only the row that was not precomputed is tokenized, once
+    assert query_encoder.calls == 1
+    assert cache.stats() == {"precomputed": 2, "memo": 1, "hits": 3, "misses": 1}
+
+
+def test_token_counts_are_persisted_for_the_index_generation(tmp_path, monkeypatch):
+    monkeypatch.setattr(token_counts, "_token_count_caches", {})
+    encoder = _WordEncoder()
+    renders = []
+
+    def render():
+        renders.append(True)
+        token_counts.num_tokens("1|a row of the index\n", encoder)
+
+    load_token_counts(str(tmp_path), "index", "v1", encoder.name, render)
+    load_token_counts(str(tmp_path), "index", "v1", encoder.name, render)
+    assert len(renders) == 1
+    with np.load(tmp_path / token_counts.TOKEN_COUNTS_FILE_NAME) as data:
+        assert data["counts"].tolist() == [5]
+
+    # Another generation of the index is counted again
+    load_token_counts(str(tmp_path), "index", "v2", encoder.name, render)
+    assert len(renders) == 2
+    assert token_counts.get_token_count_cache(encoder.name).stats()["precomputed"] == 1
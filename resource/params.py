@@ -6,7 +6,7 @@ def do(payload, config, plugin_config, inputs):
     chat_llms = project.list_llms(purpose='GENERIC_COMPLETION')
     emnedding_llms = project.list_llms(purpose='TEXT_EMBEDDING_EXTRACTION')
 
-    if payload.get('parameterName') == 'chat_completion_llm_id':
+    if payload.get('parameterName') in ('chat_completion_llm_id', 'map_llm_id'):
         choices = [
             {"value": llm["id"], "label": llm["friendlyName"]}
             for llm in chat_llms